@@ -0,0 +1,136 @@
+"""\
+Compare columnar collections against in-memory collections of resources.
+
+The same records are queried through
+:class:`kt.jsonapi.columnar.ColumnarCollection`, holding one NumPy array
+for each attribute, and :class:`kt.jsonapi.collection.MemoryCollection`,
+which evaluates compiled predicates and sort keys for each resource.
+Timings include creating the resources for the page.
+
+Run from the root of the source tree, with the package and NumPy
+installed or ``src`` on ``PYTHONPATH``::
+
+    python benchmarks/columnar.py --sizes 100000 1000000
+
+"""
+
+import argparse
+import timeit
+
+import numpy
+import zope.interface
+
+import kt.jsonapi.collection
+import kt.jsonapi.columnar
+import kt.jsonapi.filtering
+import kt.jsonapi.interfaces
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IResource)
+class Item:
+
+    __slots__ = 'id', '_attributes'
+
+    type = 'item'
+
+    def __init__(self, id, attributes):
+        self.id = id
+        self._attributes = attributes
+
+    def attributes(self):
+        return self._attributes
+
+    def links(self):
+        return {}
+
+    def meta(self):
+        return {}
+
+    def relationships(self):
+        return {}
+
+
+FIELDS = dict(
+    status=kt.jsonapi.filtering.FilterField(),
+    price=kt.jsonapi.filtering.FilterField(convert=int),
+    score=kt.jsonapi.filtering.FilterField(convert=float),
+)
+
+SORT_FIELDS = ('price', 'score', 'status')
+
+CASES = dict(
+    equality=dict(filter=dict(status='held'), page=dict(size='50')),
+    range=dict(filter=dict(price=dict(range='1000,1100'))),
+    combined=dict(filter=dict(status='held', score=dict(gt='0.5'),
+                              price=dict(range='1000,50000')),
+                  page=dict(size='50')),
+    sorted_page=dict(sort='-price', page=dict(size='20')),
+    deep_page=dict(sort='score', page=dict(size='20', number='2000')),
+    two_keys=dict(sort='status,-score', page=dict(size='20')),
+)
+
+
+def make_columns(count):
+    rng = numpy.random.default_rng(42)
+    score = rng.random(count)
+    score[rng.random(count) < 0.01] = numpy.nan
+    return dict(
+        id=numpy.arange(count),
+        status=rng.choice(numpy.array(['open', 'held', 'closed']), count),
+        price=rng.integers(0, 100000, count),
+        score=score,
+    )
+
+
+def make_items(columns):
+    names = [name for name in columns if name != 'id']
+    values = [kt.jsonapi.columnar._python_values(columns[name])
+              for name in names]
+    return [Item(str(id), dict(zip(names, row)))
+            for id, row in zip(columns['id'].tolist(), zip(*values))]
+
+
+def query(collection, params):
+    if 'filter' in params:
+        collection.set_filter(params['filter'])
+    if 'sort' in params:
+        collection.set_sort(params['sort'])
+    if 'page' in params:
+        collection.set_pagination(params['page'])
+    return [res.id for res in collection.resources()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000])
+    parser.add_argument('--number', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        columns = make_columns(size)
+        items = make_items(columns)
+        print(f'{size} resources')
+        print(f'{"case":>12} {"memory":>10} {"columnar":>10} {"speedup":>8}')
+        for name, params in CASES.items():
+            def memory():
+                return query(kt.jsonapi.collection.MemoryCollection(
+                    items, FIELDS, sort_fields=SORT_FIELDS,
+                    max_page_size=size), params)
+
+            def columnar():
+                return query(kt.jsonapi.columnar.ColumnarCollection(
+                    'item', columns, filter_fields=FIELDS,
+                    sort_fields=SORT_FIELDS, max_page_size=size), params)
+
+            assert memory() == columnar()
+            slow = min(timeit.repeat(
+                memory, number=args.number, repeat=3)) / args.number
+            fast = min(timeit.repeat(
+                columnar, number=args.number, repeat=3)) / args.number
+            print(f'{name:>12} {slow * 1e3:8.2f}ms {fast * 1e3:8.2f}ms'
+                  f' {slow / fast:7.1f}x')
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""\
+Compare compiled filter predicates against naive interpretation.
+
+The naive implementation is typical of in-memory collections: for each
+item, the ``filter`` structure received by ``set_filter()`` is walked,
+converting values and dispatching on operator names.  The compiled
+implementation parses the structure once using
+:func:`kt.jsonapi.filtering.parse_filter`, and evaluates a predicate
+generated by :func:`kt.jsonapi.filtering.compile_filter`.  Timings for
+the compiled implementation include parsing and compilation; code is
+generated once per shape of filter, so later requests with the same
+shape only bind values.
+
+Run from the root of the source tree, with the package installed or
+``src`` on ``PYTHONPATH``::
+
+    python benchmarks/filtering.py
+
+"""
+
+import argparse
+import operator
+import random
+import timeit
+
+import flask
+
+import kt.jsonapi.api
+import kt.jsonapi.filtering
+
+
+CONVERTERS = dict(name=str, status=str, age=int, score=float)
+
+FIELDS = {name: kt.jsonapi.filtering.FilterField(convert=convert)
+          for name, convert in CONVERTERS.items()}
+
+OPERATORS = dict(eq=operator.eq, ne=operator.ne, lt=operator.lt,
+                 le=operator.le, gt=operator.gt, ge=operator.ge)
+
+
+def naive_match(record, structure):
+    for name, condition in structure.items():
+        if name == 'or':
+            if not any(naive_match(record, group)
+                       for group in condition.values()):
+                return False
+            continue
+        if name == 'not':
+            if naive_match(record, condition):
+                return False
+            continue
+        if not isinstance(condition, dict):
+            condition = dict(eq=condition)
+        convert = CONVERTERS[name]
+        value = record[name]
+        for op, text in condition.items():
+            if op == 'in':
+                if value not in [convert(v) for v in text.split(',')]:
+                    return False
+            elif op == 'range':
+                low, high = text.split(',')
+                if value is None:
+                    return False
+                if low and value < convert(low):
+                    return False
+                if high and value > convert(high):
+                    return False
+            elif value is None and op not in ('eq', 'ne'):
+                return False
+            elif not OPERATORS[op](value, convert(text)):
+                return False
+    return True
+
+
+def naive(records, structure):
+    return [record for record in records if naive_match(record, structure)]
+
+
+def compiled(records, structure):
+    expression = kt.jsonapi.filtering.parse_filter(structure, FIELDS)
+    predicate = kt.jsonapi.filtering.compile_filter(expression)
+    return list(filter(predicate, records))
+
+
+CASES = dict(
+    equality='filter[status]=open',
+    range='filter[age][range]=18,65&filter[score][gt]=0.5',
+    membership='filter[name][in]=n1,n7,n42,n99,n512&filter[status]=open',
+    logical=('filter[or][a][status]=held&filter[or][b][age][lt]=18'
+             '&filter[not][name]=n3&filter[score][le]=0.9'),
+)
+
+
+def make_records(count):
+    rng = random.Random(42)
+    return [dict(name=f'n{n}',
+                 status=rng.choice(('open', 'held', 'closed')),
+                 age=rng.choice((None, rng.randrange(100))),
+                 score=rng.random())
+            for n in range(count)]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--records', type=int, default=10000)
+    parser.add_argument('--number', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    app = flask.Flask(__name__)
+    records = make_records(args.records)
+    print(f'{"case":>12} {"naive":>10} {"compiled":>10} {"speedup":>8}')
+    for name, query_string in CASES.items():
+        context = kt.jsonapi.api.Context.from_query_string(app, query_string)
+        structure = context._query['filter']
+        assert naive(records, structure) == compiled(records, structure)
+        slow = min(timeit.repeat(
+            lambda: naive(records, structure),
+            number=args.number, repeat=5)) / args.number
+        fast = min(timeit.repeat(
+            lambda: compiled(records, structure),
+            number=args.number, repeat=5)) / args.number
+        print(f'{name:>12} {slow * 1e3:8.2f}ms {fast * 1e3:8.2f}ms'
+              f' {slow / fast:7.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""\
+Compare indexed collections against linear scans of resources.
+
+A :class:`kt.jsonapi.collection.ResourceStore` with hash and sorted
+indexes is queried through :class:`~kt.jsonapi.collection.IndexedCollection`,
+and the same resources are queried through
+:class:`~kt.jsonapi.collection.MemoryCollection`, which scans every
+record.  The cost of maintaining the indexes is reported as the time
+taken to update a resource.
+
+Run from the root of the source tree, with the package installed or
+``src`` on ``PYTHONPATH``::
+
+    python benchmarks/indexed_collection.py --sizes 100000 1000000
+
+"""
+
+import argparse
+import random
+import time
+import timeit
+
+import zope.interface
+
+import kt.jsonapi.collection
+import kt.jsonapi.filtering
+import kt.jsonapi.interfaces
+import kt.jsonapi.sorting
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IResource)
+class Item:
+
+    __slots__ = 'id', '_attributes'
+
+    type = 'item'
+
+    def __init__(self, id, attributes):
+        self.id = id
+        self._attributes = attributes
+
+    def attributes(self):
+        return self._attributes
+
+    def links(self):
+        return {}
+
+    def meta(self):
+        return {}
+
+    def relationships(self):
+        return {}
+
+
+FIELDS = dict(
+    status=kt.jsonapi.filtering.FilterField(),
+    country=kt.jsonapi.filtering.FilterField(),
+    price=kt.jsonapi.filtering.FilterField(convert=int),
+)
+
+COUNTRIES = [f'c{n:03}' for n in range(200)]
+
+CASES = dict(
+    equality=dict(filter=dict(country='c042')),
+    membership=dict(filter=dict(country=dict(**{'in': 'c001,c002,c003'}))),
+    range=dict(filter=dict(price=dict(range='1000,1100'))),
+    combined=dict(filter=dict(status='held',
+                              price=dict(range='1000,5000'))),
+    sorted_page=dict(sort='-price', page=dict(size='20')),
+    filtered_page=dict(filter=dict(country='c042'), sort='price',
+                       page=dict(size='20')),
+)
+
+
+def make_items(count):
+    rng = random.Random(42)
+    return [Item(f'{n:08}', dict(status=rng.choice(('open', 'held', 'closed')),
+                                 country=rng.choice(COUNTRIES),
+                                 price=rng.randrange(100000)))
+            for n in range(count)]
+
+
+def query(collection, params):
+    if 'filter' in params:
+        collection.set_filter(params['filter'])
+    if 'sort' in params:
+        collection.set_sort(params['sort'])
+    if 'page' in params:
+        collection.set_pagination(params['page'])
+    return [res.id for res in collection.resources()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000])
+    parser.add_argument('--number', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    for size in args.sizes:
+        items = make_items(size)
+        started = time.perf_counter()
+        store = kt.jsonapi.collection.ResourceStore(
+            items, filter_fields=FIELDS, sort_fields=('price',),
+            hash_indexes=('status', 'country'), sorted_indexes=('price',))
+        built = time.perf_counter() - started
+        print(f'{size} resources; indexes built in {built:.2f}s')
+        print(f'{"case":>14} {"scan":>10} {"indexed":>10} {"speedup":>8}')
+        for name, params in CASES.items():
+            def scan():
+                return query(kt.jsonapi.collection.MemoryCollection(
+                    items, FIELDS, sort_fields=('price',)), params)
+
+            def indexed():
+                return query(store.collection(), params)
+
+            expected = scan()
+            if 'sort' not in params:
+                assert sorted(indexed()) == sorted(expected)
+            slow = min(timeit.repeat(
+                scan, number=args.number, repeat=3)) / args.number
+            fast = min(timeit.repeat(
+                indexed, number=args.number, repeat=3)) / args.number
+            print(f'{name:>14} {slow * 1e3:8.2f}ms {fast * 1e3:8.2f}ms'
+                  f' {slow / fast:7.1f}x')
+
+        rng = random.Random(7)
+
+        def update():
+            item = items[rng.randrange(size)]
+            store.update(Item(item.id, dict(
+                item.attributes(), price=rng.randrange(100000))))
+
+        cost = min(timeit.repeat(update, number=1000, repeat=3)) / 1000
+        print(f'{"update":>14} {cost * 1e6:8.1f}us')
+        print()
+
+
+if __name__ == '__main__':
+    main()
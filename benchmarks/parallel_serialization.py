@@ -0,0 +1,154 @@
+"""\
+Measure scaling of parallel primary data serialization.
+
+Generates a large compound document using Context.collection() with a
+serialization_executor of increasing size, reporting the time taken
+and speedup relative to sequential serialization.  Attribute values
+are computed with a small amount of pure-Python work, so speedups
+beyond one core are only expected on free-threaded builds of Python
+(3.13t and newer) with the GIL disabled::
+
+    python3.13t -X gil=0 benchmarks/parallel_serialization.py
+
+Run from the root of the source tree, with the package installed or
+``src`` on ``PYTHONPATH``.
+
+"""
+
+import argparse
+import concurrent.futures
+import statistics
+import sys
+import time
+
+import flask
+import zope.interface
+
+import kt.jsonapi.api
+import kt.jsonapi.interfaces
+import kt.jsonapi.link
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IResource)
+class Resource:
+
+    def __init__(self, type, id, work, relationships=()):
+        self.type = type
+        self.id = id
+        self._work = work
+        self._relationships = dict(relationships)
+
+    def attributes(self):
+        total = 0
+        for n in range(self._work):
+            total += n * n % 7
+        return dict(total=total, label=f'{self.type} {self.id}')
+
+    def links(self):
+        return dict(self=kt.jsonapi.link.Link(f'/{self.type}/{self.id}'))
+
+    def meta(self):
+        return {}
+
+    def relationships(self):
+        return self._relationships
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.ICollection)
+class Collection:
+
+    def __init__(self, resources, path):
+        self._resources = resources
+        self._path = path
+
+    def links(self):
+        return dict(self=kt.jsonapi.link.Link(self._path))
+
+    def meta(self):
+        return {}
+
+    def resources(self):
+        return self._resources
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IToManyRelationship)
+class ToMany:
+
+    includable = True
+    name = None
+    source = None
+
+    def __init__(self, resources):
+        self._resources = resources
+
+    def collection(self):
+        return Collection(self._resources, '/related')
+
+    def links(self):
+        return {}
+
+    def meta(self):
+        return {}
+
+
+def make_collection(size, work):
+    resources = []
+    for n in range(size):
+        # Each resource has a few distinct related resources, so the
+        # merged branches rarely overlap.
+        related = [Resource('part', f'{n}.{m}', work) for m in range(3)]
+        resources.append(Resource('thing', str(n), work,
+                                  dict(parts=ToMany(related))))
+    return Collection(resources, '/things')
+
+
+def run(app, collection, executor):
+
+    class BenchmarkContext(kt.jsonapi.api.Context):
+        serialization_executor = executor
+        serialization_threshold = 2
+
+    with app.test_request_context('/things?include=parts'):
+        context = BenchmarkContext(app, flask.request)
+        start = time.perf_counter()
+        context.collection(collection)
+        return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size', type=int, default=500,
+                        help='number of primary resources')
+    parser.add_argument('--work', type=int, default=2000,
+                        help='iterations of work per attribute mapping')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=[0, 1, 2, 4, 8])
+    args = parser.parse_args(argv)
+
+    gil = getattr(sys, '_is_gil_enabled', lambda: True)()
+    print(f'Python {sys.version.split()[0]}, GIL enabled: {gil}')
+    app = flask.Flask(__name__)
+    collection = make_collection(args.size, args.work)
+    baseline = None
+    for nthreads in args.threads:
+        executor = None
+        if nthreads:
+            executor = concurrent.futures.ThreadPoolExecutor(nthreads)
+        try:
+            timings = [run(app, collection, executor)
+                       for n in range(args.repeat)]
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        best = min(timings)
+        if baseline is None:
+            baseline = best
+        label = f'{nthreads} threads' if nthreads else 'sequential'
+        print(f'{label:>12}: best {best * 1000:8.1f} ms,'
+              f' median {statistics.median(timings) * 1000:8.1f} ms,'
+              f' speedup {baseline / best:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+"""\
+Compare query string tokenization against the previous implementation.
+
+The previous implementation decoded using urllib.parse.parse_qsl() and
+split each key by repeatedly slicing off the remainder; the current one
+scans the query string and each key once.  Timings are reported for
+realistic and adversarial query strings, for tokenization alone and for
+complete parsing by Context (with the query string cache disabled).
+
+Run from the root of the source tree, with the package installed or
+``src`` on ``PYTHONPATH``::
+
+    python benchmarks/query_parsing.py
+
+"""
+
+import argparse
+import timeit
+import urllib.parse
+
+import flask
+
+import kt.jsonapi.api
+import kt.jsonapi.interfaces
+
+
+def legacy_split_key(key):
+    if '[' in key:
+        ndx = key.index('[')
+        name = key[:ndx]
+        rest = key[ndx:]
+        kt.jsonapi.api._check_name(name, key)
+        names = [name]
+        while rest:
+            if (']' not in rest) or not rest.startswith('['):
+                raise kt.jsonapi.interfaces.InvalidQueryKey(
+                    f'malformed query string key segment following'
+                    f' {kt.jsonapi.api._field_ref(names)!r}: {rest!r}',
+                    key=key)
+            name, rest = rest[1:].split(']', 1)
+            kt.jsonapi.api._check_name(name, key)
+            names.append(name)
+        field = names.pop()
+        return tuple(names), field
+    else:
+        return (), key
+
+
+def legacy_tokenize(query_string):
+    return [(legacy_split_key(key), value)
+            for key, value in urllib.parse.parse_qsl(
+                query_string, keep_blank_values=True)]
+
+
+def tokenize(query_string):
+    return [(kt.jsonapi.api._split_key(key), value)
+            for key, value in kt.jsonapi.api._scan_query_string(
+                query_string)]
+
+
+CASES = dict(
+    simple='include=author',
+    realistic=('fields[articles]=title,body,author&fields[people]=name'
+               '&include=author,comments.author&filter[published]=true'
+               '&sort=-created,title&page[number]=3&page[size]=25'),
+    encoded=('filter[name]=caf%C3%A9+au+lait&fields[articles]=title%2Cbody'
+             '&include=comments.author'),
+    deep_keys='&'.join(f'filter{"[x]" * 40}[k{n}]=v' for n in range(20)),
+    many_params='&'.join(f'filter[k{n}]=v{n}' for n in range(500)),
+)
+
+
+class UncachedContext(kt.jsonapi.api.Context):
+    query_cache = None
+    # The adversarial cases exceed the default limits; disable them so
+    # the complete parse is measured.
+    max_query_parameters = None
+    max_key_depth = None
+    max_include_paths = None
+    max_include_depth = None
+    max_fields_per_type = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--number', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    app = flask.Flask(__name__)
+    print(f'{"case":>12} {"legacy":>10} {"current":>10} {"speedup":>8}'
+          f' {"context":>10}')
+    for name, query_string in CASES.items():
+        assert tokenize(query_string) == legacy_tokenize(query_string)
+        legacy = min(timeit.repeat(
+            lambda: legacy_tokenize(query_string),
+            number=args.number, repeat=5)) / args.number
+        current = min(timeit.repeat(
+            lambda: tokenize(query_string),
+            number=args.number, repeat=5)) / args.number
+        context = min(timeit.repeat(
+            lambda: UncachedContext.from_query_string(app, query_string),
+            number=args.number, repeat=5)) / args.number
+        print(f'{name:>12} {legacy * 1e6:8.1f}us {current * 1e6:8.1f}us'
+              f' {legacy / current:7.2f}x {context * 1e6:8.1f}us')
+
+
+if __name__ == '__main__':
+    main()
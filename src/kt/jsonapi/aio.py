@@ -0,0 +1,380 @@
+"""\
+Response generation for applications using :mod:`asyncio`.
+
+:class:`AsyncContext` generates the same documents as
+:class:`~kt.jsonapi.api.Context`, but awaits results from application
+objects providing the asynchronous interfaces, such as
+:class:`~kt.jsonapi.interfaces.IAsyncResource` and
+:class:`~kt.jsonapi.interfaces.IAsyncCollection`.  Objects providing
+only the synchronous interfaces are supported as well.
+
+Independent retrievals are performed concurrently: the primary
+resources of a collection, and sibling relationships named by the
+``include`` query parameter.  Included resources are merged so the
+document matches sequential serialization.
+
+"""
+
+import asyncio
+import inspect
+
+import flask
+import werkzeug.exceptions
+
+import kt.jsonapi.api
+import kt.jsonapi.interfaces
+import kt.jsonapi.serializers
+
+
+async def _resolve(value):
+    if inspect.isawaitable(value):
+        value = await value
+    return value
+
+
+async def _resources(value):
+    value = await _resolve(value)
+    if hasattr(value, '__aiter__'):
+        return [kt.jsonapi.interfaces.IResource(resource)
+                async for resource in value]
+    return [kt.jsonapi.interfaces.IResource(resource) for resource in value]
+
+
+async def _is_empty(value):
+    # Check for resources without retrieving more than one.
+    value = await _resolve(value)
+    if hasattr(value, '__aiter__'):
+        async for resource in value:
+            return False
+        return True
+    for resource in value:
+        return False
+    return True
+
+
+async def _gather(awaitables, limit=None):
+    # Like asyncio.gather(), but remaining tasks are cancelled if one
+    # fails, so work for a failed response does not continue.  At most
+    # limit awaitables are run at once, if given.
+    if limit is not None:
+        semaphore = asyncio.Semaphore(limit)
+
+        async def bounded(aw):
+            async with semaphore:
+                return await aw
+
+        awaitables = [bounded(aw) for aw in awaitables]
+    tasks = [asyncio.ensure_future(aw) for aw in awaitables]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+
+
+async def serialize_resource(context, resource):
+    """Serialize *resource* for an :class:`AsyncContext`."""
+    resource = kt.jsonapi.interfaces.IResource(resource)
+    await context._pause()
+    r = dict(
+        type=resource.type,
+        id=resource.id,
+    )
+
+    d = dict(await _resolve(resource.attributes()))
+    d = context.select_fields(resource.type, d)
+    if d:
+        r['attributes'] = d
+
+    d = kt.jsonapi.serializers._links(resource)
+    if d:
+        r['links'] = d
+
+    d = dict(resource.meta())
+    if d:
+        r['meta'] = d
+
+    rels = dict(await _resolve(resource.relationships()))
+    selected = context.select_fields(resource.type, rels)
+    items = [(name, rel, name if context.should_include(name) else None)
+             for name, rel in selected.items()]
+    # Relationships not selected may still need to be included:
+    items.extend((name, rel, name) for name, rel in rels.items()
+                 if name not in selected and context.should_include(name))
+    bodies = await _relationships(
+        context, [(rel, relname) for name, rel, relname in items])
+    d = {name: body for (name, rel, relname), body in zip(items, bodies)
+         if name in selected}
+    if d:
+        r['relationships'] = d
+
+    return r
+
+
+async def serialize_relationship(context, relationship, relname=None):
+    """Serialize *relationship* for an :class:`AsyncContext`.
+
+    If *relname* is given, related resources are included.
+
+    """
+    collection = None
+    r = dict()
+    relone = kt.jsonapi.interfaces.IToOneRelationship(relationship, None)
+    if relone is not None:
+        relationship = relone
+
+        if relationship.includable:
+            res = await _resolve(relone.resource())
+            if res is None:
+                r['data'] = None
+            else:
+                res = kt.jsonapi.interfaces.IResource(res)
+                r['data'] = dict(
+                    type=res.type,
+                    id=res.id,
+                )
+                if relname:
+                    await _include(context, relname, res)
+        elif relname:
+            raise werkzeug.exceptions.BadRequest(
+                f'requested relationship "{relname}" cannot be included')
+
+    else:
+        relmany = kt.jsonapi.interfaces.IToManyRelationship(relationship, None)
+        if relmany is None:
+            # No idea what this is.
+            raise TypeError('relationship value does not provide a concrete'
+                            ' relationship type')
+        relationship = relmany
+        collection = kt.jsonapi.interfaces.ICollection(
+            await _resolve(relationship.collection()))
+        linkage = None
+        if relationship.includable:
+            linkage = context.cached_linkage(relationship)
+
+        if relationship.includable and relname:
+            if linkage is not None and all(map(context.is_included,
+                                               linkage)):
+                r['data'] = [dict(type=type, id=id) for type, id in linkage]
+            else:
+                r['data'] = []
+                for res in await _resources(collection.resources()):
+                    r['data'].append(dict(
+                        type=res.type,
+                        id=res.id,
+                    ))
+                    await _include(context, relname, res)
+                context.cache_linkage(
+                    relationship, [(d['type'], d['id']) for d in r['data']])
+        elif relname:
+            raise werkzeug.exceptions.BadRequest(
+                f'requested relationship "{relname}" cannot be included')
+        elif linkage is not None:
+            if not linkage:
+                r['data'] = []
+        elif await _is_empty(collection.resources()):
+            # Empty!  Make it easy to discover without another request:
+            r['data'] = []
+
+    r.update(kt.jsonapi.serializers._relationship_body_except_data(
+        relationship, collection))
+    return r
+
+
+async def _include(context, relname, resource):
+    key = resource.type, resource.id
+    if key not in context._included_idents:
+        relstack = list(context._relstack)
+        context._relstack.append(relname)
+        try:
+            context._included_idents.add(key)
+            data = await serialize_resource(context, resource)
+            context.included.append(data)
+            context._included_paths.append(tuple(context._relstack))
+        finally:
+            context._relstack[:] = relstack
+
+
+async def _relationships(context, items):
+    included = [index for index, (rel, relname) in enumerate(items)
+                if relname]
+    if context._branched or len(included) < 2:
+        return [await serialize_relationship(context, rel, relname=relname)
+                for rel, relname in items]
+
+    branches = {index: context._branch() for index in included}
+    results = await _gather(
+        [serialize_relationship(branches[index], *items[index])
+         for index in included],
+        limit=context.include_parallelism)
+    results = dict(zip(included, results))
+    bodies = []
+    for index, (rel, relname) in enumerate(items):
+        if not relname:
+            body = await serialize_relationship(context, rel)
+        elif context._merge(branches[index]):
+            body = results[index]
+        else:
+            body = await serialize_relationship(
+                context, rel, relname=relname)
+        bodies.append(body)
+    return bodies
+
+
+async def _primary(context, resources):
+    if context._branched or len(resources) < 2:
+        return [await serialize_resource(context, res) for res in resources]
+
+    branches = [context._branch() for res in resources]
+    results = await _gather([serialize_resource(branch, res)
+                             for branch, res in zip(branches, resources)],
+                            limit=context.include_parallelism)
+    data = []
+    for res, branch, item in zip(resources, branches, results):
+        if not context._merge(branch):
+            item = await serialize_resource(context, res)
+        data.append(item)
+    return data
+
+
+class AsyncContext(kt.jsonapi.api.Context):
+    """Context generating responses using coroutines.
+
+    The :meth:`collection`, :meth:`resource`, and :meth:`related`
+    methods must be awaited.  Other response methods are inherited from
+    :class:`~kt.jsonapi.api.Context` unchanged, and only support
+    synchronous application objects.
+
+    The :attr:`~kt.jsonapi.api.Context.linkage_cache` is used, and
+    :attr:`~kt.jsonapi.api.Context.include_parallelism` limits the number
+    of resources and relationships serialized concurrently for a
+    request.  The other caching, coalescing, and executor attributes of
+    :class:`~kt.jsonapi.api.Context` are not used.
+
+    """
+
+    yield_interval = 100
+    """Number of resources serialized between yields to the event loop.
+
+    Serializing a large document without awaiting anything would block
+    other tasks; control is returned to the event loop periodically
+    even if application objects never wait.
+
+    """
+
+    async def _pause(self):
+        # The counter is shared with branches of this context.
+        self._nserialized[0] += 1
+        if self._nserialized[0] % self.yield_interval == 0:
+            await asyncio.sleep(0)
+
+    def _reset(self):
+        super(AsyncContext, self)._reset()
+        self._nserialized = [0]
+
+    async def collection(self, collection, headers=None):
+        """Generate response containing a collection as primary data.
+
+        This is the asynchronous counterpart of
+        :meth:`kt.jsonapi.api.Context.collection`.
+
+        """
+        collection = kt.jsonapi.interfaces.ICollection(
+            await _resolve(collection))
+        self._prepare_collection(collection)
+
+        resources = await _resources(collection.resources())
+        for res in resources:
+            key = res.type, res.id
+            assert key not in self._included_idents
+            self._included_idents.add(key)
+        data = await _primary(self, resources)
+        links = kt.jsonapi.serializers._collection_links(collection)
+        meta = dict(collection.meta())
+        body = dict(data=data)
+        if 'include' in self._query:
+            body['included'] = self.included
+        if meta:
+            body['meta'] = meta
+        if links:
+            self._apply_query_params(links)
+            body['links'] = links
+        return self._make_response(self._encode(body), 200, headers,
+                                   self._document_headers())
+
+    async def resource(self, resource, headers=None):
+        """Generate response containing a resource as primary data.
+
+        This is the asynchronous counterpart of
+        :meth:`kt.jsonapi.api.Context.resource`.
+
+        """
+        self._disallow_collection_params('resource')
+        res = kt.jsonapi.interfaces.IResource(await _resolve(resource))
+        self._included_idents.add((res.type, res.id))
+        data = await serialize_resource(self, res)
+        link = self._resource_self_link(data)
+        body = dict(data=data)
+        if link:
+            body['links'] = dict(self=link)
+            self._apply_query_params(body['links'])
+        if 'include' in self._query:
+            body['included'] = self.included
+        return self._make_response(self._encode(body), 200, headers,
+                                   self._document_headers())
+
+    async def related(self, relationship, headers=None):
+        """Generate response containing a relationship target as primary data.
+
+        This is the asynchronous counterpart of
+        :meth:`kt.jsonapi.api.Context.related`.
+
+        """
+        rel = kt.jsonapi.interfaces.IToManyRelationship(relationship, None)
+        if rel is not None:
+            return await self.collection(rel.collection(), headers=headers)
+
+        self._disallow_collection_params('resource')
+        rel = kt.jsonapi.interfaces.IToOneRelationship(relationship)
+        res = await _resolve(rel.resource())
+        data = None
+        if res is not None:
+            res = kt.jsonapi.interfaces.IResource(res)
+            self._included_idents.add((res.type, res.id))
+            data = await serialize_resource(self, res)
+        body = dict(data=data)
+        name = getattr(rel, 'name', None)
+        source = getattr(rel, 'source', None)
+        if name and source is not None:
+            source = kt.jsonapi.interfaces.IResource(source)
+            self_link = f'{source.links()["self"].href}/{name}'
+            body['links'] = dict(self=self_link)
+            self._apply_query_params(body['links'])
+        if 'include' in self._query:
+            body['included'] = self.included
+        return self._make_response(self._encode(body), 200, headers,
+                                   self._document_headers())
+
+
+def context():
+    """Get asynchronous JSON:API context for current Flask request.
+
+    A new context will be created if needed.  At most one asynchronous
+    context will be associated with each request.
+
+    If the ``'KT_JSONAPI_CONTEXT_ASYNC'`` setting is specified in
+    ``flask.current_app.config``, it should be a factory for a context
+    object.  This will normally be derived from :class:`AsyncContext`.
+
+    """
+    try:
+        return flask.g._kt_jsonapi_async_context
+    except AttributeError:
+        pass
+    config = flask.current_app.config
+    factory = config.get('KT_JSONAPI_CONTEXT_ASYNC', AsyncContext)
+    ctx = factory(flask.current_app._get_current_object(),
+                  flask.request._get_current_object())
+    flask.g._kt_jsonapi_async_context = ctx
+    return ctx
@@ -6,14 +6,23 @@ Top-level API to construct JSON:API responses from application objects.
 # All the ValueError exceptions raised here should be something more
 # specific that better indicates the source of the problem.
 
+import collections
+import contextvars
+import copy
+import hashlib
 import json
 import urllib.parse
 
 import flask
+import werkzeug.datastructures
 import werkzeug.exceptions
+import werkzeug.http
 
+import kt.jsonapi.cache
+import kt.jsonapi.filtering
 import kt.jsonapi.interfaces
 import kt.jsonapi.serializers
+import kt.jsonapi.sorting
 
 
 CONTENT_TYPE = 'application/vnd.api+json'
@@ -34,7 +43,14 @@ def _check_name(name, key):
             key=key)
 
 
-def _split_key(key):
+def _malformed_key(key, names, rest):
+    return kt.jsonapi.interfaces.InvalidQueryKey(
+        f'malformed query string key segment following'
+        f' {_field_ref(names)!r}: {rest!r}',
+        key=key)
+
+
+def _split_key(key, max_depth=None):
     #
     # key should look something like 'name0[name1][name2]';
     # pick it apart into a sequence of names and a final field:
@@ -44,25 +60,57 @@ def _split_key(key):
     # final field and an empty prefix sequence:
     #   ==> (), 'name0'
     #
-    if '[' in key:
-        ndx = key.index('[')
-        name = key[:ndx]
-        rest = key[ndx:]
-        _check_name(name, key)
-        names = [name]
-        while rest:
-            if (']' not in rest) or not rest.startswith('['):
-                raise kt.jsonapi.interfaces.InvalidQueryKey(
-                    f'malformed query string key segment following'
-                    f' {_field_ref(names)!r}: {rest!r}',
-                    key=key)
-            name, rest = rest[1:].split(']', 1)
-            _check_name(name, key)
-            names.append(name)
-        field = names.pop()
-        return tuple(names), field
-    else:
+    # The key is scanned once, locating each bracket without slicing
+    # off the remainder.  If max_depth is given, scanning stops as soon
+    # as more than max_depth bracketed names are found.
+    #
+    start = key.find('[')
+    if start < 0:
         return (), key
+    name = key[:start]
+    _check_name(name, key)
+    names = [name]
+    length = len(key)
+    while start < length:
+        end = key.find(']', start + 1)
+        if key[start] != '[' or end < 0:
+            raise _malformed_key(key, names, key[start:])
+        name = key[start + 1:end]
+        _check_name(name, key)
+        names.append(name)
+        if max_depth is not None and len(names) > max_depth + 1:
+            raise kt.jsonapi.interfaces.QueryKeyTooDeep(
+                f'query string key {key!r} contains more than'
+                f' {max_depth} bracketed names',
+                key=key, limit=max_depth)
+        start = end + 1
+    field = names.pop()
+    return tuple(names), field
+
+
+def _decode(text):
+    # Equivalent to the decoding performed by urllib.parse.parse_qsl(),
+    # skipping the work when there's nothing to decode.
+    if '+' in text:
+        text = text.replace('+', ' ')
+    if '%' in text:
+        text = urllib.parse.unquote(text)
+    return text
+
+
+def _scan_query_string(query_string, limit=None):
+    # Return (key, value) pairs as for urllib.parse.parse_qsl() with
+    # keep_blank_values=True.  If limit is given, no more than limit + 1
+    # pairs are decoded, so the caller can detect an excessive number
+    # of parameters without decoding them all.
+    pairs = []
+    for part in query_string.split('&'):
+        if part:
+            if limit is not None and len(pairs) > limit:
+                break
+            key, _, value = part.partition('=')
+            pairs.append((_decode(key), _decode(value)))
+    return pairs
 
 
 def _ismap(ob):
@@ -80,6 +128,75 @@ class QueryParameter:
         self.aspect = aspect
 
 
+class Response:
+    """Encoded response generated without a web framework.
+
+    Contexts for raw WSGI and ASGI applications return instances of
+    subclasses that can deliver themselves using the corresponding
+    protocol.
+
+    .. versionadded:: 1.8.0
+
+    """
+
+    def __init__(self, body, status, headers):
+        self.body = body
+        """Encoded body as :class:`bytes`."""
+
+        self.status = status
+        """Integer status code."""
+
+        self.headers = headers
+        """:class:`werkzeug.datastructures.Headers` for the response."""
+
+    @property
+    def status_line(self):
+        """Status code and reason phrase, as used in WSGI."""
+        reason = werkzeug.http.HTTP_STATUS_CODES.get(self.status, 'UNKNOWN')
+        return f'{self.status} {reason}'
+
+    def get_data(self):
+        """Return the encoded body, as for Flask responses."""
+        return self.body
+
+    def header_items(self):
+        """Return list of header name/value pairs.
+
+        A **Content-Length** header is added if not already present.
+
+        """
+        items = list(self.headers.items())
+        if 'Content-Length' not in self.headers:
+            items.append(('Content-Length', str(len(self.body))))
+        return items
+
+
+_ParsedQuery = collections.namedtuple(
+    '_ParsedQuery', ('query', 'qparams', 'fields', 'relpaths'))
+
+
+def _copy_query(query):
+    # Copy the nested parameter structure, so a parsed query shared
+    # through the query cache is not modified through any context.
+    return {name: _copy_query(value) if isinstance(value, dict) else value
+            for name, value in query.items()}
+
+
+class _StaticRequest:
+    # Stand-in for a request, for contexts not built for a real request.
+
+    def __init__(self, path, query_string):
+        self.path = path
+        self.query_string = query_string.encode('utf-8')
+
+
+class _StaticApp:
+    # Stand-in for an application, providing only JSON configuration.
+
+    def __init__(self, json_encoder):
+        self.json_encoder = json_encoder
+
+
 class _BaseContext:
 
     # Flask 2.2 changes how JSON encoding is configured;
@@ -152,23 +269,40 @@ class _BaseContext:
         return {}
 
     def _response(self, body, headers=None, status=200):
+        return self._make_response(self._encode(body), status, headers)
+
+    def _add_jsonapi(self, body):
         jsonapi = self.jsonapi()
         if jsonapi:
             jsonapi = dict(jsonapi)
             if 'meta' in jsonapi and not jsonapi['meta']:
                 del jsonapi['meta']
             body['jsonapi'] = jsonapi
+        return body
+
+    def _encode(self, body):
+        body = self._add_jsonapi(body)
         if self._json_provider is not None:
             data = self._json_provider.dumps(body)
         else:
             data = json.dumps(body, cls=self._json_encoder)
-        data = data.encode('utf-8')
-        hdrs = flask.app.Headers()
+        return data.encode('utf-8')
+
+    def _make_response(self, data, status, headers, extra=()):
+        hdrs = werkzeug.datastructures.Headers()
         if headers is not None:
             hdrs.extend(headers)
+        for name, value in extra:
+            if name not in hdrs:
+                hdrs[name] = value
         if 'Content-Type' not in hdrs:
             hdrs['Content-Type'] = CONTENT_TYPE
-        return flask.make_response(data, status, hdrs)
+        return self._build_response(data, status, hdrs)
+
+    def _build_response(self, data, status, headers):
+        # Contexts for other frameworks override this; see
+        # kt.jsonapi.wsgi and kt.jsonapi.asgi.
+        return flask.make_response(data, status, headers)
 
 
 class Context(_BaseContext):
@@ -187,6 +321,201 @@ class Context(_BaseContext):
     _relationship_path = kt.jsonapi.interfaces.RelationshipPath(
         __name__='include')
 
+    linkage_cache = None
+    """Cache of to-many relationship linkage, or ``None``.
+
+    If provided, this must be a :class:`~kt.jsonapi.cache.LinkageCache`;
+    it may be set on a subclass or on individual context instances.
+
+    """
+
+    include_cache = None
+    """Cache of resources included for primary resources, or ``None``.
+
+    If provided, this must be a :class:`~kt.jsonapi.cache.IncludeCache`.
+    This is only used for responses generated by :meth:`resource`.
+
+    """
+
+    result_cache = None
+    """Cache of collection results, or ``None``.
+
+    If provided, this must be a :class:`~kt.jsonapi.cache.ResultCache`.
+    Collections passed to :meth:`collection` are wrapped using the path
+    of the request as the key identifying the collection.
+
+    """
+
+    coalescer = None
+    """Coalescer for concurrent identical requests, or ``None``.
+
+    If provided, this must be a
+    :class:`~kt.jsonapi.cache.RequestCoalescer`.  Concurrent calls to
+    :meth:`collection` or :meth:`resource` for requests with the same
+    :attr:`request_key` share the encoded response generated for the
+    first.  Applications must only enable this if requests with the
+    same path and query string refer to the same collection or
+    resource.
+
+    """
+
+    response_cache = None
+    """Cache of encoded responses, or ``None``.
+
+    If provided, this must be a :class:`~kt.jsonapi.cache.ResponseCache`.
+    This is only used when :meth:`collection` or :meth:`resource` is
+    called with a *factory*, so stale entries can be rebuilt in the
+    background.  Entries are keyed by :attr:`request_key`.
+
+    """
+
+    prefetcher = None
+    """Prefetcher for the next page of collections, or ``None``.
+
+    If provided, this must be a :class:`~kt.jsonapi.cache.Prefetcher`.
+    When :meth:`collection` generates a document using a *factory* and a
+    :attr:`response_cache` is configured, the document for the ``next``
+    link is generated in the background and added to the cache, since
+    clients usually request it soon after.
+
+    """
+
+    surrogate_key_header = None
+    """Name of a header listing keys for the resources in a document.
+
+    If set, responses generated by :meth:`collection` and
+    :meth:`resource` carry this header (typically ``Surrogate-Key`` or
+    ``Cache-Tag``), allowing a caching proxy to purge every response
+    containing a resource.  See :meth:`surrogate_key`.
+
+    """
+
+    surrogate_key_separator = ' '
+    """Separator used between keys in the :attr:`surrogate_key_header`."""
+
+    surrogate_key_limit = 8000
+    """Maximum length of the :attr:`surrogate_key_header` value.
+
+    If the keys for individual resources would exceed this, only keys
+    for the resource types are provided.
+
+    """
+
+    surrogate_key_hash = False
+    """Indicates whether keys for individual resources are hashed.
+
+    Hashed keys are shorter and contain only hexadecimal digits, so they
+    are not affected by the content of resource identifiers.
+
+    This is read from the class rather than the context, since
+    :meth:`surrogate_key` is a class method used to compute keys to
+    purge outside of any request; set it on a subclass, not on an
+    instance.
+
+    """
+
+    key_recorder = None
+    """Recorder of request keys for cache warming, or ``None``.
+
+    If provided, this must be a
+    :class:`~kt.jsonapi.warming.RequestKeyRecorder`; the
+    :attr:`request_key` of each response generated by :meth:`collection`
+    or :meth:`resource` is recorded.
+
+    """
+
+    query_cache = kt.jsonapi.cache.QueryStringCache()
+    """Cache of parsed query strings, or ``None``.
+
+    By default, a :class:`~kt.jsonapi.cache.QueryStringCache` shared by
+    all contexts is used, so repeated query strings are parsed and
+    validated once.  Set to ``None`` on a subclass to disable caching.
+
+    """
+
+    serialization_executor = None
+    """Executor used to serialize primary data in parallel, or ``None``.
+
+    If provided, this must be a :class:`concurrent.futures.Executor`,
+    normally a :class:`~concurrent.futures.ThreadPoolExecutor` shared by
+    all requests.  Each primary resource of a collection is serialized
+    as a separate task, which is worthwhile when attributes or related
+    resources are retrieved using I/O.  Tasks run with a copy of the
+    :mod:`contextvars` context of the caller, so the Flask request
+    remains available.
+
+    Resources included by each task are merged in the order of the
+    primary data, so the document is the same as when serialized
+    sequentially.  A resource that would include a resource already
+    added for an earlier resource is serialized again, sequentially, to
+    preserve that guarantee; parallel serialization is most useful when
+    included resources are mostly distinct.
+
+    """
+
+    serialization_threshold = 8
+    """Minimum number of primary resources to serialize in parallel.
+
+    Smaller collections are serialized sequentially even if a
+    :attr:`serialization_executor` is configured, since the overhead of
+    scheduling tasks is not worth paying.
+
+    """
+
+    include_executor = None
+    """Executor used to include sibling relationships in parallel.
+
+    If provided, this must be a :class:`concurrent.futures.Executor`,
+    normally a :class:`~concurrent.futures.ThreadPoolExecutor` shared by
+    all requests.  When more than one relationship of a resource is
+    named by the ``include`` query parameter, each is resolved as a
+    separate task, so the time taken approaches that of the slowest
+    relationship rather than the sum.  Resources included for each
+    relationship are merged as described for
+    :attr:`serialization_executor`.  Relationships of resources reached
+    from those tasks are resolved sequentially.
+
+    """
+
+    include_parallelism = 4
+    """Maximum number of relationships being included concurrently.
+
+    This applies separately to each request, limiting the share of the
+    :attr:`include_executor` a single request can use.
+
+    """
+
+    max_query_parameters = 100
+    """Maximum number of parameters in the query string, or ``None``.
+
+    This and the following limits bound the work performed parsing
+    and validating a hostile query string.  Each is checked as soon as
+    the relevant part of the query string is seen, and a violation
+    raises a :exc:`~kt.jsonapi.interfaces.QueryStringLimitExceeded`,
+    reported to the client as a 400 error.  A limit of ``None``
+    disables the check.
+
+    """
+
+    max_key_depth = 8
+    """Maximum number of bracketed names in a query string key.
+
+    Only keys for parameters interpreted by the context, such as
+    ``fields``, ``filter``, and ``page``, are checked.
+
+    """
+
+    max_include_paths = 50
+    """Maximum number of relationship paths named by ``include``."""
+
+    max_include_depth = 8
+    """Maximum number of relationship names in an ``include`` path."""
+
+    max_fields_per_type = 100
+    """Maximum number of field names in a ``fields[TYPE]`` parameter."""
+
+    _branched = False
+
     def __init__(self, app, request):
         """Initialize information needed from the request.
 
@@ -200,29 +529,121 @@ class Context(_BaseContext):
         # request information
         self.fields = {}
         self.relpaths = set()
+        self._path = self._extract_path(request)
         self._parse_query_string(self._extract_query_string(request))
 
         # response information
+        self._reset()
+
+    def _reset(self):
         self.included = []
         self._included_idents = set()
+        self._included_paths = []
         self._relstack = []
 
+    @classmethod
+    def from_query_string(cls, app, query_string, path=None):
+        """Create a context that is not associated with a request.
+
+        *query_string* is interpreted as if received in a request for
+        *path*.  Such contexts can be used to generate documents outside
+        of request handling, such as when warming caches.
+
+        .. versionadded:: 1.8.0
+
+        """
+        return cls(app, _StaticRequest(path, query_string))
+
+    @classmethod
+    def surrogate_key(cls, type, id=None):
+        """Return the surrogate key for a resource type or resource.
+
+        Applications use this to determine which keys to purge when a
+        resource changes: the key for the resource, and the key for its
+        type if collections containing it are affected.  The class used
+        must be the one generating the responses, or have the same
+        :attr:`surrogate_key_hash` setting.
+
+        .. versionadded:: 1.8.0
+
+        """
+        if id is None:
+            return urllib.parse.quote(type, safe='')
+        key = f'{type}/{id}'
+        if cls.surrogate_key_hash:
+            return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+        return urllib.parse.quote(key, safe='/')
+
+    def _document_headers(self):
+        # Additional headers describing the document just generated.
+        if not self.surrogate_key_header:
+            return ()
+        sep = self.surrogate_key_separator
+        types = sorted({type for type, id in self._included_idents})
+        keys = [self.surrogate_key(type) for type in types]
+        keys.extend(sorted(self.surrogate_key(type, id)
+                           for type, id in self._included_idents))
+        value = sep.join(keys)
+        if len(value) > self.surrogate_key_limit:
+            value = sep.join(keys[:len(types)])
+        return (self.surrogate_key_header, value),
+
+    def _detached(self):
+        # Return a copy sharing the information captured from the
+        # request, but with no response state, so a document can be
+        # built independently of this context.
+        context = copy.copy(self)
+        context._reset()
+        return context
+
+    def _extract_path(self, request):
+        return request.path
+
     def _extract_query_string(self, request):
         return request.query_string.decode('utf-8')
 
     def _parse_query_string(self, query_string):
+        if self.query_cache is None:
+            parsed = self._parse(query_string)
+            self._query = parsed.query
+        else:
+            parsed = self.query_cache.get(
+                self._query_cache_key(), query_string, self._parse)
+            self._query = _copy_query(parsed.query)
+        self._qparams = parsed.qparams
+        for tname, tfields in parsed.fields.items():
+            self.fields[tname] = set(tfields)
+        self.relpaths.update(parsed.relpaths)
+
+    def _query_cache_key(self):
+        # Parsing depends on the limits in effect, which may be set on
+        # the context rather than the class.
+        return (self.__class__, self.max_query_parameters,
+                self.max_key_depth, self.max_include_paths,
+                self.max_include_depth, self.max_fields_per_type)
+
+    def _parse(self, query_string):
+        # Parse and validate the query string, without modifying the
+        # context, since the result may be shared by other contexts.
         qparams = []
-        self._query = dict()
-        for key, value in urllib.parse.parse_qsl(query_string,
-                                                 keep_blank_values=True):
+        query = dict()
+        fields = {}
+        relpaths = set()
+        limit = self.max_query_parameters
+        pairs = _scan_query_string(query_string, limit)
+        if limit is not None and len(pairs) > limit:
+            raise kt.jsonapi.interfaces.TooManyQueryParameters(
+                f'query string contains more than {limit} parameters',
+                key=pairs[-1][0], limit=limit)
+        for key, value in pairs:
             topname, _, _ = key.partition('[')
             aspect = topname if topname in self._query_parts else None
             qparams.append(QueryParameter(key, value, aspect))
             if not aspect:
                 continue
-            obnames, field = _split_key(key)
+            obnames, field = _split_key(key, self.max_key_depth)
 
-            ob = self._query
+            ob = query
             for n, name in enumerate(obnames):
                 if name in ob:
                     if not isinstance(ob[name], dict):
@@ -249,54 +670,123 @@ class Context(_BaseContext):
                     key=key)
             ob[field] = value
 
-        self._qparams = tuple(qparams)
-
         # Should validate all type names and field names using the
         # appropriate schema fields.
-        if 'fields' in self._query and not _ismap(self._query['fields']):
+        if 'fields' in query and not _ismap(query['fields']):
             raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
                 "query string key 'fields' must map type names"
                 " to lists of field names",
                 key='fields',
-                value=self._query['fields'])
-        for tname, tfields in self._query.get('fields', {}).items():
+                value=query['fields'])
+        for tname, tfields in query.get('fields', {}).items():
             key = f'fields[{tname}]'
-            kt.jsonapi.interfaces.TypeName(__name__=key).validate(tname)
-            # validate type name
+            kt.jsonapi.interfaces.validate_type_name(tname, key)
             if isinstance(tfields, dict):
                 raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
                     f'value for query string key {key!r}'
                     f' must not contain nested containers',
                     key=key,
                     value=tfields)
+            limit = self.max_fields_per_type
+            if limit is not None and tfields.count(',') >= limit:
+                raise kt.jsonapi.interfaces.TooManyFieldNames(
+                    f'value for query string key {key!r} contains more'
+                    f' than {limit} field names',
+                    key=key, limit=limit)
             if tfields:
                 tfields = tfields.split(',')
-                field = kt.jsonapi.interfaces.MemberName(__name__=key)
-                for ndx, tfield in enumerate(tfields):
-                    # validate field name
-                    field.validate(tfield)
-                self.fields[tname] = set(tfields)
+                for tfield in tfields:
+                    kt.jsonapi.interfaces.validate_member_name(tfield, key)
+                fields[tname] = frozenset(tfields)
             else:
-                self.fields[tname] = set()
+                fields[tname] = frozenset()
 
-        if 'include' in self._query:
+        if 'include' in query:
             key = 'include'
-            include = self._query[key]
+            include = query[key]
             if isinstance(include, dict):
                 raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
                     f'value for query string key {key!r}'
                     f' must not contain nested containers',
                     key=key,
                     value=include)
+            limit = self.max_include_paths
+            if limit is not None and include.count(',') >= limit:
+                raise kt.jsonapi.interfaces.TooManyIncludePaths(
+                    f'value for query string key {key!r} contains more'
+                    f' than {limit} relationship paths',
+                    key=key, limit=limit)
             includes = include.split(',') if include else []
+            limit = self.max_include_depth
             for part in includes:
-                self._relationship_path.validate(part)
+                if limit is not None and part.count('.') >= limit:
+                    raise kt.jsonapi.interfaces.IncludePathTooDeep(
+                        f'relationship path {part!r} in query string key'
+                        f' {key!r} contains more than {limit} names',
+                        key=key, limit=limit)
+                kt.jsonapi.interfaces.validate_relationship_path(
+                    part, field=self._relationship_path)
                 relnames = part.split('.')
                 relpath = []
                 for relname in relnames:
                     # validate relname
                     relpath.append(relname)
-                    self.relpaths.add('.'.join(relpath))
+                    relpaths.add('.'.join(relpath))
+
+        return _ParsedQuery(query, tuple(qparams), fields,
+                            frozenset(relpaths))
+
+    _request_key = None
+
+    @property
+    def request_key(self):
+        """Hashable key identifying the requested document.
+
+        The key is a ``(path, query)`` tuple, where *query* is a
+        canonical form of the query string: the order of parameters,
+        the order of names in ``fields`` values, and redundant prefixes
+        of ``include`` paths do not affect the key.  Requests with equal
+        keys generate equivalent responses for the same target objects,
+        so this is used as the key for response caches.
+
+        .. versionadded:: 1.8.0
+
+        """
+        if self._request_key is None:
+            self._request_key = self._path, self._canonical_query_string()
+        return self._request_key
+
+    @property
+    def request_digest(self):
+        """Stable hexadecimal digest of :attr:`request_key`.
+
+        Unlike :attr:`request_key`, this is the same across processes,
+        and is suitable for use in entity tags or external cache keys.
+
+        .. versionadded:: 1.8.0
+
+        """
+        path, query = self.request_key
+        data = f'{path or ""}?{query}'.encode('utf-8')
+        return hashlib.sha1(data).hexdigest()
+
+    def _canonical_query_string(self):
+        params = []
+        for tname, tfields in self.fields.items():
+            params.append((f'fields[{tname}]', ','.join(sorted(tfields))))
+        if 'include' in self._query:
+            # Only the longest paths are needed; prefixes are implied.
+            prefixes = {relpath.rpartition('.')[0]
+                        for relpath in self.relpaths}
+            params.append(('include', ','.join(sorted(
+                self.relpaths - prefixes))))
+        for qparam in self._qparams:
+            if qparam.aspect not in ('fields', 'include'):
+                params.append((qparam.key, qparam.value))
+        params.sort()
+        return '&'.join(f'{urllib.parse.quote(key, safe="[]")}='
+                        f'{urllib.parse.quote(value, safe=",")}'
+                        for key, value in params)
 
     def select_fields(self, typename, map):
         # Can be used for both attributes, relationships.
@@ -313,6 +803,42 @@ class Context(_BaseContext):
         relpath = '.'.join(relpath)
         return relpath in self.relpaths
 
+    def is_included(self, key):
+        """Return true if the resource identified by the ``(type, id)``
+        pair *key* is already part of the response document."""
+        return key in self._included_idents
+
+    def _linkage_key(self, relationship):
+        name = getattr(relationship, 'name', None)
+        source = getattr(relationship, 'source', None)
+        if self.linkage_cache is None or not name or source is None:
+            return None
+        source = kt.jsonapi.interfaces.IResource(source)
+        version = getattr(relationship, 'version', None)
+        return source.type, source.id, name, version
+
+    def cached_linkage(self, relationship):
+        """Return cached linkage for a to-many relationship, or ``None``.
+
+        The linkage is a tuple of ``(type, id)`` pairs.
+
+        """
+        key = self._linkage_key(relationship)
+        if key is None:
+            return None
+        source_type, source_id, name, version = key
+        return self.linkage_cache.get(source_type, source_id, name,
+                                      version=version)
+
+    def cache_linkage(self, relationship, identifiers):
+        """Store linkage for a to-many relationship, if caching is enabled.
+        """
+        key = self._linkage_key(relationship)
+        if key is not None:
+            source_type, source_id, name, version = key
+            self.linkage_cache.set(source_type, source_id, name, identifiers,
+                                   version=version)
+
     def include_relation(self, relname, resource):
         key = resource.type, resource.id
         if key not in self._included_idents:
@@ -322,12 +848,13 @@ class Context(_BaseContext):
                 self._included_idents.add(key)
                 self.included.append(
                     kt.jsonapi.serializers.resource(self, resource))
+                self._included_paths.append(tuple(self._relstack))
             finally:
                 self._relstack[:] = relstack
 
     # Methods to construct response:
 
-    def collection(self, collection, headers=None):
+    def collection(self, collection=None, headers=None, factory=None):
         """Generate response containing a collection as primary data.
 
         If *headers* is given and non-``None``, it must be be mapping of
@@ -335,6 +862,12 @@ class Context(_BaseContext):
         **Content-Type** header is provided, it will be used instead of
         the default value for JSON:API responses.
 
+        Instead of *collection*, a *factory* may be provided; this is
+        called with no arguments to create the collection only if the
+        response is not available from the :attr:`response_cache`.  The
+        factory may be called from a background thread, without an
+        active request, to refresh the cache.
+
         The **links** member of the response payload will include a
         **self** link based on the **self** link for the collection, with
         query parameters copied from the request.  Pagination links
@@ -343,8 +876,75 @@ class Context(_BaseContext):
         parameters of the request with the incoming pagination
         parameters stripped out.
 
+        .. versionchanged:: 1.8.0
+           Added the *factory* parameter.
+
+        """
+        data, extra = self._render('collection', collection, factory)
+        return self._make_response(data, 200, headers, extra)
+
+    def warm(self, kind, factory):
+        """Generate a document unless available from the response cache.
+
+        *kind* is either ``'collection'`` or ``'resource'``, and
+        *factory* is called with no arguments to create the collection
+        or resource if needed.  The :attr:`request_key` is not recorded
+        by the :attr:`key_recorder`, so warming does not influence which
+        documents are warmed in the future.
+
+        .. versionadded:: 1.8.0
+
         """
+        if kind not in ('collection', 'resource'):
+            raise ValueError(f'unknown kind of document: {kind!r}')
+        self._render(kind, None, factory, record=False)
+
+    def _render(self, kind, target, factory, record=True):
+        # Build and encode a response body, possibly sharing the result
+        # with concurrent identical requests or retrieving it from the
+        # response cache.  Returns the encoded body and a sequence of
+        # additional headers.
+        if (target is None) == (factory is None):
+            raise TypeError('exactly one of the target object or factory'
+                            ' must be provided')
+        key = kind, self.request_key
+        if record and self.key_recorder is not None:
+            self.key_recorder.record(kind, self.request_key)
+        method = f'_{kind}_body'
+
+        def build():
+            body = getattr(self, method)(
+                target if factory is None else factory())
+            if (kind == 'collection' and factory is not None
+                    and self.prefetcher is not None
+                    and self.response_cache is not None):
+                self._prefetch_next(body, factory)
+            return self._encode(body), self._document_headers()
+
+        if self.coalescer is not None:
+            coalesced = build
+
+            def build():
+                return self.coalescer.run(key, coalesced)
+
+        if factory is None or self.response_cache is None:
+            return build()
+
+        # Copy the context now, since this context continues to change
+        # while the refresh runs in the background, and should not be
+        # kept alive until then.
+        context = self._detached()
+
+        def refresh():
+            body = getattr(context, method)(factory())
+            return context._encode(body), context._document_headers()
+
+        return self.response_cache.get(key, build, refresh=refresh)
+
+    def _collection_body(self, collection):
         collection = kt.jsonapi.interfaces.ICollection(collection)
+        if self.result_cache is not None:
+            collection = self.result_cache.wrap(collection, self._path)
         self._prepare_collection(collection)
 
         # Serialize.
@@ -354,8 +954,7 @@ class Context(_BaseContext):
             key = resource.type, resource.id
             assert key not in self._included_idents
             self._included_idents.add(key)
-        data = [kt.jsonapi.serializers.resource(self, resource)
-                for resource in resources]
+        data = self._serialize_resources(resources)
         links = kt.jsonapi.serializers._collection_links(collection)
         meta = dict(collection.meta())
         r = dict(data=data)
@@ -366,7 +965,148 @@ class Context(_BaseContext):
         if links:
             self._apply_query_params(links)
             r['links'] = links
-        return self._response(r, headers=headers)
+        return r
+
+    def _serialize_resources(self, resources):
+        executor = self.serialization_executor
+        if (executor is None or self._branched
+                or len(resources) < self.serialization_threshold):
+            return [kt.jsonapi.serializers.resource(self, resource)
+                    for resource in resources]
+
+        tasks = []
+        try:
+            for resource in resources:
+                branch = self._branch()
+                future = executor.submit(
+                    contextvars.copy_context().run,
+                    kt.jsonapi.serializers.resource, branch, resource)
+                tasks.append((resource, branch, future))
+            data = []
+            for resource, branch, future in tasks:
+                item = future.result()
+                if not self._merge(branch):
+                    item = kt.jsonapi.serializers.resource(self, resource)
+                data.append(item)
+        except BaseException:
+            for resource, branch, future in tasks:
+                future.cancel()
+            raise
+        return data
+
+    def serialize_relationships(self, items):
+        """Serialize relationships of a resource.
+
+        *items* is a sequence of ``(relationship, relname)`` pairs, as
+        accepted by :func:`kt.jsonapi.serializers.relationship`.  A list
+        of serialized relationships is returned in the same order.
+
+        .. versionadded:: 1.8.0
+
+        """
+        included = [index for index, (rel, relname) in enumerate(items)
+                    if relname]
+        if (self.include_executor is None or self._branched
+                or len(included) < 2):
+            return [kt.jsonapi.serializers.relationship(
+                        self, rel, relname=relname)
+                    for rel, relname in items]
+
+        def submit(index):
+            rel, relname = items[index]
+            branch = self._branch()
+            future = self.include_executor.submit(
+                contextvars.copy_context().run,
+                kt.jsonapi.serializers.relationship,
+                branch, rel, relname=relname)
+            pending.append((branch, future))
+
+        waiting = collections.deque(included)
+        pending = collections.deque()
+        bodies = []
+        try:
+            while waiting and len(pending) < self.include_parallelism:
+                submit(waiting.popleft())
+            for rel, relname in items:
+                if not relname:
+                    bodies.append(kt.jsonapi.serializers.relationship(
+                        self, rel))
+                    continue
+                branch, future = pending.popleft()
+                body = future.result()
+                if waiting:
+                    submit(waiting.popleft())
+                if not self._merge(branch):
+                    body = kt.jsonapi.serializers.relationship(
+                        self, rel, relname=relname)
+                bodies.append(body)
+        except BaseException:
+            for branch, future in pending:
+                future.cancel()
+            raise
+        return bodies
+
+    def _branch(self):
+        # Copy sharing the request information, with response state
+        # that will only be merged back by _merge().  Resources already
+        # part of the document are known to the branch.  Branches do
+        # not create further branches.
+        context = copy.copy(self)
+        context._branched = True
+        context.included = []
+        context._included_idents = set(self._included_idents)
+        context._included_paths = []
+        context._relstack = list(self._relstack)
+        return context
+
+    def _merge(self, branch):
+        # Add the resources included by branch, if none of them has been
+        # included since the branch was created.  Returns true if
+        # merged; if not, the work of the branch must be redone using
+        # this context, since nested inclusion depends on which
+        # relationship path reaches a resource first.
+        idents = [(item['type'], item['id']) for item in branch.included]
+        if any(map(self.is_included, idents)):
+            return False
+        self.included.extend(branch.included)
+        self._included_idents.update(idents)
+        self._included_paths.extend(branch._included_paths)
+        return True
+
+    def _prefetch_next(self, body, factory):
+        link = body.get('links', {}).get('next')
+        if isinstance(link, dict):
+            link = link['href']
+        if not link:
+            return
+        parts = urllib.parse.urlsplit(link)
+        cache = self.response_cache
+        # Copy the context now, since this context continues to change
+        # while the prefetch runs in the background.  The next page is
+        # for the same endpoint; the path of the link may include a
+        # script root not part of the path of requests.
+        context = self._for_query_string(self._path, parts.query)
+
+        def prefetch():
+            key = 'collection', context.request_key
+
+            def build():
+                body = context._collection_body(factory())
+                return context._encode(body), context._document_headers()
+
+            cache.get(key, build)
+
+        self.prefetcher.submit(link, prefetch)
+
+    def _for_query_string(self, path, query_string):
+        # Like _detached(), but for a different request.
+        context = self._detached()
+        context.fields = {}
+        context.relpaths = set()
+        context._path = path
+        context._request_key = None
+        context._parse_query_string(query_string)
+        return context
 
     def _apply_query_params(self, links):
         for lname in ('self', 'first', 'next', 'prev', 'last'):
@@ -393,12 +1133,22 @@ class Context(_BaseContext):
                 links[lname]['href'] = f'{link}{qp}{items}'
 
     def _prepare_collection(self, collection):
-        self._collection_prop(
-            collection, kt.jsonapi.interfaces.IFilterableCollection,
-            'set_filter', 'filter', 'filtering')
-        self._collection_prop(
-            collection, kt.jsonapi.interfaces.ISortableCollection,
-            'set_sort', 'sort', 'sorting')
+        if (kt.jsonapi.interfaces.IFilterAstCollection.providedBy(collection)
+                and 'filter' in self._query):
+            collection.set_filter_ast(kt.jsonapi.filtering.parse_filter(
+                self._query['filter'], collection.filter_fields))
+        else:
+            self._collection_prop(
+                collection, kt.jsonapi.interfaces.IFilterableCollection,
+                'set_filter', 'filter', 'filtering')
+        if (kt.jsonapi.interfaces.ISortSpecCollection.providedBy(collection)
+                and 'sort' in self._query):
+            collection.set_sort_spec(kt.jsonapi.sorting.parse_sort(
+                self._query['sort'], collection.sort_fields))
+        else:
+            self._collection_prop(
+                collection, kt.jsonapi.interfaces.ISortableCollection,
+                'set_sort', 'sort', 'sorting')
         self._collection_prop(
             collection, kt.jsonapi.interfaces.IPagableCollection,
             'set_pagination', 'page', 'pagination')
@@ -407,7 +1157,8 @@ class Context(_BaseContext):
         if iface.providedBy(collection):
             if key in self._query:
                 method = getattr(collection, method)
-                qdata = self._query[key]
+                # The parsed query may be shared with other contexts.
+                qdata = copy.deepcopy(self._query[key])
                 method(qdata)
         elif key in self._query:
             raise werkzeug.exceptions.BadRequest(
@@ -498,7 +1249,8 @@ class Context(_BaseContext):
         if 'include' in self._query:
             body['included'] = self.included
 
-        return self._response(body, headers=headers)
+        return self._make_response(self._encode(body), 200, headers,
+                                   self._document_headers())
 
     def relationship(self, relationship, headers=None):
         """Generate response containing a relationship as primary data.
@@ -570,7 +1322,7 @@ class Context(_BaseContext):
 
         return self._response(body, headers=headers)
 
-    def resource(self, resource, headers=None):
+    def resource(self, resource=None, headers=None, factory=None):
         """Generate response containing a resource as primary data.
 
         If *headers* is given and non-``None``, it must be be mapping of
@@ -578,16 +1330,29 @@ class Context(_BaseContext):
         **Content-Type** header is provided, it will be used instead of
         the default value for JSON:API responses.
 
+        Instead of *resource*, a *factory* may be provided, as for
+        :meth:`collection`.
+
         The **links** member of the response payload will include a
         **self** link based on the **self** link for the resource, with
         query parameters copied from the request.
 
+        .. versionchanged:: 1.8.0
+           Added the *factory* parameter.
+
         """
+        data, extra = self._render('resource', resource, factory)
+        return self._make_response(data, 200, headers, extra)
+
+    def _resource_body(self, resource):
         self._disallow_collection_params('resource')
         resource = kt.jsonapi.interfaces.IResource(resource)
         key = resource.type, resource.id
         self._included_idents.add(key)
-        data = kt.jsonapi.serializers.resource(self, resource)
+        if self.include_cache is not None and self.relpaths:
+            data = self._serialize_with_include_cache(resource)
+        else:
+            data = kt.jsonapi.serializers.resource(self, resource)
         link = self._resource_self_link(data)
         data = dict(data=data)
         if link:
@@ -595,7 +1360,37 @@ class Context(_BaseContext):
             self._apply_query_params(data['links'])
         if 'include' in self._query:
             data['included'] = self.included
-        return self._response(data, headers=headers)
+        return data
+
+    def _serialize_with_include_cache(self, resource):
+        cache = self.include_cache
+        closure = cache.get(resource.type, resource.id, self.relpaths)
+        loaded = None if closure is None else cache.load(closure)
+        if loaded is not None:
+            loaded = [(relpath, kt.jsonapi.interfaces.IResource(included))
+                      for relpath, included in loaded]
+            # Marking everything as included up front causes the
+            # relationship traversal to stop at the linkage.
+            for relpath, included in loaded:
+                self._included_idents.add((included.type, included.id))
+            data = kt.jsonapi.serializers.resource(self, resource)
+            try:
+                for relpath, included in loaded:
+                    self._relstack[:] = relpath
+                    self.included.append(
+                        kt.jsonapi.serializers.resource(self, included))
+                    self._included_paths.append(relpath)
+            finally:
+                self._relstack[:] = []
+            return data
+
+        start = len(self.included)
+        data = kt.jsonapi.serializers.resource(self, resource)
+        closure = [(relpath, included['type'], included['id'])
+                   for relpath, included in zip(self._included_paths[start:],
+                                                self.included[start:])]
+        cache.set(resource.type, resource.id, self.relpaths, closure)
+        return data
 
     def created(self, resource, headers=None, location=None):
         """Generate response containing a resource as primary data.
@@ -625,7 +1420,7 @@ class Context(_BaseContext):
             self._apply_query_params(data['links'])
         if 'include' in self._query:
             data['included'] = self.included
-        hdrs = flask.app.Headers()
+        hdrs = werkzeug.datastructures.Headers()
         if headers is not None:
             hdrs.extend(headers)
         if location:
@@ -641,6 +1436,82 @@ class Context(_BaseContext):
         return link
 
 
+class RenderContext(Context):
+    """Context for generating documents without a request.
+
+    This is useful for generating JSON:API documents in background jobs
+    or message publishers.  Sparse fieldsets and relationship paths to
+    include are provided as structured arguments, validated once, and
+    re-used for every document generated using the context.
+
+    The documents are the same as those generated by the response
+    methods of :class:`Context` for a request with equivalent ``fields``
+    and ``include`` query parameters.
+
+    .. versionadded:: 1.8.0
+
+    """
+
+    def __init__(self, fields=None, include=None, app=None,
+                 json_encoder=None, path=None):
+        """Initialize context.
+
+        :param fields:
+            Mapping from type names to iterables of field names, as for
+            ``fields[TYPENAME]`` query parameters.
+        :param include:
+            Iterable of relationship paths, as for the ``include`` query
+            parameter.  If ``None``, the ``included`` member will be
+            omitted from documents.
+        :param app:
+            Flask application whose JSON configuration should be used
+            for encoding documents.
+        :param json_encoder:
+            :class:`json.JSONEncoder` subclass used for encoding
+            documents if *app* is not provided.
+        :param path:
+            Path used as part of the :attr:`~Context.request_key`.
+
+        """
+        params = []
+        for tname, tfields in (fields or {}).items():
+            params.append((f'fields[{tname}]', ','.join(tfields)))
+        if include is not None:
+            params.append(('include', ','.join(include)))
+        query_string = urllib.parse.urlencode(params, safe='[],')
+        if app is None:
+            app = _StaticApp(json_encoder)
+        super(RenderContext, self).__init__(
+            app, _StaticRequest(path, query_string))
+
+    def collection_document(self, collection):
+        """Return document with *collection* as the primary data."""
+        self._reset()
+        return self._add_jsonapi(self._collection_body(collection))
+
+    def resource_document(self, resource):
+        """Return document with *resource* as the primary data."""
+        self._reset()
+        return self._add_jsonapi(self._resource_body(resource))
+
+    def render_collection(self, collection):
+        """Return encoded document with *collection* as the primary data.
+        """
+        self._reset()
+        return self._encode(self._collection_body(collection))
+
+    def render_resource(self, resource):
+        """Return encoded document with *resource* as the primary data."""
+        self._reset()
+        return self._encode(self._resource_body(resource))
+
+    def render_resources(self, resources):
+        """Generate an encoded document for each resource in *resources*.
+        """
+        for resource in resources:
+            yield self.render_resource(resource)
+
+
 class ErrorContext(_BaseContext):
     """Request context for JSON:API responses.
 
@@ -0,0 +1,66 @@
+"""\
+Response generation for ASGI applications.
+
+The contexts defined here parse the request from the ASGI connection
+scope and return :class:`Response` objects, which are themselves ASGI
+applications::
+
+    async def application(scope, receive, send):
+        context = kt.jsonapi.asgi.ASGIContext(scope)
+        response = await context.collection(get_things())
+        await response(scope, receive, send)
+
+:class:`ASGIContext` is derived from
+:class:`~kt.jsonapi.aio.AsyncContext`, so response methods must be
+awaited and asynchronous application objects are supported.  Documents
+are encoded using :func:`json.dumps`, with the :class:`json.JSONEncoder`
+subclass passed as *json_encoder*.
+
+"""
+
+import kt.jsonapi.aio
+import kt.jsonapi.api
+
+
+class Response(kt.jsonapi.api.Response):
+    """Response that can be returned as an ASGI application."""
+
+    async def __call__(self, scope, receive, send):
+        await send({
+            'type': 'http.response.start',
+            'status': self.status,
+            'headers': [(name.lower().encode('latin-1'),
+                         value.encode('latin-1'))
+                        for name, value in self.header_items()],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': self.body,
+        })
+
+
+class _ScopeRequest:
+
+    def __init__(self, scope):
+        self.path = scope['path']
+        self.query_string = scope.get('query_string', b'')
+
+
+class _ASGIContextMixin:
+
+    response_class = Response
+
+    def __init__(self, scope, json_encoder=None):
+        super(_ASGIContextMixin, self).__init__(
+            kt.jsonapi.api._StaticApp(json_encoder), _ScopeRequest(scope))
+
+    def _build_response(self, data, status, headers):
+        return self.response_class(data, status, headers)
+
+
+class ASGIContext(_ASGIContextMixin, kt.jsonapi.aio.AsyncContext):
+    """Context for a request described by an ASGI HTTP scope."""
+
+
+class ASGIErrorContext(_ASGIContextMixin, kt.jsonapi.api.ErrorContext):
+    """Context for error responses described by an ASGI HTTP scope."""
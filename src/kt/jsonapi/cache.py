@@ -0,0 +1,660 @@
+"""\
+Caches that allow work to be skipped during serialization.
+
+Other than the :class:`QueryStringCache`, nothing here is used unless
+an application configures it on the context; see the ``*_cache``
+attributes of :class:`~kt.jsonapi.api.Context`.  All caches are safe to
+share among threads.
+
+"""
+
+import collections
+import concurrent.futures
+import logging
+import math
+import random
+import threading
+import time
+
+import zope.interface
+import zope.schema.interfaces
+
+import kt.jsonapi.interfaces
+
+
+_MISSING = object()
+
+logger = logging.getLogger(__name__)
+
+
+def _freeze(value):
+    # Convert parsed query data to a hashable form that does not depend
+    # on the order in which keys were provided.
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(val))
+                            for key, val in value.items()))
+    return value
+
+
+class _BoundedCache:
+    """Least-recently-used mapping with optional time-based expiration."""
+
+    def __init__(self, maxsize=1024, ttl=None, clock=time.monotonic):
+        """Initialize an empty cache.
+
+        :param maxsize:
+            Maximum number of entries retained; the least recently used
+            entries are discarded when the limit is exceeded.
+        :param ttl:
+            Number of seconds entries remain valid, or ``None`` if
+            entries should only be discarded based on *maxsize*.
+        :param clock:
+            Function returning the current time in seconds; used for
+            testing.
+
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        with self._lock:
+            self._data.clear()
+
+    def _get(self, key):
+        with self._lock:
+            try:
+                expires, value = self._data[key]
+            except KeyError:
+                return _MISSING
+            if expires is not None and expires <= self._clock():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def _set(self, key, value):
+        expires = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            self._data[key] = expires, value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def _discard(self, predicate):
+        with self._lock:
+            for key in [key for key in self._data if predicate(key)]:
+                del self._data[key]
+
+
+class LinkageCache(_BoundedCache):
+    """Cache of resource linkage for to-many relationships.
+
+    Each entry maps the source resource type & identifier, the name of
+    the relationship, and a version to a tuple of ``(type, id)`` pairs
+    identifying the related resources.  The version is taken from the
+    ``version`` attribute of the relationship, if provided; applications
+    which can cheaply identify the revision of a membership list should
+    provide it so stale entries are never used.
+
+    Only relationships providing both ``name`` and ``source`` values are
+    cached.
+
+    """
+
+    def get(self, source_type, source_id, name, version=None):
+        """Return cached linkage as a tuple of ``(type, id)`` pairs.
+
+        Returns ``None`` if there is no usable entry.
+
+        """
+        value = self._get((source_type, source_id, name, version))
+        return None if value is _MISSING else value
+
+    def set(self, source_type, source_id, name, identifiers, version=None):
+        """Store linkage for a relationship.
+
+        *identifiers* must be an iterable of ``(type, id)`` pairs.
+
+        """
+        self._set((source_type, source_id, name, version), tuple(identifiers))
+
+    def invalidate(self, source_type, source_id, name=None):
+        """Discard cached linkage for a source resource.
+
+        If *name* is given, only linkage for the named relationship is
+        discarded; all versions are affected.
+
+        This should be called whenever relationship membership changes
+        for relationships that do not provide a ``version``.
+
+        """
+        def predicate(key):
+            return (key[0] == source_type and key[1] == source_id
+                    and (name is None or key[2] == name))
+
+        self._discard(predicate)
+
+
+class IncludeCache(_BoundedCache):
+    """Cache of resources reached from a primary resource via ``include``.
+
+    Each entry maps the type & identifier of a primary resource and the
+    set of requested relationship paths to the *closure*: a sequence of
+    ``(relpath, type, id)`` triples for the included resources, in the
+    order they appear in the ``included`` member of the response.
+    *relpath* is a tuple of relationship names identifying how the
+    resource was reached.
+
+    When a cached closure is available, the included resources are
+    retrieved using the *loader* and serialized directly, without
+    following relationships to discover them.  This is most effective
+    when combined with a :class:`LinkageCache`, since the linkage for
+    relationships between included resources can then be generated
+    without consulting the related collections.
+
+    """
+
+    def __init__(self, loader, maxsize=1024, ttl=None, clock=time.monotonic):
+        """Initialize an empty cache.
+
+        :param loader:
+            Function accepting a sequence of ``(type, id)`` pairs and
+            returning a sequence of corresponding resources.  If any
+            resource cannot be loaded, ``None`` must be returned in its
+            place; the closure will then be discovered by following
+            relationships.
+
+        Remaining parameters are as for :class:`LinkageCache`.
+
+        """
+        super(IncludeCache, self).__init__(maxsize=maxsize, ttl=ttl,
+                                           clock=clock)
+        self.loader = loader
+
+    def get(self, type, id, relpaths):
+        """Return the cached closure for a primary resource, or ``None``.
+
+        *relpaths* is the set of relationship paths requested using the
+        ``include`` query parameter.
+
+        """
+        value = self._get((type, id, frozenset(relpaths)))
+        return None if value is _MISSING else value
+
+    def set(self, type, id, relpaths, closure):
+        """Store the closure for a primary resource."""
+        self._set((type, id, frozenset(relpaths)), tuple(closure))
+
+    def load(self, closure):
+        """Load resources for a closure.
+
+        Returns a list of ``(relpath, resource)`` pairs, or ``None`` if
+        any resource could not be loaded.
+
+        """
+        resources = list(self.loader([(type, id)
+                                      for relpath, type, id in closure]))
+        if (len(resources) != len(closure)
+                or any(resource is None for resource in resources)):
+            return None
+        return [(relpath, resource)
+                for (relpath, type, id), resource in zip(closure, resources)]
+
+    def invalidate(self, type, id):
+        """Discard every closure that contains the identified resource,
+        or for which it is the primary resource.
+
+        This should be called when relationships of the resource change.
+
+        """
+        def predicate(key):
+            if key[:2] == (type, id):
+                return True
+            value = self._data[key][1]
+            return any(entry[1:] == (type, id) for entry in value)
+
+        self._discard(predicate)
+
+
+class ResultCache(_BoundedCache):
+    """Read-through cache of collection results.
+
+    Entries map a key identifying a collection, combined with the
+    filtering, sorting and pagination parameters applied to it, to the
+    identifiers of the resources it produced, along with the links and
+    metadata for the collection.  Resources are re-created from the
+    identifiers using the *loader*.
+
+    Collections are wrapped using :meth:`wrap`; the wrapper can be used
+    anywhere the original collection could be.
+
+    """
+
+    def __init__(self, loader, maxsize=1024, ttl=60, clock=time.monotonic):
+        """Initialize an empty cache.
+
+        :param loader:
+            Function accepting a sequence of ``(type, id)`` pairs and
+            returning a sequence of corresponding resources, as for
+            :class:`IncludeCache`.
+
+        Remaining parameters are as for :class:`LinkageCache`, but a
+        *ttl* is used by default, since collection membership may
+        change without notice.
+
+        """
+        super(ResultCache, self).__init__(maxsize=maxsize, ttl=ttl,
+                                          clock=clock)
+        self.loader = loader
+
+    def wrap(self, collection, key):
+        """Return a wrapper for *collection* that consults the cache.
+
+        *key* must be a hashable value identifying the collection, such
+        as the path of the request; collections with the same *key* are
+        assumed to produce the same results for the same parameters.
+
+        """
+        return CachedCollection(self, collection, key)
+
+    def invalidate(self, key=None):
+        """Discard cached results for the collection identified by *key*,
+        or for all collections if *key* is ``None``."""
+        self._discard(lambda k: key is None or k[0] == key)
+
+
+class CachedCollection:
+    """Wrapper for a collection that retrieves results from a
+    :class:`ResultCache` when possible.
+
+    The wrapper provides the same interfaces as the wrapped collection.
+    Filtering, sorting and pagination parameters are passed through to
+    the wrapped collection immediately, so any validation it performs
+    continues to be applied.
+
+    """
+
+    def __init__(self, cache, collection, key):
+        self._cache = cache
+        self._collection = kt.jsonapi.interfaces.ICollection(collection)
+        self._key = key
+        self._params = {}
+        self._result = None
+        zope.interface.directlyProvides(
+            self, zope.interface.providedBy(self._collection))
+
+    def set_filter(self, filter):
+        self._params['filter'] = filter
+        self._collection.set_filter(filter)
+
+    @property
+    def filter_fields(self):
+        return self._collection.filter_fields
+
+    def set_filter_ast(self, expression):
+        self._params['filter'] = expression
+        self._collection.set_filter_ast(expression)
+
+    def set_sort(self, sort):
+        self._params['sort'] = sort
+        self._collection.set_sort(sort)
+
+    @property
+    def sort_fields(self):
+        return self._collection.sort_fields
+
+    def set_sort_spec(self, spec):
+        self._params['sort'] = spec
+        self._collection.set_sort_spec(spec)
+
+    def set_pagination(self, page):
+        self._params['page'] = page
+        self._collection.set_pagination(page)
+
+    def _get_result(self):
+        if self._result is None:
+            key = self._key, _freeze(self._params)
+            entry = self._cache._get(key)
+            if entry is not _MISSING:
+                identifiers, links, meta = entry
+                resources = self._cache.loader(identifiers)
+                resources = [] if resources is None else list(resources)
+                if (len(resources) == len(identifiers)
+                        and all(res is not None for res in resources)):
+                    self._result = resources, links, meta
+                    return self._result
+            resources = [kt.jsonapi.interfaces.IResource(res)
+                         for res in self._collection.resources()]
+            links = dict(self._collection.links())
+            meta = dict(self._collection.meta())
+            identifiers = tuple((res.type, res.id) for res in resources)
+            self._cache._set(key, (identifiers, links, meta))
+            self._result = resources, links, meta
+        return self._result
+
+    def resources(self):
+        return self._get_result()[0]
+
+    def links(self):
+        return dict(self._get_result()[1])
+
+    def meta(self):
+        return dict(self._get_result()[2])
+
+
+class _Call:
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.failed = False
+        self.result = None
+
+
+class RequestCoalescer:
+    """Share results among concurrent builds of the same document.
+
+    While a build for a key is in progress, later requests for the same
+    key wait for it to complete and receive the same result, instead of
+    repeating the work.  This works across threads in a single process.
+
+    If the first build fails or does not complete within *timeout*
+    seconds, waiting requests build the result themselves; failures are
+    therefore reported to each request separately.
+
+    """
+
+    def __init__(self, timeout=10.0):
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, build):
+        """Return the result of calling *build*, sharing the result with
+        concurrent calls using the same *key*."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            if call.event.wait(self.timeout) and not call.failed:
+                return call.result
+            return build()
+        try:
+            call.result = build()
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class ResponseCache:
+    """Cache of encoded response documents.
+
+    Entries are fresh for *ttl* seconds, after which they are stale for
+    up to *stale_ttl* additional seconds.  A stale entry is returned
+    immediately while a replacement is built in the background; entries
+    older than that are rebuilt before returning.
+
+    To avoid many entries expiring at once, an entry may be treated as
+    stale before its *ttl* has elapsed, with a probability that rises as
+    expiration approaches and with the time it took to build the entry
+    (the "XFetch" algorithm).  *beta* controls how eagerly this
+    happens; ``0`` disables early expiration.
+
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, stale_ttl=300, beta=1.0,
+                 executor=None, clock=time.monotonic, random=random.random):
+        """Initialize an empty cache.
+
+        :param executor:
+            :class:`concurrent.futures.Executor` used to build
+            replacements for stale entries.  If not provided, a small
+            thread pool is created when first needed.
+
+        *clock* and *random* are used for testing.
+
+        """
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.beta = beta
+        self._entries = _BoundedCache(maxsize=maxsize, clock=clock)
+        self._executor = executor
+        self._clock = clock
+        self._random = random
+        self._lock = threading.Lock()
+        self._refreshing = set()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix='kt.jsonapi.cache')
+            return self._executor
+
+    def clear(self):
+        """Remove all entries from the cache."""
+        self._entries.clear()
+
+    def invalidate(self, key):
+        """Discard the entry for *key*, if any."""
+        self._entries._discard(lambda k: k == key)
+
+    def get(self, key, build, refresh=None):
+        """Return the cached value for *key*, building it if needed.
+
+        *build* is called with no arguments to generate a value when
+        there is no usable entry.  *refresh* is called in the same way
+        from a background thread to replace a stale entry; it must not
+        depend on the current request.  If *refresh* is ``None``, stale
+        entries are not served.
+
+        """
+        now = self._clock()
+        entry = self._entries._get(key)
+        if entry is not _MISSING:
+            value, expires, delta = entry
+            if refresh is not None and now < expires + self.stale_ttl:
+                early = delta * self.beta * -math.log(
+                    self._random() or 1e-12)
+                if now + early >= expires:
+                    self._schedule(key, refresh)
+                return value
+            if now < expires:
+                return value
+        return self._build(key, build)
+
+    def set(self, key, value, delta=0.0):
+        """Store *value* for *key*.
+
+        *delta* is the number of seconds it took to build the value.
+
+        """
+        self._entries._set(key, (value, self._clock() + self.ttl, delta))
+
+    def _build(self, key, build):
+        start = self._clock()
+        value = build()
+        self.set(key, value, delta=self._clock() - start)
+        return value
+
+    def _schedule(self, key, refresh):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        try:
+            self.executor.submit(self._refresh, key, refresh)
+        except RuntimeError:
+            # The executor has been shut down; keep serving the entry.
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _refresh(self, key, refresh):
+        try:
+            self._build(key, refresh)
+        except Exception:
+            logger.exception('failed to refresh cached response %r', key)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+
+class Prefetcher:
+    """Run speculative work in the background, within limits.
+
+    Work is discarded rather than queued when the number of pending or
+    running tasks reaches *max_pending*, or when *overloaded* returns a
+    true value.  When overloaded, tasks that have not started are
+    cancelled as well, so speculative work gives way to requests.
+
+    """
+
+    def __init__(self, max_pending=4, executor=None, overloaded=None):
+        """Initialize prefetcher.
+
+        :param max_pending:
+            Maximum number of tasks pending or running at once.
+        :param executor:
+            :class:`concurrent.futures.Executor` used to run tasks.  If
+            not provided, a small thread pool is created when first
+            needed.
+        :param overloaded:
+            Function returning true when the application is too busy
+            for speculative work, or ``None``.
+
+        """
+        self.max_pending = max_pending
+        self.overloaded = overloaded
+        self._executor = executor
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    @property
+    def executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=2, thread_name_prefix='kt.jsonapi.prefetch')
+            return self._executor
+
+    def submit(self, key, func):
+        """Schedule *func* to be called with no arguments.
+
+        Returns true if the task was scheduled; tasks for a *key* that
+        is already pending are not scheduled again.
+
+        """
+        if self.overloaded is not None and self.overloaded():
+            self.cancel()
+            return False
+        with self._lock:
+            if key in self._pending or len(self._pending) >= self.max_pending:
+                return False
+            self._pending[key] = None
+        try:
+            future = self.executor.submit(self._run, key, func)
+        except RuntimeError:
+            # The executor has been shut down.
+            with self._lock:
+                del self._pending[key]
+            return False
+        with self._lock:
+            if key in self._pending:
+                self._pending[key] = future
+        return True
+
+    def cancel(self):
+        """Cancel all tasks which have not started."""
+        with self._lock:
+            pending = [(key, future) for key, future in self._pending.items()
+                       if future is not None]
+        for key, future in pending:
+            if future.cancel():
+                with self._lock:
+                    self._pending.pop(key, None)
+
+    def _run(self, key, func):
+        try:
+            func()
+        except Exception:
+            logger.exception('speculative work failed for %r', key)
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+
+def _copy_exception(exc):
+    # Exceptions are not reconstructed using their constructors, since
+    # those may require more than the message.
+    copy = BaseException.__new__(type(exc), *exc.args)
+    copy.__dict__.update(exc.__dict__)
+    return copy
+
+
+class QueryStringCache(_BoundedCache):
+    """Cache of parsed query strings.
+
+    Clients tend to send the same small set of query strings repeatedly,
+    so the result of parsing and validating each is retained.  Errors
+    reported for malformed query strings are retained as well; a new
+    copy of the exception is raised each time.
+
+    An instance shared by all contexts is used by default; see
+    :attr:`~kt.jsonapi.api.Context.query_cache`.
+
+    """
+
+    def __init__(self, maxsize=256, max_length=2048):
+        """Initialize an empty cache.
+
+        :param maxsize:  Maximum number of query strings retained.
+        :param max_length:
+            Query strings longer than this are parsed every time, so
+            the memory used by the cache remains bounded.
+
+        """
+        super(QueryStringCache, self).__init__(maxsize=maxsize)
+        self.max_length = max_length
+
+    def get(self, key, query_string, parse):
+        """Return the result of ``parse(query_string)``.
+
+        *key* distinguishes parsers that produce different results for
+        the same query string.  The result must not be modified by the
+        caller, since it may be shared.
+
+        """
+        if len(query_string) > self.max_length:
+            return parse(query_string)
+        key = key, query_string
+        entry = self._get(key)
+        if entry is _MISSING:
+            try:
+                result = parse(query_string)
+            except (kt.jsonapi.interfaces.QueryStringException,
+                    zope.schema.interfaces.ValidationError) as e:
+                self._set(key, (None, _copy_exception(e)))
+                raise
+            self._set(key, (result, None))
+            return result
+        result, error = entry
+        if error is not None:
+            raise _copy_exception(error)
+        return result
@@ -0,0 +1,623 @@
+"""\
+Collections of resources held in memory.
+
+Applications with resources in memory, such as cached or configured
+data, can use :class:`MemoryCollection` instead of implementing
+filtering, sorting, and pagination themselves.  Larger or long-lived
+sets of resources can be kept in a :class:`ResourceStore`, which
+maintains indexes used by the :class:`IndexedCollection` views it
+creates.
+
+"""
+
+import bisect
+import heapq
+import itertools
+import operator
+import threading
+
+import zope.interface
+
+import kt.jsonapi.filtering
+import kt.jsonapi.interfaces
+import kt.jsonapi.link
+import kt.jsonapi.sorting
+
+
+def attribute_record(resource):
+    """Return a record of the attributes and identifier of *resource*.
+
+    This is the default *record* function for :class:`MemoryCollection`
+    and :class:`ResourceStore`; the identifier is available as the
+    ``id`` field.
+
+    """
+    return dict(resource.attributes(), id=resource.id)
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IFilterAstCollection,
+                            kt.jsonapi.interfaces.IFilterableCollection,
+                            kt.jsonapi.interfaces.ISortSpecCollection,
+                            kt.jsonapi.interfaces.ISortableCollection,
+                            kt.jsonapi.interfaces.IPagableCollection)
+class _Collection:
+    # Parameter handling and pagination shared by the collections;
+    # subclasses implement _select().
+
+    top_k_fraction = 0.05
+    """Fraction of matching resources below which top-k selection is used.
+
+    Both strategies compute the sort key of every resource, so top-k
+    selection only pays off when the page ends well before the last
+    resource.  Measurements show a full sort becoming faster once the
+    page ends beyond about a tenth of the resources; the default of
+    0.05 is half of that, leaving a margin for variation between data
+    sets.
+
+    """
+
+    def __init__(self, filter_fields, sort_fields, links, meta, page_size,
+                 max_page_size):
+        self.filter_fields = dict(filter_fields or {})
+        self.sort_fields = frozenset(sort_fields)
+        self._links = dict(links or {})
+        self._meta = dict(meta or {})
+        self._expression = None
+        self._predicate = None
+        self._sort = ()
+        self._number = 1
+        self._size = page_size
+        self._max_page_size = max_page_size
+        self._selected = None
+        self._total = None
+
+    def set_filter(self, filter):
+        self.set_filter_ast(kt.jsonapi.filtering.parse_filter(
+            filter, self.filter_fields))
+
+    def set_filter_ast(self, expression):
+        self._expression = expression
+        self._predicate = kt.jsonapi.filtering.compile_filter(expression)
+
+    def set_sort(self, sort):
+        self.set_sort_spec(kt.jsonapi.sorting.parse_sort(
+            sort, self.sort_fields))
+
+    def set_sort_spec(self, spec):
+        self._sort = spec
+
+    def set_pagination(self, page):
+        if not isinstance(page, dict):
+            raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                "query string key 'page' must map pagination parameters"
+                " to values",
+                key='page',
+                value=page)
+        values = {}
+        for name, value in page.items():
+            key = f'page[{name}]'
+            if name not in ('number', 'size'):
+                raise kt.jsonapi.interfaces.InvalidQueryKey(
+                    f'unsupported pagination parameter {name!r}', key=key)
+            if isinstance(value, str) and value.isdecimal():
+                values[name] = int(value)
+            if values.get(name, 0) < 1:
+                raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                    f'value for query string key {key!r} must be a'
+                    f' positive integer',
+                    key=key,
+                    value=value)
+        size = values.get('size', self._size or self._max_page_size)
+        if size > self._max_page_size:
+            raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                f"value for query string key 'page[size]' must not exceed"
+                f' {self._max_page_size}',
+                key='page[size]',
+                value=page.get('size', size))
+        self._number = values.get('number', 1)
+        self._size = size
+
+    def _window(self):
+        if self._size is None:
+            return 0, None
+        start = (self._number - 1) * self._size
+        return start, start + self._size
+
+    def _page_link(self, href, number):
+        sep = '&' if '?' in href else '?'
+        return kt.jsonapi.link.Link(
+            f'{href}{sep}page[number]={number}&page[size]={self._size}')
+
+    def _selection(self):
+        if self._selected is None:
+            self._selected = self._select()
+        return self._selected
+
+    def resources(self):
+        return list(self._selection())
+
+    def links(self):
+        links = dict(self._links)
+        if self._size is not None and 'self' in links:
+            self._selection()
+            href = links['self']
+            href = getattr(href, 'href', href)
+            last = max(1, -(-self._total // self._size))
+            links['first'] = self._page_link(href, 1)
+            links['last'] = self._page_link(href, last)
+            links['prev'] = (self._page_link(href, self._number - 1)
+                             if 1 < self._number <= last + 1 else None)
+            links['next'] = (self._page_link(href, self._number + 1)
+                             if self._number < last else None)
+        return links
+
+    def meta(self):
+        return dict(self._meta)
+
+
+class MemoryCollection(_Collection):
+    """Collection of resources held in memory.
+
+    Filter expressions are compiled using
+    :func:`~kt.jsonapi.filtering.compile_filter` and evaluated against a
+    record of field values for each resource, computed by calling
+    *record* with the resource.  Sorting uses the same records.  Records
+    are computed only if filtering or sorting is requested.
+
+    Pagination uses the ``page[number]`` and ``page[size]`` query
+    parameters, numbering pages from 1.  When a sorted page ends within
+    :attr:`top_k_fraction` of the matching resources, only the resources
+    up to the end of the page are selected, using :func:`heapq.nsmallest`
+    in O(n log k) time rather than sorting all of them.
+
+    A new collection should be created for each request, since the
+    parameters are retained by the collection.  The raw parameters are
+    accepted as well, via the ``set_filter`` and ``set_sort`` methods.
+
+    """
+
+    def __init__(self, resources, filter_fields=None, record=None,
+                 links=None, meta=None, sort_fields=(), page_size=None,
+                 max_page_size=100):
+        """Initialize with resources and description of parameters.
+
+        :param resources:
+            Iterable of objects that can be adapted to
+            :class:`~kt.jsonapi.interfaces.IResource`.
+        :param filter_fields:
+            Mapping from names of fields that may be used in filters to
+            :class:`~kt.jsonapi.filtering.FilterField` objects.  If
+            omitted, filtering is not supported.
+        :param record:
+            Function returning a mapping of field values for a resource;
+            defaults to :func:`attribute_record`.
+        :param links:
+            Links for the collection.  If pagination is applied and a
+            ``self`` link is provided, pagination links are generated
+            from it.
+        :param meta:
+            Metadata for the collection.
+        :param sort_fields:
+            Collection of names of fields that may be used for sorting.
+            If omitted, sorting is not supported.
+        :param page_size:
+            Number of resources in each page if pagination is not
+            requested, or ``None`` if all resources should be returned.
+        :param max_page_size:
+            Largest page size that may be requested; also used as the
+            page size if only ``page[number]`` is requested and
+            *page_size* is ``None``.
+
+        """
+        super(MemoryCollection, self).__init__(
+            filter_fields, sort_fields, links, meta, page_size,
+            max_page_size)
+        self._resources = [kt.jsonapi.interfaces.IResource(resource)
+                           for resource in resources]
+        self._record = record or attribute_record
+
+    def _select(self):
+        items = self._resources
+        start, stop = self._window()
+        if self._predicate is None and not self._sort:
+            self._total = len(items)
+            return items[start:stop]
+        pairs = [(self._record(res), res) for res in items]
+        if self._predicate is not None:
+            predicate = self._predicate
+            pairs = [pair for pair in pairs if predicate(pair[0])]
+        self._total = len(pairs)
+        if self._sort:
+            key = kt.jsonapi.sorting.key_function(
+                self._sort, operator.itemgetter(0))
+            if stop is not None and stop <= len(pairs) * self.top_k_fraction:
+                pairs = heapq.nsmallest(stop, pairs, key=key)
+            else:
+                pairs = sorted(pairs, key=key)
+        return [res for record, res in pairs[start:stop]]
+
+
+class _HashIndex:
+
+    def __init__(self):
+        self._ids = {}
+
+    def add(self, value, id):
+        self._ids.setdefault(value, set()).add(id)
+
+    def remove(self, value, id):
+        ids = self._ids[value]
+        ids.remove(id)
+        if not ids:
+            del self._ids[value]
+
+    def lookup(self, node):
+        try:
+            if isinstance(node, kt.jsonapi.filtering.Comparison):
+                if node.op == 'eq':
+                    return self._ids.get(node.value, ())
+            elif isinstance(node, kt.jsonapi.filtering.In):
+                return set().union(*(self._ids.get(value, ())
+                                     for value in node.values))
+        except TypeError:
+            # Unhashable values; the predicate will decide.
+            pass
+        return None
+
+
+class _SortedIndex:
+    # Parallel lists of values and identifiers, ordered by value and
+    # then by identifier; None values are kept separately, since they
+    # cannot be compared with other values.
+
+    def __init__(self):
+        self._values = []
+        self._ids = []
+        self._nulls = set()
+
+    def load(self, entries):
+        # Bulk load of (value, id) pairs into an empty index, sorting
+        # once instead of inserting each entry.
+        nulls = [id for value, id in entries if value is None]
+        entries = sorted((value, id) for value, id in entries
+                         if value is not None)
+        self._values = [value for value, id in entries]
+        self._ids = [id for value, id in entries]
+        self._nulls = set(nulls)
+
+    def _position(self, value, id):
+        lo = bisect.bisect_left(self._values, value)
+        hi = bisect.bisect_right(self._values, value, lo)
+        return bisect.bisect_left(self._ids, id, lo, hi)
+
+    def add(self, value, id):
+        if value is None:
+            self._nulls.add(id)
+        else:
+            pos = self._position(value, id)
+            self._values.insert(pos, value)
+            self._ids.insert(pos, id)
+
+    def remove(self, value, id):
+        if value is None:
+            self._nulls.remove(id)
+        else:
+            pos = self._position(value, id)
+            if pos == len(self._ids) or self._ids[pos] != id:
+                raise KeyError(id)
+            del self._values[pos]
+            del self._ids[pos]
+
+    def _bounds(self, op, value):
+        values = self._values
+        if op == 'eq':
+            lo = bisect.bisect_left(values, value)
+            return lo, bisect.bisect_right(values, value, lo)
+        if op == 'lt':
+            return 0, bisect.bisect_left(values, value)
+        if op == 'le':
+            return 0, bisect.bisect_right(values, value)
+        if op == 'gt':
+            return bisect.bisect_right(values, value), len(values)
+        if op == 'ge':
+            return bisect.bisect_left(values, value), len(values)
+        return None
+
+    def lookup(self, node):
+        try:
+            if isinstance(node, kt.jsonapi.filtering.Comparison):
+                if node.value is None:
+                    return None
+                bounds = self._bounds(node.op, node.value)
+                return None if bounds is None else self._ids[slice(*bounds)]
+            if isinstance(node, kt.jsonapi.filtering.In):
+                if None in node.values:
+                    return None
+                ids = set()
+                for value in node.values:
+                    ids.update(self._ids[slice(*self._bounds('eq', value))])
+                return ids
+            if isinstance(node, kt.jsonapi.filtering.Range):
+                lo, hi = 0, len(self._values)
+                if node.low is not None:
+                    lo = self._bounds('ge', node.low)[0]
+                if node.high is not None:
+                    hi = self._bounds('le', node.high)[1]
+                return self._ids[lo:hi]
+        except TypeError:
+            # Values that cannot be compared with the index; the
+            # predicate will decide.
+            pass
+        return None
+
+    def ordered(self, descending):
+        # Identifiers in sort order, with None values last in ascending
+        # order; ties are ordered by identifier in both directions.
+        nulls = sorted(self._nulls)
+        if not descending:
+            return itertools.chain(self._ids, nulls)
+        return itertools.chain(nulls, self._reversed())
+
+    def _reversed(self):
+        values, ids = self._values, self._ids
+        end = len(values)
+        while end:
+            start = bisect.bisect_left(values, values[end - 1], 0, end)
+            yield from ids[start:end]
+            end = start
+
+
+class ResourceStore:
+    """Indexed set of resources of a single type, held in memory.
+
+    Resources are identified by their ``id``, and a record of field
+    values is computed for each resource by calling *record* when it is
+    added or updated.  Hash indexes are maintained for the fields named
+    in *hash_indexes*, and are used for ``eq`` and ``in`` filter
+    conditions; values of these fields must be hashable.  Sorted indexes
+    are maintained for the fields named in *sorted_indexes*, and are
+    used for comparisons, ranges, and sorting by a single field; values
+    of these fields must be ``None`` or comparable with each other.
+    Conditions that cannot use an index are evaluated by scanning the
+    records that remain.
+
+    Indexes are updated incrementally as resources are added, updated,
+    and removed.  The store may be shared among threads; changes are
+    serialized with queries made by :class:`IndexedCollection`.
+
+    """
+
+    def __init__(self, resources=(), filter_fields=None, sort_fields=(),
+                 hash_indexes=(), sorted_indexes=(), record=None):
+        """Initialize with resources and indexes.
+
+        :param resources:
+            Iterable of objects that can be adapted to
+            :class:`~kt.jsonapi.interfaces.IResource`.
+        :param filter_fields:
+            Mapping from names of fields that may be used in filters to
+            :class:`~kt.jsonapi.filtering.FilterField` objects.
+        :param sort_fields:
+            Collection of names of fields that may be used for sorting.
+        :param hash_indexes:
+            Names of fields to maintain hash indexes for.
+        :param sorted_indexes:
+            Names of fields to maintain sorted indexes for.
+        :param record:
+            Function returning a mapping of field values for a resource;
+            defaults to :func:`attribute_record`.
+
+        """
+        self.filter_fields = dict(filter_fields or {})
+        self.sort_fields = frozenset(sort_fields)
+        self._record = record or attribute_record
+        self._indexes = {}
+        for name in hash_indexes:
+            self._indexes.setdefault(name, []).append(_HashIndex())
+        self._sorted = {name: _SortedIndex() for name in sorted_indexes}
+        for name, index in self._sorted.items():
+            self._indexes.setdefault(name, []).append(index)
+        self._resources = {}
+        self._records = {}
+        self._sequence = {}
+        self._counter = itertools.count()
+        self._lock = threading.RLock()
+        for resource in resources:
+            resource = kt.jsonapi.interfaces.IResource(resource)
+            id = resource.id
+            if id in self._resources:
+                raise KeyError(id)
+            self._resources[id] = resource
+            self._records[id] = self._record(resource)
+            self._sequence[id] = next(self._counter)
+        for name, indexes in self._indexes.items():
+            for index in indexes:
+                if isinstance(index, _SortedIndex):
+                    index.load([(record[name], id)
+                                for id, record in self._records.items()])
+                else:
+                    for id, record in self._records.items():
+                        index.add(record[name], id)
+
+    def __len__(self):
+        return len(self._resources)
+
+    def __contains__(self, id):
+        return id in self._resources
+
+    def get(self, id, default=None):
+        """Return the resource identified by *id*, or *default*."""
+        return self._resources.get(id, default)
+
+    def _index(self, id, record):
+        # Indexes are left unchanged if the record cannot be indexed.
+        added = []
+        try:
+            for name, indexes in self._indexes.items():
+                for index in indexes:
+                    index.add(record[name], id)
+                    added.append((index, record[name]))
+        except Exception:
+            for index, value in added:
+                index.remove(value, id)
+            raise
+
+    def _unindex(self, id, record):
+        for name, indexes in self._indexes.items():
+            for index in indexes:
+                index.remove(record[name], id)
+
+    def add(self, resource):
+        """Add *resource*.
+
+        Raises :exc:`KeyError` if a resource with the same identifier is
+        already present.
+
+        """
+        resource = kt.jsonapi.interfaces.IResource(resource)
+        record = self._record(resource)
+        with self._lock:
+            id = resource.id
+            if id in self._resources:
+                raise KeyError(id)
+            self._index(id, record)
+            self._resources[id] = resource
+            self._records[id] = record
+            self._sequence[id] = next(self._counter)
+
+    def update(self, resource):
+        """Replace the resource with the same identifier as *resource*.
+
+        The resource keeps its position in the default order.  Raises
+        :exc:`KeyError` if there is no such resource.
+
+        """
+        resource = kt.jsonapi.interfaces.IResource(resource)
+        record = self._record(resource)
+        with self._lock:
+            id = resource.id
+            old = self._records[id]
+            self._unindex(id, old)
+            try:
+                self._index(id, record)
+            except Exception:
+                self._index(id, old)
+                raise
+            self._resources[id] = resource
+            self._records[id] = record
+
+    def remove(self, id):
+        """Remove the resource identified by *id*.
+
+        Raises :exc:`KeyError` if there is no such resource.
+
+        """
+        with self._lock:
+            self._unindex(id, self._records[id])
+            del self._resources[id]
+            del self._records[id]
+            del self._sequence[id]
+
+    def collection(self, **kwargs):
+        """Return an :class:`IndexedCollection` of the resources.
+
+        Keyword arguments are passed to :class:`IndexedCollection`.
+
+        """
+        return IndexedCollection(self, **kwargs)
+
+    def _candidates(self, node):
+        # Return identifiers of a superset of the matching resources, or
+        # None if no index is applicable.
+        if isinstance(node, kt.jsonapi.filtering.And):
+            found = [ids for ids in map(self._candidates, node.operands)
+                     if ids is not None]
+            if not found:
+                return None
+            found.sort(key=len)
+            return set(found[0]).intersection(*found[1:])
+        if isinstance(node, kt.jsonapi.filtering.Or):
+            found = list(map(self._candidates, node.operands))
+            if any(ids is None for ids in found):
+                return None
+            return set().union(*found)
+        for index in self._indexes.get(getattr(node, 'field', None), ()):
+            ids = index.lookup(node)
+            if ids is not None:
+                return ids
+        return None
+
+
+class IndexedCollection(_Collection):
+    """View of the resources of a :class:`ResourceStore`.
+
+    Filtering, sorting, and pagination are supported as for
+    :class:`MemoryCollection`, using the fields allowed by the store.
+    Resources are returned in the order they were added to the store
+    unless sorting is requested.  Resources with equal sort keys are
+    ordered by identifier.
+
+    When sorting by a single field with a sorted index, resources are
+    taken from the index in order, stopping at the end of the page.
+
+    """
+
+    def __init__(self, store, links=None, meta=None, page_size=None,
+                 max_page_size=100):
+        """Initialize with store, links, metadata, and page sizes.
+
+        Parameters other than *store* are as for
+        :class:`MemoryCollection`.
+
+        """
+        super(IndexedCollection, self).__init__(
+            store.filter_fields, store.sort_fields, links, meta, page_size,
+            max_page_size)
+        self._store = store
+
+    def _select(self):
+        store = self._store
+        with store._lock:
+            ids = self._select_ids(store)
+            return [store._resources[id] for id in ids]
+
+    def _select_ids(self, store):
+        records = store._records
+        start, stop = self._window()
+        matching = None
+        if self._predicate is not None:
+            candidates = store._candidates(self._expression)
+            if candidates is None:
+                candidates = records
+            predicate = self._predicate
+            matching = {id for id in candidates if predicate(records[id])}
+        self._total = len(records if matching is None else matching)
+
+        if not self._sort:
+            if matching is None:
+                return list(itertools.islice(records, start, stop))
+            ids = sorted(matching, key=store._sequence.__getitem__)
+            return ids[start:stop]
+
+        if len(self._sort) == 1 and self._sort[0].field in store._sorted:
+            # Walking the index costs about stop * n / len(matching)
+            # steps, while sorting the matches costs at least
+            # len(matching) steps.
+            if (matching is None
+                    or (stop is not None
+                        and stop * len(records) < len(matching) ** 2)):
+                sort_key, = self._sort
+                ids = store._sorted[sort_key.field].ordered(
+                    sort_key.descending)
+                if matching is not None:
+                    ids = (id for id in ids if id in matching)
+                return list(itertools.islice(ids, start, stop))
+
+        ids = sorted(records if matching is None else matching)
+        key = kt.jsonapi.sorting.key_function(
+            self._sort, records.__getitem__)
+        if stop is not None and stop <= len(ids) * self.top_k_fraction:
+            ids = heapq.nsmallest(stop, ids, key=key)
+        else:
+            ids.sort(key=key)
+        return ids[start:stop]
@@ -0,0 +1,255 @@
+"""\
+Collections of resources stored as columns of NumPy arrays.
+
+Large collections with uniform attributes, such as telemetry, can be
+stored as one array for each attribute.  :class:`ColumnarCollection`
+applies filtering, sorting, and pagination to the arrays using
+vectorized operations, and creates resources only for the rows on the
+requested page, converting their attribute values a column at a time.
+
+This module requires NumPy, which can be installed using the ``numpy``
+extra of the ``kt.jsonapi`` package.
+
+"""
+
+import operator
+
+import numpy
+import zope.interface
+
+import kt.jsonapi.collection
+import kt.jsonapi.filtering
+import kt.jsonapi.interfaces
+
+
+_COMPARISONS = dict(eq=operator.eq, ne=operator.ne, lt=operator.lt,
+                    le=operator.le, gt=operator.gt, ge=operator.ge)
+
+
+def _nulls(values):
+    # Mask of missing values, or None if the type has no such value.
+    kind = values.dtype.kind
+    if kind in 'fc':
+        return numpy.isnan(values)
+    if kind in 'mM':
+        return numpy.isnat(values)
+    return None
+
+
+def _sort_key(values, descending):
+    # Array sorting in the requested direction; missing values must be
+    # handled separately.
+    kind = values.dtype.kind
+    if kind in 'mM':
+        values = values.view('i8')
+        kind = 'i'
+    if not descending:
+        return values
+    if kind in 'if':
+        return -values
+    return -numpy.unique(values, return_inverse=True)[1].reshape(-1)
+
+
+def _python_values(values):
+    # Convert a column of page values to Python objects, with missing
+    # values as None; dates and times are converted to ISO 8601 strings.
+    kind = values.dtype.kind
+    if kind == 'M':
+        result = numpy.datetime_as_string(values).tolist()
+        return [None if value == 'NaT' else value for value in result]
+    nulls = _nulls(values)
+    result = values.tolist()
+    if nulls is not None and nulls.any():
+        for index in numpy.flatnonzero(nulls).tolist():
+            result[index] = None
+    return result
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IResource)
+class ColumnarResource:
+    """Resource for a single row of a :class:`ColumnarCollection`."""
+
+    __slots__ = 'type', 'id', '_attributes', '_links'
+
+    def __init__(self, type, id, attributes, links):
+        self.type = type
+        self.id = id
+        self._attributes = attributes
+        self._links = links
+
+    def attributes(self):
+        return self._attributes
+
+    def links(self):
+        return self._links
+
+    def meta(self):
+        return {}
+
+    def relationships(self):
+        return {}
+
+
+class ColumnarCollection(kt.jsonapi.collection._Collection):
+    """Collection of resources stored as columns of NumPy arrays.
+
+    Filtering, sorting, and pagination are supported as for
+    :class:`~kt.jsonapi.collection.MemoryCollection`, and produce the
+    same results when missing values are represented by ``NaN`` (or
+    ``NaT``) rather than ``None``.  Filter conditions are evaluated as
+    boolean masks over the columns, and sorting uses :func:`numpy.lexsort`;
+    when sorting by a single field, a page near the start is selected
+    using :func:`numpy.argpartition` instead of sorting all rows.
+
+    Values produced by :attr:`~kt.jsonapi.filtering.FilterField.convert`
+    are compared directly with the column values, so they should be of
+    a compatible type.
+
+    """
+
+    def __init__(self, type, columns, id='id', attributes=None,
+                 filter_fields=None, sort_fields=(), resource_links=None,
+                 links=None, meta=None, page_size=None, max_page_size=100):
+        """Initialize with columns and description of parameters.
+
+        :param type:
+            Type name of the resources.
+        :param columns:
+            Mapping from field names to one-dimensional arrays, or
+            values that can be converted to arrays using
+            :func:`numpy.asarray`.  All columns must have the same
+            length.
+        :param id:
+            Name of the column providing resource identifiers; values
+            are converted to strings.
+        :param attributes:
+            Names of the columns providing attributes of the resources,
+            in order.  Defaults to all columns other than *id*.
+        :param resource_links:
+            Function called with a resource identifier, returning links
+            for the resource.
+        :param filter_fields:
+            Mapping from names of columns that may be used in filters to
+            :class:`~kt.jsonapi.filtering.FilterField` objects.
+
+        Other parameters are as for
+        :class:`~kt.jsonapi.collection.MemoryCollection`.
+
+        """
+        super(ColumnarCollection, self).__init__(
+            filter_fields, sort_fields, links, meta, page_size,
+            max_page_size)
+        self._type = type
+        self._columns = {name: numpy.asarray(values)
+                         for name, values in columns.items()}
+        lengths = {len(values) for values in self._columns.values()}
+        if len(lengths) > 1:
+            raise ValueError('columns must all have the same length')
+        self._length = lengths.pop() if lengths else 0
+        self._id = id
+        if attributes is None:
+            attributes = [name for name in self._columns if name != id]
+        self._attribute_names = list(attributes)
+        self._resource_links = resource_links
+        missing = ({id} | set(self._attribute_names) | set(self.filter_fields)
+                   | self.sort_fields) - set(self._columns)
+        if missing:
+            raise ValueError(f'no columns for fields: {sorted(missing)}')
+
+    def _mask(self, node):
+        if isinstance(node, kt.jsonapi.filtering.Comparison):
+            return _COMPARISONS[node.op](self._columns[node.field],
+                                         node.value)
+        if isinstance(node, kt.jsonapi.filtering.In):
+            return numpy.isin(self._columns[node.field], list(node.values))
+        if isinstance(node, kt.jsonapi.filtering.Range):
+            values = self._columns[node.field]
+            nulls = _nulls(values)
+            mask = (numpy.ones(self._length, dtype=bool) if nulls is None
+                    else ~nulls)
+            if node.low is not None:
+                mask &= values >= node.low
+            if node.high is not None:
+                mask &= values <= node.high
+            return mask
+        if isinstance(node, kt.jsonapi.filtering.And):
+            mask = numpy.ones(self._length, dtype=bool)
+            for operand in node.operands:
+                mask &= self._mask(operand)
+            return mask
+        if isinstance(node, kt.jsonapi.filtering.Or):
+            mask = numpy.zeros(self._length, dtype=bool)
+            for operand in node.operands:
+                mask |= self._mask(operand)
+            return mask
+        if isinstance(node, kt.jsonapi.filtering.Not):
+            return ~self._mask(node.operand)
+        raise TypeError(f'unsupported filter expression node: {node!r}')
+
+    def _order(self, rows, stop):
+        # Return rows in sort order; only the first stop are required.
+        if (len(self._sort) == 1 and stop is not None
+                and stop <= len(rows) * self.top_k_fraction):
+            return self._top_k(rows, self._sort[0], stop)
+        keys = []
+        for sort_key in reversed(self._sort):
+            values = self._columns[sort_key.field][rows]
+            key = _sort_key(values, sort_key.descending)
+            nulls = _nulls(values)
+            if nulls is None:
+                keys.append(key)
+            else:
+                keys.append(numpy.where(nulls, 0, key))
+                keys.append(~nulls if sort_key.descending else nulls)
+        return rows[numpy.lexsort(keys)]
+
+    def _top_k(self, rows, sort_key, stop):
+        values = self._columns[sort_key.field][rows]
+        key = _sort_key(values, sort_key.descending)
+        nulls = _nulls(values)
+        if nulls is None:
+            valid = numpy.arange(len(rows))
+            nulls = valid[:0]
+        else:
+            valid = numpy.flatnonzero(~nulls)
+            nulls = numpy.flatnonzero(nulls)
+            key = key[valid]
+        # Missing values come first in descending order.
+        head = nulls if sort_key.descending else nulls[:0]
+        need = stop - len(head)
+        if need <= 0:
+            return rows[head[:stop]]
+        if need < len(key):
+            # Keep every row tied with the last one selected, so the
+            # stable sort picks the same rows as a full sort.
+            threshold = key[numpy.argpartition(key, need - 1)[need - 1]]
+            selected = numpy.flatnonzero(key <= threshold)
+        else:
+            selected = numpy.arange(len(key))
+        selected = selected[numpy.argsort(key[selected], kind='stable')]
+        selected = valid[selected[:need]]
+        if sort_key.descending:
+            order = numpy.concatenate([head, selected])
+        else:
+            order = numpy.concatenate([selected, nulls])[:stop]
+        return rows[order]
+
+    def _select(self):
+        start, stop = self._window()
+        if self._expression is None:
+            rows = numpy.arange(self._length)
+        else:
+            rows = numpy.flatnonzero(self._mask(self._expression))
+        self._total = len(rows)
+        if self._sort:
+            rows = self._order(rows, stop)
+        page = rows[start:stop]
+        ids = [str(id) for id in self._columns[self._id][page].tolist()]
+        columns = [_python_values(self._columns[name][page])
+                   for name in self._attribute_names]
+        links = self._resource_links or (lambda id: {})
+        return [ColumnarResource(self._type, id,
+                                 dict(zip(self._attribute_names, values)),
+                                 links(id))
+                for id, values in zip(ids, zip(*columns) if columns
+                                      else [()] * len(ids))]
@@ -0,0 +1,310 @@
+"""\
+Export collections as static JSON:API documents.
+
+Every page of a collection, and a document for every resource in the
+collection, is generated and written to an output directory along with a
+gzip-compressed copy and a manifest.  Documents are generated by
+:class:`~kt.jsonapi.api.Context` exactly as for requests with the same
+path and query string; links can optionally be rewritten to refer to the
+static files.  Pages are rendered in parallel by a pool of processes.
+
+This can be run as a script::
+
+    python -m kt.jsonapi.export myapp.things:collection /things output \\
+        --query 'include=owner&fields[owner]=name'
+
+The collection factory is named as ``module:callable``; it is called
+with no arguments and must return a new collection each time, since
+each page is generated from a separate collection.
+
+"""
+
+import argparse
+import concurrent.futures
+import gzip
+import hashlib
+import importlib
+import json
+import os
+import urllib.parse
+
+import flask
+
+import kt.jsonapi.api
+import kt.jsonapi.interfaces
+import kt.jsonapi.serializers
+
+
+MANIFEST = 'manifest.json'
+
+_apps = {}
+
+
+def _resolve(name):
+    module, _, attr = name.partition(':')
+    ob = importlib.import_module(module)
+    for part in attr.split('.'):
+        ob = getattr(ob, part)
+    return ob
+
+
+def _get_app(app_name):
+    # Created once per process.
+    if app_name not in _apps:
+        if app_name:
+            _apps[app_name] = _resolve(app_name)
+        else:
+            _apps[app_name] = flask.Flask(__name__)
+    return _apps[app_name]
+
+
+def _context_factory(app):
+    return app.config.get('KT_JSONAPI_CONTEXT_REGULAR',
+                          kt.jsonapi.api.Context)
+
+
+def static_name(url):
+    """Return the relative filename used for the document at *url*.
+
+    Documents without a query string are written as ``index.json`` in a
+    directory corresponding to the path; others are named by a digest of
+    the query string.
+
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = parts.path.strip('/')
+    if parts.query:
+        digest = hashlib.sha1(parts.query.encode('utf-8')).hexdigest()[:16]
+        name = f'q/{digest}.json'
+    else:
+        name = 'index.json'
+    return f'{path}/{name}' if path else name
+
+
+def _canonical_url(app, url):
+    # Files are named using the request key, so equivalent query strings
+    # used in links and requests refer to the same file.
+    parts = urllib.parse.urlsplit(url)
+    try:
+        context = _context_factory(app).from_query_string(
+            app, parts.query, path=parts.path)
+    except kt.jsonapi.interfaces.QueryStringException:
+        return url
+    return _url(*context.request_key)
+
+
+def _rewrite_links(ob, rename, rquery):
+    # Links of resource objects refer to the resource documents, which
+    # are generated using rquery.
+    if isinstance(ob, list):
+        for item in ob:
+            _rewrite_links(item, rename, rquery)
+    elif isinstance(ob, dict):
+        resource = 'type' in ob and 'id' in ob
+        for key, value in ob.items():
+            if key == 'links' and isinstance(value, dict):
+                for lname, link in value.items():
+                    href = link.get('href') if isinstance(link, dict) else link
+                    if not isinstance(href, str) or not href.startswith('/'):
+                        continue
+                    if resource and lname == 'self':
+                        href = _url(urllib.parse.urlsplit(href).path, rquery)
+                    if isinstance(link, dict):
+                        link['href'] = rename(href)
+                    else:
+                        value[lname] = rename(href)
+            else:
+                _rewrite_links(value, rename, rquery)
+
+
+def _write(outdir, url, data, options, rquery=''):
+    app = _get_app(options.get('app'))
+    if options.get('link_prefix') is not None:
+        prefix = options['link_prefix']
+
+        def rename(href):
+            return prefix + static_name(_canonical_url(app, href))
+
+        body = app.json.loads(data)
+        _rewrite_links(body, rename, rquery)
+        data = app.json.dumps(body).encode('utf-8')
+    name = static_name(_canonical_url(app, url))
+    filename = os.path.join(outdir, *name.split('/'))
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    with open(filename, 'wb') as f:
+        f.write(data)
+    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+    with open(filename + '.gz', 'wb') as f:
+        f.write(compressed)
+    return dict(
+        url=url,
+        file=name,
+        size=len(data),
+        gzip_size=len(compressed),
+        sha256=hashlib.sha256(data).hexdigest(),
+    )
+
+
+def _url(path, query):
+    return f'{path}?{query}' if query else path
+
+
+def _render_page(factory_name, path, query, outdir, options, aliases=()):
+    # Render one page of the collection and each resource it contains.
+    # The page is also written for each query string in aliases, which
+    # links may use to refer to the same page.  This runs in a worker
+    # process.
+    app = _get_app(options.get('app'))
+    factory = _resolve(factory_name)
+    url = _url(path, query)
+    # Resource documents use the same fields & include parameters.
+    rquery = urllib.parse.urlencode(
+        [(key, value) for key, value
+         in urllib.parse.parse_qsl(query, keep_blank_values=True)
+         if key.partition('[')[0] in ('fields', 'include')],
+        safe='[],')
+    entries = []
+    with app.test_request_context(url):
+        context = _context_factory(app)(app, flask.request)
+        data = context.collection(factory()).get_data()
+        entries.append(_write(outdir, url, data, options, rquery))
+        names = {static_name(_canonical_url(app, url))}
+        for alias in aliases:
+            aurl = _url(path, alias)
+            name = static_name(_canonical_url(app, aurl))
+            if name not in names:
+                names.add(name)
+                entries.append(_write(outdir, aurl, data, options, rquery))
+
+        # Retrieve the resources again, since the collection is
+        # consumed by serialization.
+        collection = kt.jsonapi.interfaces.ICollection(factory())
+        context = _context_factory(app)(app, flask.request)
+        context._prepare_collection(collection)
+        resources = [kt.jsonapi.interfaces.IResource(resource)
+                     for resource in collection.resources()]
+
+    for resource in resources:
+        link = resource.links().get('self')
+        if link is None:
+            continue
+        href = kt.jsonapi.interfaces.ILink(link).href
+        rurl = _url(urllib.parse.urlsplit(href).path, rquery)
+        with app.test_request_context(rurl):
+            context = _context_factory(app)(app, flask.request)
+            response = context.resource(resource)
+            entries.append(_write(outdir, rurl, response.get_data(),
+                                  options, rquery))
+    return entries
+
+
+def _page_queries(factory_name, path, query, options, max_pages):
+    # Determine the query strings for all pages by following 'next'
+    # links, without serializing the pages.  Also returns the query
+    # string of the 'first' link of the first page, or None.
+    app = _get_app(options.get('app'))
+    factory = _resolve(factory_name)
+    queries = []
+    first = None
+    seen = set()
+    while query not in seen and len(queries) < max_pages:
+        seen.add(query)
+        queries.append(query)
+        with app.test_request_context(_url(path, query)):
+            context = _context_factory(app)(app, flask.request)
+            collection = kt.jsonapi.interfaces.ICollection(factory())
+            context._prepare_collection(collection)
+            links = kt.jsonapi.serializers._collection_links(collection)
+            context._apply_query_params(links)
+        if len(queries) == 1:
+            first = links.get('first')
+            if isinstance(first, dict):
+                first = first['href']
+            if first:
+                first = urllib.parse.urlsplit(first).query
+        link = links.get('next')
+        if isinstance(link, dict):
+            link = link['href']
+        if not link:
+            break
+        query = urllib.parse.urlsplit(link).query
+    return queries, first
+
+
+def export(factory_name, path, outdir, query='', workers=None,
+           link_prefix=None, app=None, max_pages=10000):
+    """Export a collection and its resources as static files.
+
+    :param factory_name:
+        Collection factory, specified as ``module:callable``.
+    :param path:  URL path of the collection.
+    :param outdir:  Directory files are written to.
+    :param query:  Query string applied to the collection.
+    :param workers:  Number of worker processes.
+    :param link_prefix:
+        If not ``None``, links with absolute paths are rewritten to
+        refer to the static files, with this prepended.  The ``self``
+        links of resources refer to the resource documents, which use
+        the ``fields`` and ``include`` parameters from *query*.
+    :param app:
+        Flask application used to generate documents, specified as
+        ``module:attribute``; the ``KT_JSONAPI_CONTEXT_REGULAR`` setting
+        of the application is respected.  If not provided, a minimal
+        application is used.
+    :param max_pages:  Maximum number of pages exported.
+
+    Files are named by :func:`static_name` for the
+    :attr:`~kt.jsonapi.api.Context.request_key` of each document, so
+    equivalent query strings refer to the same file.  The first page is
+    also written for the query string of its ``first`` link.
+
+    Returns the list of manifest entries, which is also written to
+    ``manifest.json`` in *outdir*.
+
+    """
+    options = dict(app=app, link_prefix=link_prefix)
+    queries, first = _page_queries(factory_name, path, query, options,
+                                   max_pages)
+    os.makedirs(outdir, exist_ok=True)
+    entries = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_render_page, factory_name, path, q,
+                               outdir, options,
+                               (first,) if first and n == 0 else ())
+                   for n, q in enumerate(queries)]
+        for future in futures:
+            for entry in future.result():
+                entries[entry['url']] = entry
+    manifest = [entries[url] for url in sorted(entries)]
+    with open(os.path.join(outdir, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m kt.jsonapi.export',
+        description='Export a JSON:API collection as static files.')
+    parser.add_argument('factory', help='collection factory (module:name)')
+    parser.add_argument('path', help='URL path of the collection')
+    parser.add_argument('outdir', help='output directory')
+    parser.add_argument('--query', default='',
+                        help='query string applied to the collection')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of worker processes')
+    parser.add_argument('--link-prefix', default=None,
+                        help='rewrite links to static files with prefix')
+    parser.add_argument('--app', default=None,
+                        help='Flask application (module:name)')
+    parser.add_argument('--max-pages', type=int, default=10000,
+                        help='maximum number of pages to export')
+    args = parser.parse_args(argv)
+    manifest = export(args.factory, args.path, args.outdir,
+                      query=args.query, workers=args.workers,
+                      link_prefix=args.link_prefix, app=args.app,
+                      max_pages=args.max_pages)
+    print(f'wrote {len(manifest)} documents to {args.outdir}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""\
+Parsing of ``filter`` query parameters into expressions.
+
+JSON:API leaves the meaning of the ``filter`` query parameter to the
+server.  Collections providing
+:class:`~kt.jsonapi.interfaces.IFilterableCollection` receive the nested
+structure of ``filter[...]`` keys as parsed from the query string, and
+interpret it themselves.  Collections providing
+:class:`~kt.jsonapi.interfaces.IFilterAstCollection` instead receive an
+expression built from the nodes defined here, checked against the
+fields the collection allows.
+
+"""
+
+import functools
+
+import kt.jsonapi.interfaces
+
+
+COMPARISONS = ('eq', 'ne', 'lt', 'le', 'gt', 'ge')
+"""Names of the comparison operators."""
+
+OPERATORS = COMPARISONS + ('in', 'range')
+"""Names of all operators that can be applied to a field."""
+
+
+class Node:
+    """Base class for nodes of a filter expression.
+
+    Nodes are immutable, and compare equal when they are of the same
+    type and have equal values for each of their fields.
+
+    """
+
+    __slots__ = ()
+
+    _fields = ()
+
+    def __init__(self, *args):
+        for name, value in zip(self._fields, args):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} objects are immutable')
+
+    def _values(self):
+        return tuple(getattr(self, name) for name in self._fields)
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self._values() == other._values()
+
+    def __hash__(self):
+        return hash((type(self),) + self._values())
+
+    def __repr__(self):
+        args = ', '.join(map(repr, self._values()))
+        return f'{type(self).__name__}({args})'
+
+
+class Comparison(Node):
+    """Comparison of a field with a single value.
+
+    *op* is one of the names in :data:`COMPARISONS`.
+
+    """
+
+    __slots__ = _fields = 'field', 'op', 'value'
+
+    def __init__(self, field, op, value):
+        super(Comparison, self).__init__(field, op, value)
+
+
+class In(Node):
+    """Test for a field matching any of a tuple of values."""
+
+    __slots__ = _fields = 'field', 'values'
+
+    def __init__(self, field, values):
+        super(In, self).__init__(field, tuple(values))
+
+
+class Range(Node):
+    """Test for a field lying between two values, inclusive.
+
+    Either bound may be ``None``, leaving that end of the range open.
+
+    """
+
+    __slots__ = _fields = 'field', 'low', 'high'
+
+    def __init__(self, field, low, high):
+        super(Range, self).__init__(field, low, high)
+
+
+class And(Node):
+    """Conjunction of a tuple of expressions."""
+
+    __slots__ = _fields = 'operands',
+
+    def __init__(self, operands):
+        super(And, self).__init__(tuple(operands))
+
+
+class Or(Node):
+    """Disjunction of a tuple of expressions."""
+
+    __slots__ = _fields = 'operands',
+
+    def __init__(self, operands):
+        super(Or, self).__init__(tuple(operands))
+
+
+class Not(Node):
+    """Negation of an expression."""
+
+    __slots__ = _fields = 'operand',
+
+    def __init__(self, operand):
+        super(Not, self).__init__(operand)
+
+
+class FilterField:
+    """Description of a field that may be used in filters.
+
+    *operators* is a collection of the names of supported operators,
+    defaulting to all of :data:`OPERATORS`.  *convert* is called with
+    each value from the query string; it may raise :exc:`ValueError` or
+    :exc:`TypeError` to reject the value.
+
+    """
+
+    def __init__(self, operators=OPERATORS, convert=str):
+        """Initialize with supported operators and value converter."""
+        unknown = set(operators) - set(OPERATORS)
+        if unknown:
+            raise ValueError(f'unknown operators: {sorted(unknown)}')
+        self.operators = frozenset(operators)
+        self.convert = convert
+
+
+def parse_filter(filter, fields):
+    """Parse the structure of ``filter[...]`` keys into an expression.
+
+    *filter* is the value passed to
+    :meth:`~kt.jsonapi.interfaces.IFilterableCollection.set_filter`.
+    *fields* maps the names of fields that may be filtered on to
+    :class:`FilterField` objects.
+
+    Multiple conditions are combined into an :class:`And` node; a single
+    condition is returned as is.  Problems are reported by raising
+    :exc:`~kt.jsonapi.interfaces.QueryStringException` subclasses.
+
+    """
+    return _conjunction(filter, fields, 'filter')
+
+
+def _key(prefix, name):
+    return f'{prefix}[{name}]'
+
+
+def _simplify(operands, factory):
+    if len(operands) == 1:
+        return operands[0]
+    return factory(operands)
+
+
+def _conjunction(value, fields, prefix):
+    if not isinstance(value, dict):
+        raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+            f'query string key {prefix!r} must map field names to'
+            f' filter conditions',
+            key=prefix,
+            value=value)
+    operands = []
+    for name, item in value.items():
+        key = _key(prefix, name)
+        if name in ('and', 'or'):
+            operands.append(_logical(item, fields, key, name))
+        elif name == 'not':
+            operands.append(Not(_conjunction(item, fields, key)))
+        else:
+            operands.extend(_conditions(name, item, fields, key))
+    return _simplify(operands, And)
+
+
+def _logical(value, fields, key, name):
+    if not isinstance(value, dict):
+        raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+            f'query string key {key!r} must map labels to'
+            f' filter conditions',
+            key=key,
+            value=value)
+    operands = [_conjunction(item, fields, _key(key, label))
+                for label, item in value.items()]
+    return _simplify(operands, And if name == 'and' else Or)
+
+
+def _conditions(name, value, fields, key):
+    field = fields.get(name)
+    if field is None:
+        raise kt.jsonapi.interfaces.InvalidQueryKey(
+            f'filtering on {name!r} is not supported', key=key)
+    if not isinstance(value, dict):
+        # filter[name]=value is shorthand for filter[name][eq]=value
+        value = dict(eq=value)
+        opkey = key
+    else:
+        opkey = None
+    for op, opvalue in value.items():
+        okey = opkey or _key(key, op)
+        if op not in OPERATORS:
+            raise kt.jsonapi.interfaces.InvalidQueryKey(
+                f'unknown filter operator {op!r}', key=okey)
+        if op not in field.operators:
+            raise kt.jsonapi.interfaces.InvalidQueryKey(
+                f'filter operator {op!r} is not supported for {name!r}',
+                key=okey)
+        if isinstance(opvalue, dict):
+            raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                f'value for query string key {okey!r}'
+                f' must not contain nested containers',
+                key=okey,
+                value=opvalue)
+        if op == 'in':
+            values = opvalue.split(',') if opvalue else []
+            yield In(name, [_convert(field, v, okey, opvalue)
+                            for v in values])
+        elif op == 'range':
+            low, sep, high = opvalue.partition(',')
+            if not sep or ',' in high:
+                raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                    f'value for query string key {okey!r} must be two'
+                    f' bounds separated by a comma',
+                    key=okey,
+                    value=opvalue)
+            yield Range(
+                name,
+                _convert(field, low, okey, opvalue) if low else None,
+                _convert(field, high, okey, opvalue) if high else None)
+        else:
+            yield Comparison(name, op, _convert(field, opvalue, okey, opvalue))
+
+
+def _convert(field, value, key, original):
+    try:
+        return field.convert(value)
+    except (TypeError, ValueError):
+        raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+            f'unsupported value for query string key {key!r}: {value!r}',
+            key=key,
+            value=original) from None
+
+
+_OPERATOR_SYMBOLS = dict(eq='==', ne='!=', lt='<', le='<=', gt='>', ge='>=')
+
+
+def compile_filter(expression):
+    """Return a predicate evaluating *expression* for a record.
+
+    The predicate accepts a mapping from field names to values, and
+    returns true if the record matches.  Every field named in the
+    expression must be present in the record.  Ordering comparisons and
+    ranges never match a value of ``None``; values are otherwise
+    compared using the Python operators, so they should be converted
+    by :attr:`FilterField.convert` to match the types of record values.
+
+    Python source for the predicate is generated with the values of the
+    expression replaced by parameters, and compiled once for each
+    distinct shape of expression, so requests differing only in values
+    reuse the same code.
+
+    """
+    values = []
+    source = _source(expression, values)
+    return _factory(source, len(values))(*values)
+
+
+def _bind(value, values):
+    values.append(value)
+    return f'_v{len(values) - 1}'
+
+
+def _source(node, values):
+    if isinstance(node, Comparison):
+        field = f'_r[{node.field!r}]'
+        value = _bind(node.value, values)
+        expr = f'{field} {_OPERATOR_SYMBOLS[node.op]} {value}'
+        if node.op in ('eq', 'ne'):
+            return expr
+        return f'({field} is not None and {expr})'
+    if isinstance(node, In):
+        try:
+            members = frozenset(node.values)
+        except TypeError:
+            members = node.values
+        return f'_r[{node.field!r}] in {_bind(members, values)}'
+    if isinstance(node, Range):
+        field = f'_r[{node.field!r}]'
+        if node.low is None and node.high is None:
+            return f'{field} is not None'
+        expr = field
+        if node.low is not None:
+            expr = f'{_bind(node.low, values)} <= {expr}'
+        if node.high is not None:
+            expr = f'{expr} <= {_bind(node.high, values)}'
+        return f'({field} is not None and {expr})'
+    if isinstance(node, (And, Or)):
+        if not node.operands:
+            return 'True' if isinstance(node, And) else 'False'
+        joiner = ' and ' if isinstance(node, And) else ' or '
+        return '(' + joiner.join(_source(operand, values)
+                                 for operand in node.operands) + ')'
+    if isinstance(node, Not):
+        return f'(not {_source(node.operand, values)})'
+    raise TypeError(f'unsupported filter expression node: {node!r}')
+
+
+@functools.lru_cache(maxsize=256)
+def _factory(source, nvalues):
+    # The source depends only on the shape of the expression; values
+    # are bound when the factory is called.
+    params = ', '.join(f'_v{n}' for n in range(nvalues))
+    code = (f'def _factory({params}):\n'
+            f'    def predicate(_r):\n'
+            f'        return {source}\n'
+            f'    return predicate\n')
+    namespace = {}
+    exec(compile(code, '<kt.jsonapi.filtering>', 'exec'), namespace)
+    return namespace['_factory']
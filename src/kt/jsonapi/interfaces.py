@@ -3,6 +3,7 @@ Interfaces for JSON:API representations of application objects.
 
 """
 
+import functools
 import re
 import typing
 
@@ -106,6 +107,36 @@ class InvalidQueryKeyValue(QueryStringException):
         self.value = value
 
 
+class QueryStringLimitExceeded(QueryStringException):
+    """The query string exceeds a limit on its complexity."""
+
+    def __init__(self, message, key, limit):
+        """Initialize with message, key from query string, and the limit.
+        """
+        super(QueryStringLimitExceeded, self).__init__(message, key)
+        self.limit = limit
+
+
+class TooManyQueryParameters(QueryStringLimitExceeded):
+    """The query string contains too many parameters."""
+
+
+class QueryKeyTooDeep(QueryStringLimitExceeded):
+    """A key in the query string contains too many bracketed names."""
+
+
+class TooManyIncludePaths(QueryStringLimitExceeded):
+    """Too many relationship paths are requested using include."""
+
+
+class IncludePathTooDeep(QueryStringLimitExceeded):
+    """A relationship path requested using include is too long."""
+
+
+class TooManyFieldNames(QueryStringLimitExceeded):
+    """Too many field names are requested for a resource type."""
+
+
 @zope.interface.implementer(IInvalidResultStructure)
 class InvalidResultStructure(ValueError):
     """Serialization resulted in an invalid structure."""
@@ -198,6 +229,63 @@ class TypeName(_Name):
     _exception = InvalidTypeName
 
 
+# Validation functions
+#
+# Validating through the schema fields requires constructing a field
+# for each query string key and running the full validation machinery;
+# these check names against the regular expression directly, with
+# memoization, and only construct a field to raise the appropriate
+# exception.
+
+
+@functools.lru_cache(maxsize=4096)
+def _is_name(value):
+    return _rx_member_name.match(value) is not None
+
+
+@functools.lru_cache(maxsize=1024)
+def _is_path(value):
+    return all(map(_is_name, value.split('.')))
+
+
+def validate_member_name(value, key=None):
+    """Validate a member name, as for :class:`MemberName`.
+
+    *key* is used as the name of the field in the exception raised if
+    *value* is not valid.
+
+    .. versionadded:: 1.8.0
+
+    """
+    if not (isinstance(value, str) and _is_name(value)):
+        MemberName(__name__=key).validate(value)
+
+
+def validate_type_name(value, key=None):
+    """Validate a type name, as for :class:`TypeName`.
+
+    .. versionadded:: 1.8.0
+
+    """
+    if not (isinstance(value, str) and _is_name(value)):
+        TypeName(__name__=key).validate(value)
+
+
+def validate_relationship_path(value, key=None, field=None):
+    """Validate a relationship path, as for :class:`RelationshipPath`.
+
+    If *field* is provided, it is used to report errors instead of a new
+    field named by *key*.
+
+    .. versionadded:: 1.8.0
+
+    """
+    if not (isinstance(value, str) and _is_path(value)):
+        if field is None:
+            field = RelationshipPath(__name__=key)
+        field.validate(value)
+
+
 class URL(zope.schema.TextLine):
 
     def __init__(self, title=None, description=None, min_length=None,
@@ -367,6 +455,37 @@ class IFilterableCollection(ICollection):
         """
 
 
+class IFilterAstCollection(ICollection):
+    """Collection accepting filtering parameters as a parsed expression.
+
+    The ``filter`` query parameters are parsed using
+    :func:`kt.jsonapi.filtering.parse_filter`, and only fields named in
+    :attr:`filter_fields` are accepted.  This is used instead of
+    :class:`IFilterableCollection` if both are provided.
+
+    .. versionadded:: 1.8.0
+
+    """
+
+    filter_fields = zope.interface.Attribute('filter_fields', """
+        Mapping from names of fields that may be used in filters to
+        :class:`~kt.jsonapi.filtering.FilterField` objects.
+        """)
+
+    def set_filter_ast(expression):
+        """Apply filtering expression from the request.
+
+        *expression* is a :class:`~kt.jsonapi.filtering.Node`.  If the
+        expression is valid for :attr:`filter_fields` but cannot be
+        supported, an appropriate ``BadRequest`` exception must be
+        raised.
+
+        This is called under the same conditions as
+        :meth:`IFilterableCollection.set_filter`.
+
+        """
+
+
 class ISortableCollection(ICollection):
 
     def set_sort(sort):
@@ -388,6 +507,34 @@ class ISortableCollection(ICollection):
         """
 
 
+class ISortSpecCollection(ICollection):
+    """Collection accepting sorting parameters as parsed sort keys.
+
+    The ``sort`` query parameter is parsed using
+    :func:`kt.jsonapi.sorting.parse_sort`, and only fields named in
+    :attr:`sort_fields` are accepted.  This is used instead of
+    :class:`ISortableCollection` if both are provided.
+
+    .. versionadded:: 1.8.0
+
+    """
+
+    sort_fields = zope.interface.Attribute('sort_fields', """
+        Collection of names of fields that may be used for sorting.
+        """)
+
+    def set_sort_spec(spec):
+        """Apply sorting specification from the request.
+
+        *spec* is a tuple of :class:`~kt.jsonapi.sorting.SortKey`
+        values in order of precedence.
+
+        This is called under the same conditions as
+        :meth:`ISortableCollection.set_sort`.
+
+        """
+
+
 class IPagableCollection(ICollection):
 
     def set_pagination(page):
@@ -473,6 +620,17 @@ class IToOneRelationship(IRelationshipBase):
 
 class IToManyRelationship(IRelationshipBase):
 
+    version = zope.interface.Attribute('version', """
+        Hashable value identifying the current revision of the
+        relationship membership, or ``None``.
+
+        When a :class:`~kt.jsonapi.cache.LinkageCache` is in use, this
+        becomes part of the cache key, so cached linkage is not used
+        after the membership changes.  This attribute is optional.
+
+        .. versionadded:: 1.8.0
+    """)
+
     def collection() -> ICollection:
         """Return collection of resources of to-many relationship.
 
@@ -483,6 +641,67 @@ class IToManyRelationship(IRelationshipBase):
         """
 
 
+# Asynchronous variants
+#
+# These are only supported by kt.jsonapi.aio.AsyncContext; the
+# synchronous serializers do not await anything.
+
+
+class IAsyncResource(IResource):
+    """Resource with attributes and relationships retrieved asynchronously.
+
+    .. versionadded:: 1.8.0
+
+    """
+
+    def attributes():
+        """Return awaitable producing mapping of attribute names to values.
+        """
+
+    def relationships():
+        """Return awaitable producing mapping of relationship names to
+        relationship objects."""
+
+
+class IAsyncCollection(ICollection):
+    """Collection with resources retrieved asynchronously.
+
+    .. versionadded:: 1.8.0
+
+    """
+
+    def resources():
+        """Return awaitable producing, or asynchronous iterable of,
+        resources of collection.
+
+        This method will only be called once, and the return value will
+        only be interated over once.
+
+        """
+
+
+class IAsyncToOneRelationship(IToOneRelationship):
+    """To-one relationship with a target retrieved asynchronously.
+
+    .. versionadded:: 1.8.0
+
+    """
+
+    def resource():
+        """Return awaitable producing the referenced resource, or None."""
+
+
+class IAsyncToManyRelationship(IToManyRelationship):
+    """To-many relationship with a collection retrieved asynchronously.
+
+    .. versionadded:: 1.8.0
+
+    """
+
+    def collection():
+        """Return awaitable producing the collection of resources."""
+
+
 class IError(ILinksProvider, IMetadataProvider):
     """Presentation of a single error.
 
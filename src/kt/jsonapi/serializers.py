@@ -111,19 +111,35 @@ def relationship(context, relationship, relname=None):
             relationship = relmany
             collection = kt.jsonapi.interfaces.ICollection(
                 relationship.collection())
+            linkage = None
+            if relationship.includable:
+                linkage = context.cached_linkage(relationship)
 
             if relationship.includable and relname:
-                r['data'] = []
-                for res in collection.resources():
-                    res = kt.jsonapi.interfaces.IResource(res)
-                    r['data'].append(dict(
-                        type=res.type,
-                        id=res.id,
-                    ))
-                    context.include_relation(relname, res)
+                if linkage is not None and all(map(context.is_included,
+                                                   linkage)):
+                    # Every related resource is already part of the
+                    # document, so the collection need not be consulted.
+                    r['data'] = [dict(type=type, id=id)
+                                 for type, id in linkage]
+                else:
+                    r['data'] = []
+                    for res in collection.resources():
+                        res = kt.jsonapi.interfaces.IResource(res)
+                        r['data'].append(dict(
+                            type=res.type,
+                            id=res.id,
+                        ))
+                        context.include_relation(relname, res)
+                    context.cache_linkage(
+                        relationship, [(d['type'], d['id'])
+                                       for d in r['data']])
             elif relname:
                 raise werkzeug.exceptions.BadRequest(
                     f'requested relationship "{relname}" cannot be included')
+            elif linkage is not None:
+                if not linkage:
+                    r['data'] = []
             else:
                 it = iter(collection.resources())
                 try:
@@ -179,16 +195,17 @@ def resource(context, resource):
         r['meta'] = d
 
     rels = dict(resource.relationships())
-    d = context.select_fields(resource.type, rels).copy()
+    selected = context.select_fields(resource.type, rels)
+    items = [(name, rel, name if context.should_include(name) else None)
+             for name, rel in selected.items()]
+    # Relationships not selected may still need to be included:
+    items.extend((name, rel, name) for name, rel in rels.items()
+                 if name not in selected and context.should_include(name))
+    bodies = context.serialize_relationships(
+        [(rel, relname) for name, rel, relname in items])
+    d = {name: body for (name, rel, relname), body in zip(items, bodies)
+         if name in selected}
     if d:
-        for name, rel in d.items():
-            relname = name if context.should_include(name) else None
-            d[name] = relationship(context, rel, relname=relname)
-            # Avoid considering this relationship for inclusion again:
-            del rels[name]
         r['relationships'] = d
-    for name, rel in rels.items():
-        if context.should_include(name):
-            relationship(context, rel, relname=name)
 
     return r
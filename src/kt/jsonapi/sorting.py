@@ -0,0 +1,114 @@
+"""\
+Parsing of the ``sort`` query parameter.
+
+Collections providing :class:`~kt.jsonapi.interfaces.ISortableCollection`
+receive the ``sort`` parameter as a string.  Collections providing
+:class:`~kt.jsonapi.interfaces.ISortSpecCollection` instead receive a
+sequence of :class:`SortKey` values, checked against the fields the
+collection allows.
+
+"""
+
+import collections
+
+import kt.jsonapi.interfaces
+
+
+SortKey = collections.namedtuple('SortKey', 'field descending')
+SortKey.__doc__ = """\
+Field to sort by, and whether the order is descending.
+
+The ``sort`` value ``-created,title`` corresponds to
+``(SortKey('created', True), SortKey('title', False))``.
+"""
+
+
+def parse_sort(sort, fields=None):
+    """Parse the value of the ``sort`` query parameter.
+
+    Returns a tuple of :class:`SortKey` values in order of precedence.
+    Each field must be a member name, or a dotted path of member names.
+    If *fields* is provided, only the names it contains are allowed.
+
+    Problems are reported by raising
+    :exc:`~kt.jsonapi.interfaces.InvalidQueryKeyValue` or
+    :exc:`~kt.jsonapi.interfaces.InvalidRelationshipPath`.
+
+    """
+    if isinstance(sort, dict):
+        raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+            "value for query string key 'sort'"
+            " must not contain nested containers",
+            key='sort',
+            value=sort)
+    keys = []
+    seen = set()
+    for part in sort.split(','):
+        descending = part.startswith('-')
+        field = part[1:] if descending else part
+        if not field:
+            raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                "value for query string key 'sort' contains an empty"
+                " field name",
+                key='sort',
+                value=sort)
+        kt.jsonapi.interfaces.validate_relationship_path(field, 'sort')
+        if fields is not None and field not in fields:
+            raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                f'sorting by {field!r} is not supported',
+                key='sort',
+                value=sort)
+        if field in seen:
+            raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                f'value for query string key \'sort\' names {field!r}'
+                f' more than once',
+                key='sort',
+                value=sort)
+        seen.add(field)
+        keys.append(SortKey(field, descending))
+    return tuple(keys)
+
+
+class _Descending:
+    # Reverses the order of the wrapped value, so ascending and
+    # descending fields can be combined in a single key.
+
+    __slots__ = 'value',
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _null_last(value):
+    # None sorts after all other values, without comparing it to them.
+    return value is None, value
+
+
+def key_function(spec, record):
+    """Return a key function for sorting resources by *spec*.
+
+    *record* is called with each item to get a mapping of field values.
+    Values of ``None`` sort after other values in ascending order, and
+    before them in descending order.
+
+    """
+    if all(not key.descending for key in spec):
+        fields = [key.field for key in spec]
+
+        def key(item):
+            values = record(item)
+            return tuple(_null_last(values[field]) for field in fields)
+    else:
+        def key(item):
+            values = record(item)
+            return tuple(
+                _Descending(_null_last(values[sk.field])) if sk.descending
+                else _null_last(values[sk.field])
+                for sk in spec)
+    return key
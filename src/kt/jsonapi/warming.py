@@ -0,0 +1,174 @@
+"""\
+Cache warming based on observed requests.
+
+A :class:`RequestKeyRecorder` counts the request keys of documents
+generated by contexts it is configured for; the most frequent keys can
+be saved to a local file and replayed by a :class:`Warmer` to fill the
+response cache before traffic is accepted, or periodically thereafter.
+
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+
+import kt.jsonapi.api
+
+
+logger = logging.getLogger(__name__)
+
+
+class RequestKeyRecorder:
+    """Thread-safe counter of observed request keys.
+
+    Keys are recorded along with the kind of document generated, either
+    ``'collection'`` or ``'resource'``.  At most *maxsize* distinct keys
+    are tracked; when the limit is exceeded, the least frequent keys are
+    discarded.
+
+    """
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def record(self, kind, request_key, count=1):
+        """Record *count* requests for a document."""
+        path, query = request_key
+        with self._lock:
+            self._counts[kind, path, query] += count
+            if len(self._counts) > self.maxsize * 2:
+                self._counts = collections.Counter(
+                    dict(self._counts.most_common(self.maxsize)))
+
+    def most_common(self, n=None):
+        """Return a list of the *n* most frequent entries.
+
+        Each entry is a ``(kind, request_key, count)`` tuple.
+
+        """
+        with self._lock:
+            entries = self._counts.most_common(n or self.maxsize)
+        return [(kind, (path, query), count)
+                for (kind, path, query), count in entries]
+
+    def save(self, filename):
+        """Write the most frequent entries to *filename* as JSON.
+
+        The file is replaced atomically.
+
+        """
+        entries = [dict(kind=kind, path=path, query=query, count=count)
+                   for kind, (path, query), count in self.most_common()]
+        tmpname = f'{filename}.tmp'
+        with open(tmpname, 'w') as f:
+            json.dump(entries, f, indent=1)
+        os.replace(tmpname, filename)
+
+    def load(self, filename):
+        """Add entries from a file written by :meth:`save`.
+
+        A missing file is ignored, since there is nothing to warm the
+        first time an application is started.
+
+        """
+        try:
+            with open(filename) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            self.record(entry['kind'], (entry['path'], entry['query']),
+                        count=entry['count'])
+
+
+class Warmer:
+    """Replay recorded requests to fill the response cache.
+
+    Documents are generated using contexts created by
+    :meth:`~kt.jsonapi.api.Context.from_query_string`, so no request is
+    involved.  The context class is taken from the
+    ``KT_JSONAPI_CONTEXT_REGULAR`` setting of the application if not
+    provided, and should have a
+    :attr:`~kt.jsonapi.api.Context.response_cache` configured.  Warmed
+    documents are not counted by the recorder.
+
+    """
+
+    def __init__(self, app, recorder, resolve, context_factory=None):
+        """Initialize warmer.
+
+        :param app:  Flask application the documents are generated for.
+        :param recorder:  :class:`RequestKeyRecorder` providing keys.
+        :param resolve:
+            Function accepting the kind of document and the path for a
+            request, and returning a factory for the collection or
+            resource, as accepted by
+            :meth:`~kt.jsonapi.api.Context.collection` and
+            :meth:`~kt.jsonapi.api.Context.resource`.  ``None`` may be
+            returned if the path should not be warmed.
+        :param context_factory:  Context class to use.
+
+        """
+        if context_factory is None:
+            context_factory = app.config.get('KT_JSONAPI_CONTEXT_REGULAR',
+                                             kt.jsonapi.api.Context)
+        self.app = app
+        self.recorder = recorder
+        self.resolve = resolve
+        self.context_factory = context_factory
+        self._stopped = None
+
+    def warm(self, limit=None):
+        """Generate documents for the *limit* most frequent keys.
+
+        Failures are logged and do not prevent other documents from
+        being generated.  Returns the number of documents generated.
+
+        """
+        count = 0
+        for kind, (path, query), n in self.recorder.most_common(limit):
+            try:
+                factory = self.resolve(kind, path)
+                if factory is None:
+                    continue
+                context = self.context_factory.from_query_string(
+                    self.app, query, path=path)
+                context.warm(kind, factory)
+            except Exception:
+                logger.exception('failed to warm %s %s?%s', kind, path, query)
+            else:
+                count += 1
+        return count
+
+    def start(self, interval, limit=None):
+        """Warm caches every *interval* seconds from a daemon thread.
+
+        The first run happens immediately.
+
+        """
+        if self._stopped is not None:
+            raise RuntimeError('warmer already started')
+        stopped = self._stopped = threading.Event()
+
+        def run():
+            while not stopped.is_set():
+                self.warm(limit)
+                stopped.wait(interval)
+
+        thread = threading.Thread(target=run, name='kt.jsonapi.warming',
+                                  daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        """Stop periodic warming started by :meth:`start`."""
+        if self._stopped is not None:
+            self._stopped.set()
+            self._stopped = None
@@ -0,0 +1,60 @@
+"""\
+Response generation for plain WSGI applications.
+
+The contexts defined here parse the request from the WSGI environment
+and return :class:`Response` objects, which are themselves WSGI
+applications, so Flask is not involved in handling the request::
+
+    def application(environ, start_response):
+        context = kt.jsonapi.wsgi.WSGIContext(environ)
+        response = context.collection(get_things())
+        return response(environ, start_response)
+
+Documents are encoded using :func:`json.dumps`, with the
+:class:`json.JSONEncoder` subclass passed as *json_encoder*.
+
+"""
+
+import kt.jsonapi.api
+
+
+class Response(kt.jsonapi.api.Response):
+    """Response that can be returned as a WSGI application."""
+
+    def __call__(self, environ, start_response):
+        start_response(self.status_line, self.header_items())
+        return [self.body]
+
+
+class _EnvironRequest:
+
+    def __init__(self, environ):
+        # PEP 3333 provides native strings decoded as latin-1.
+        path = environ.get('PATH_INFO') or '/'
+        self.path = path.encode('latin-1').decode('utf-8', 'replace')
+        self.query_string = environ.get('QUERY_STRING', '').encode('latin-1')
+
+
+class _WSGIContextMixin:
+
+    response_class = Response
+
+    def __init__(self, environ, json_encoder=None):
+        super(_WSGIContextMixin, self).__init__(
+            kt.jsonapi.api._StaticApp(json_encoder),
+            _EnvironRequest(environ))
+
+    def _build_response(self, data, status, headers):
+        return self.response_class(data, status, headers)
+
+
+class WSGIContext(_WSGIContextMixin, kt.jsonapi.api.Context):
+    """Context for a request described by a WSGI environment.
+
+    All features of :class:`~kt.jsonapi.api.Context` are supported.
+
+    """
+
+
+class WSGIErrorContext(_WSGIContextMixin, kt.jsonapi.api.ErrorContext):
+    """Context for error responses described by a WSGI environment."""
@@ -0,0 +1,132 @@
+"""\
+Tests for kt.jsonapi.wsgi and kt.jsonapi.asgi.
+
+"""
+
+import asyncio
+import json
+import unittest
+import wsgiref.util
+
+import flask
+
+import kt.jsonapi.api
+import kt.jsonapi.asgi
+import kt.jsonapi.error
+import kt.jsonapi.link
+import kt.jsonapi.wsgi
+import tests.objects
+
+
+def make_collection():
+    tag = tests.objects.SimpleResource(type='tag', id='t1',
+                                       attributes=dict(name='red'))
+    things = [tests.objects.SimpleResource(
+                  type='thing', id=str(n), attributes=dict(n=n),
+                  relationships=dict(tag=tests.objects.ToOneRel(tag)))
+              for n in range(3)]
+    return tests.objects.SimpleCollection(
+        things, links=dict(self=kt.jsonapi.link.Link('/things')))
+
+
+def flask_document(path):
+    app = flask.Flask(__name__)
+    with app.test_request_context(path):
+        context = kt.jsonapi.api.Context(app, flask.request)
+        return json.loads(context.collection(make_collection()).get_data())
+
+
+class WSGIContextTestCase(unittest.TestCase):
+
+    def call(self, application, path, query=''):
+        environ = dict(PATH_INFO=path, QUERY_STRING=query)
+        wsgiref.util.setup_testing_defaults(environ)
+        started = []
+
+        def start_response(status, headers):
+            started.append((status, headers))
+
+        body = b''.join(application(environ, start_response))
+        (status, headers), = started
+        return status, dict(headers), body
+
+    def test_collection(self):
+        def application(environ, start_response):
+            context = kt.jsonapi.wsgi.WSGIContext(environ)
+            response = context.collection(make_collection())
+            return response(environ, start_response)
+
+        status, headers, body = self.call(
+            application, '/things', 'include=tag&fields[thing]=n')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Type'], kt.jsonapi.api.CONTENT_TYPE)
+        self.assertEqual(headers['Content-Length'], str(len(body)))
+        self.assertEqual(
+            json.loads(body),
+            flask_document('/things?include=tag&fields[thing]=n'))
+
+    def test_error(self):
+        def application(environ, start_response):
+            context = kt.jsonapi.wsgi.WSGIErrorContext(environ)
+            error = kt.jsonapi.error.Error(
+                status=404, detail='no such thing')
+            response = context.error(error, headers={'X-Test': 'yes'})
+            return response(environ, start_response)
+
+        status, headers, body = self.call(application, '/things/42')
+        self.assertEqual(status, '404 Not Found')
+        self.assertEqual(headers['X-Test'], 'yes')
+        self.assertEqual(json.loads(body)['errors'][0]['detail'],
+                         'no such thing')
+
+    def test_non_ascii_path(self):
+        environ = dict(PATH_INFO='/thÃ­ngs')
+        wsgiref.util.setup_testing_defaults(environ)
+        context = kt.jsonapi.wsgi.WSGIContext(environ)
+        self.assertEqual(context.request_key, ('/thíngs', ''))
+
+
+class ASGIContextTestCase(unittest.TestCase):
+
+    def call(self, application, path, query=b''):
+        scope = dict(type='http', method='GET', path=path,
+                     query_string=query, headers=[])
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(application(scope, receive, send))
+        start, body = messages
+        self.assertEqual(start['type'], 'http.response.start')
+        self.assertEqual(body['type'], 'http.response.body')
+        return start['status'], dict(start['headers']), body['body']
+
+    def test_collection(self):
+        async def application(scope, receive, send):
+            context = kt.jsonapi.asgi.ASGIContext(scope)
+            response = await context.collection(make_collection())
+            await response(scope, receive, send)
+
+        status, headers, body = self.call(application, '/things',
+                                          b'include=tag')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b'content-type'],
+                         kt.jsonapi.api.CONTENT_TYPE.encode('ascii'))
+        self.assertEqual(json.loads(body),
+                         flask_document('/things?include=tag'))
+
+    def test_error(self):
+        async def application(scope, receive, send):
+            context = kt.jsonapi.asgi.ASGIErrorContext(scope)
+            error = kt.jsonapi.error.Error(
+                status=404, detail='no such thing')
+            await context.error(error)(scope, receive, send)
+
+        status, headers, body = self.call(application, '/things/42')
+        self.assertEqual(status, 404)
+        self.assertEqual(headers[b'content-length'],
+                         str(len(body)).encode('ascii'))
@@ -0,0 +1,224 @@
+"""\
+Tests for kt.jsonapi.aio.
+
+"""
+
+import asyncio
+import json
+
+import werkzeug.exceptions
+import zope.interface
+
+import kt.jsonapi.aio
+import kt.jsonapi.api
+import kt.jsonapi.interfaces
+import kt.jsonapi.link
+import tests.objects
+import tests.utils
+
+
+class Tracker:
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def fetch(self, value):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(0.01)
+        finally:
+            self.active -= 1
+        return value
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IAsyncResource)
+class AsyncResource(tests.objects.SimpleResource):
+
+    tracker = None
+
+    async def attributes(self):
+        return await self.tracker.fetch(self._attributes)
+
+    async def relationships(self):
+        return self._relationships
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IAsyncCollection)
+class AsyncCollection(tests.objects.SimpleCollection):
+
+    async def resources(self):
+        for resource in self._resources:
+            yield resource
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IAsyncToOneRelationship)
+class AsyncToOneRel(tests.objects.ToOneRel):
+
+    tracker = None
+
+    async def resource(self):
+        return await self.tracker.fetch(self._related)
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IAsyncToManyRelationship)
+class AsyncToManyRel(tests.objects.ToManyRel):
+
+    async def collection(self):
+        return self._collection
+
+
+class AsyncContextTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(AsyncContextTestCase, self).setUp()
+        self.tracker = Tracker()
+
+    def build(self, asynchronous):
+        if asynchronous:
+            resource_factory = AsyncResource
+            collection_factory = AsyncCollection
+            to_one, to_many = AsyncToOneRel, AsyncToManyRel
+        else:
+            resource_factory = tests.objects.SimpleResource
+            collection_factory = tests.objects.SimpleCollection
+            to_one, to_many = tests.objects.ToOneRel, tests.objects.ToManyRel
+
+        def make_resource(*args, **kwargs):
+            resource = resource_factory(*args, **kwargs)
+            resource.tracker = self.tracker
+            return resource
+
+        def make_to_one(*args, **kwargs):
+            rel = to_one(*args, **kwargs)
+            rel.tracker = self.tracker
+            return rel
+
+        person = make_resource(type='person', id='p1',
+                               attributes=dict(name='Alice'))
+        tags = [make_resource(type='tag', id=str(n),
+                              attributes=dict(label=f'tag {n}'))
+                for n in range(3)]
+        things = []
+        for n in range(4):
+            things.append(make_resource(
+                type='thing', id=str(n), attributes=dict(n=n),
+                relationships=dict(
+                    owner=make_to_one(person),
+                    tags=to_many(collection_factory(tags[n % 2:n % 2 + 2])),
+                    empty=to_many(collection_factory([])),
+                )))
+        return collection_factory(
+            things, links=dict(self=kt.jsonapi.link.Link('/things')))
+
+    def render_sync(self, path, method='collection'):
+        with self.request_context(path):
+            context = kt.jsonapi.api.context()
+            target = self.build(asynchronous=False)
+            if method == 'resource':
+                target = target._resources[0]
+            return json.loads(getattr(context, method)(target).get_data())
+
+    def render_async(self, path, method='collection'):
+        with self.request_context(path):
+            context = kt.jsonapi.aio.context()
+            self.assertIs(kt.jsonapi.aio.context(), context)
+            target = self.build(asynchronous=True)
+            if method == 'resource':
+                target = target._resources[0]
+            response = asyncio.run(getattr(context, method)(target))
+            return json.loads(response.get_data())
+
+    def test_collection_matches_sync(self):
+        for path in ('/things',
+                     '/things?include=owner,tags',
+                     '/things?include=tags&fields[thing]=n,owner'
+                     '&fields[tag]='):
+            self.assertEqual(self.render_async(path), self.render_sync(path))
+
+    def test_resource_matches_sync(self):
+        path = '/things/0?include=owner,tags'
+        expected = self.render_sync(path, 'resource')
+        self.assertEqual(self.render_async(path, 'resource'), expected)
+        self.assertEqual([item['id'] for item in expected['included']],
+                         ['p1', '0', '1'])
+
+    def test_concurrent_fetches(self):
+        self.render_async('/things?include=owner')
+        self.assertGreater(self.tracker.max_active, 1)
+
+    def test_parallelism_bounded(self):
+        class BoundedContext(kt.jsonapi.aio.AsyncContext):
+            include_parallelism = 2
+
+        self.app.config['KT_JSONAPI_CONTEXT_ASYNC'] = BoundedContext
+        self.assertEqual(self.render_async('/things'),
+                         self.render_sync('/things'))
+        self.assertEqual(self.tracker.max_active, 2)
+
+    def test_related_document_headers(self):
+        class SurrogateKeyContext(kt.jsonapi.aio.AsyncContext):
+            surrogate_key_header = 'Surrogate-Key'
+
+        self.app.config['KT_JSONAPI_CONTEXT_ASYNC'] = SurrogateKeyContext
+        rel = AsyncToOneRel(AsyncResource(type='person', id='p2'))
+        rel.tracker = self.tracker
+        rel._related.tracker = self.tracker
+        with self.request_context('/things/1/owner'):
+            context = kt.jsonapi.aio.context()
+            response = asyncio.run(context.related(rel))
+        self.assertEqual(response.headers['Surrogate-Key'],
+                         'person person/p2')
+
+    def test_related(self):
+        rel = AsyncToOneRel(AsyncResource(type='person', id='p2'))
+        rel.tracker = self.tracker
+        rel._related.tracker = self.tracker
+        with self.request_context('/things/1/owner'):
+            context = kt.jsonapi.aio.context()
+            response = asyncio.run(context.related(rel))
+        self.assertEqual(response.json['data']['id'], 'p2')
+
+    def test_not_includable(self):
+        rel = AsyncToOneRel(None)
+        rel.includable = False
+        resource = AsyncResource(type='thing', id='1',
+                                 relationships=dict(owner=rel))
+        resource.tracker = self.tracker
+        with self.request_context('/things/1?include=owner'):
+            context = kt.jsonapi.aio.context()
+            with self.assertRaises(werkzeug.exceptions.BadRequest):
+                asyncio.run(context.resource(resource))
+
+    def test_yields_to_event_loop(self):
+        tags = [tests.objects.SimpleResource(type='tag', id=str(n))
+                for n in range(10)]
+        resource = tests.objects.SimpleResource(
+            type='thing', id='1', relationships=dict(
+                tags=tests.objects.ToManyRel(
+                    tests.objects.SimpleCollection(tags))))
+
+        async def main(context):
+            ticks = []
+
+            async def ticker():
+                while True:
+                    ticks.append(None)
+                    await asyncio.sleep(0)
+
+            task = asyncio.ensure_future(ticker())
+            await asyncio.sleep(0)
+            del ticks[:]
+            await context.resource(resource)
+            task.cancel()
+            return len(ticks)
+
+        for interval, expected in ((2, 5), (1000, 0)):
+            class YieldingContext(kt.jsonapi.aio.AsyncContext):
+                yield_interval = interval
+
+            with self.request_context('/things/1?include=tags'):
+                self.app.config['KT_JSONAPI_CONTEXT_ASYNC'] = YieldingContext
+                context = kt.jsonapi.aio.context()
+                self.assertEqual(asyncio.run(main(context)), expected)
@@ -0,0 +1,875 @@
+"""\
+Tests for kt.jsonapi.cache.
+
+"""
+
+import concurrent.futures
+import threading
+import time
+import unittest
+
+import flask
+import flask_restful
+import zope.interface
+
+import kt.jsonapi.api
+import kt.jsonapi.cache
+import kt.jsonapi.collection
+import kt.jsonapi.filtering
+import kt.jsonapi.interfaces
+import kt.jsonapi.link
+import kt.jsonapi.relation
+import kt.jsonapi.serializers
+import kt.jsonapi.sorting
+import tests.objects
+import tests.utils
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class LinkageCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = kt.jsonapi.cache.LinkageCache(
+            maxsize=2, ttl=10, clock=self.clock)
+
+    def test_get_set(self):
+        self.assertIsNone(self.cache.get('article', '1', 'tags'))
+        self.cache.set('article', '1', 'tags', [('tag', 'a'), ('tag', 'b')])
+        self.assertEqual(self.cache.get('article', '1', 'tags'),
+                         (('tag', 'a'), ('tag', 'b')))
+
+    def test_version_is_part_of_key(self):
+        self.cache.set('article', '1', 'tags', [('tag', 'a')], version=1)
+        self.assertIsNone(self.cache.get('article', '1', 'tags'))
+        self.assertIsNone(self.cache.get('article', '1', 'tags', version=2))
+        self.assertEqual(self.cache.get('article', '1', 'tags', version=1),
+                         (('tag', 'a'),))
+
+    def test_invalidate(self):
+        self.cache.set('article', '1', 'tags', [])
+        self.cache.set('article', '1', 'authors', [])
+        self.cache.invalidate('article', '1', 'tags')
+        self.assertIsNone(self.cache.get('article', '1', 'tags'))
+        self.assertEqual(self.cache.get('article', '1', 'authors'), ())
+        self.cache.invalidate('article', '1')
+        self.assertEqual(len(self.cache), 0)
+
+    def test_expiration(self):
+        self.cache.set('article', '1', 'tags', [])
+        self.clock.now += 10
+        self.assertIsNone(self.cache.get('article', '1', 'tags'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_size_bound(self):
+        self.cache.set('article', '1', 'tags', [])
+        self.cache.set('article', '2', 'tags', [])
+        # Refresh the first entry so the second is least recently used:
+        self.cache.get('article', '1', 'tags')
+        self.cache.set('article', '3', 'tags', [])
+        self.assertEqual(self.cache.get('article', '1', 'tags'), ())
+        self.assertIsNone(self.cache.get('article', '2', 'tags'))
+        self.assertEqual(self.cache.get('article', '3', 'tags'), ())
+
+
+class LinkageCacheSerializationTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(LinkageCacheSerializationTestCase, self).setUp()
+        self.cache = kt.jsonapi.cache.LinkageCache()
+        self.source = tests.objects.SimpleResource(type='article', id='1')
+        self.tag = tests.objects.SimpleResource(type='tag', id='t1')
+
+    def make_relation(self):
+        self.collection = tests.objects.SimpleCollection(
+            [self.tag],
+            links=dict(self=kt.jsonapi.link.Link('/article/1/tags')))
+        return kt.jsonapi.relation.ToManyRelationship(
+            self.source, self.collection, 'tags')
+
+    def get_context(self, path):
+        with self.request_context(path):
+            context = kt.jsonapi.api.context()
+        context.linkage_cache = self.cache
+        return context
+
+    def test_included_linkage_cached(self):
+        context = self.get_context('/?include=tags')
+        relation = self.make_relation()
+        first = kt.jsonapi.serializers.relationship(
+            context, relation, relname='tags')
+        self.assertEqual(self.collection.ncalls_resources, 1)
+        self.assertEqual(self.cache.get('article', '1', 'tags'),
+                         (('tag', 't1'),))
+
+        # The tag is now included, so the collection isn't consulted:
+        relation = self.make_relation()
+        second = kt.jsonapi.serializers.relationship(
+            context, relation, relname='tags')
+        self.assertEqual(self.collection.ncalls_resources, 0)
+        self.assertEqual(first['data'], second['data'])
+        self.assertEqual(len(context.included), 1)
+
+    def test_cached_linkage_requires_inclusion(self):
+        context = self.get_context('/?include=tags')
+        self.cache.set('article', '1', 'tags', [('tag', 't1')])
+        relation = self.make_relation()
+        kt.jsonapi.serializers.relationship(
+            context, relation, relname='tags')
+        # Not yet included, so the resources had to be retrieved:
+        self.assertEqual(self.collection.ncalls_resources, 1)
+        self.assertEqual(len(context.included), 1)
+
+    def test_cached_empty_linkage_not_included(self):
+        context = self.get_context('/')
+        self.cache.set('article', '1', 'tags', [])
+        relation = self.make_relation()
+        data = kt.jsonapi.serializers.relationship(context, relation)
+        self.assertEqual(data['data'], [])
+        self.assertEqual(self.collection.ncalls_resources, 0)
+
+    def test_invalidated_linkage_not_used(self):
+        context = self.get_context('/')
+        self.cache.set('article', '1', 'tags', [])
+        self.cache.invalidate('article', '1')
+        relation = self.make_relation()
+        data = kt.jsonapi.serializers.relationship(context, relation)
+        self.assertNotIn('data', data)
+        self.assertEqual(self.collection.ncalls_resources, 1)
+
+
+class IncludeCacheTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(IncludeCacheTestCase, self).setUp()
+        p1 = tests.objects.SimpleResource(type='person', id='p1')
+        p2 = tests.objects.SimpleResource(type='person', id='p2')
+        c1 = tests.objects.SimpleResource(type='comment', id='c1')
+        c2 = tests.objects.SimpleResource(type='comment', id='c2')
+        self.article = tests.objects.SimpleResource(type='article', id='a1')
+        for comment, author in ((c1, p1), (c2, p2)):
+            comment._relationships['author'] = (
+                kt.jsonapi.relation.ToOneRelationship(comment, author,
+                                                      'author'))
+        self.comments = tests.objects.SimpleCollection(
+            [c1, c2],
+            links=dict(self=kt.jsonapi.link.Link('/article/a1/comments')))
+        self.article._relationships.update(
+            author=kt.jsonapi.relation.ToOneRelationship(
+                self.article, p1, 'author'),
+            comments=kt.jsonapi.relation.ToManyRelationship(
+                self.article, self.comments, 'comments'),
+        )
+        self.store = {(r.type, r.id): r for r in (p1, p2, c1, c2)}
+        self.loaded = []
+        self.cache = kt.jsonapi.cache.IncludeCache(self.loader)
+        self.linkage_cache = kt.jsonapi.cache.LinkageCache()
+
+        context = self
+
+        class CachingContext(kt.jsonapi.api.Context):
+            include_cache = self.cache
+            linkage_cache = self.linkage_cache
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().resource(context.article)
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = CachingContext
+        self.api.add_resource(Render, '/')
+
+    def loader(self, identifiers):
+        self.loaded.append(list(identifiers))
+        return [self.store.get(ident) for ident in identifiers]
+
+    def test_closure_reused(self):
+        path = '/?include=author,comments.author'
+        first = self.http_get(path).json
+        self.assertEqual(self.loaded, [])
+        self.assertEqual(self.comments.ncalls_resources, 1)
+        self.assertEqual(
+            self.cache.get('article', 'a1', {'author', 'comments',
+                                             'comments.author'}),
+            ((('author',), 'person', 'p1'),
+             (('comments',), 'comment', 'c1'),
+             (('comments', 'author'), 'person', 'p2'),
+             (('comments',), 'comment', 'c2')))
+
+        second = self.http_get(path).json
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.loaded), 1)
+        # Linkage for the comments came from the linkage cache, since
+        # the comments were already known to be included:
+        self.assertEqual(self.comments.ncalls_resources, 1)
+
+    def test_unloadable_closure_falls_back(self):
+        path = '/?include=comments'
+        first = self.http_get(path).json
+        del self.store['comment', 'c2']
+        second = self.http_get(path).json
+        self.assertEqual(first, second)
+        self.assertEqual(len(self.loaded), 1)
+        self.assertEqual(self.comments.ncalls_resources, 2)
+
+    def test_invalidate(self):
+        self.http_get('/?include=comments')
+        self.http_get('/?include=author')
+        self.cache.invalidate('comment', 'c1')
+        self.assertIsNone(self.cache.get('article', 'a1', {'comments'}))
+        self.assertIsNotNone(self.cache.get('article', 'a1', {'author'}))
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IFilterableCollection,
+                            kt.jsonapi.interfaces.IPagableCollection)
+class CountingCollection(tests.objects.SimpleCollection):
+
+    instances = []
+
+    def __init__(self, *args, **kwargs):
+        super(CountingCollection, self).__init__(*args, **kwargs)
+        self.instances.append(self)
+
+
+class ResultCacheTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(ResultCacheTestCase, self).setUp()
+        self.resources = [tests.objects.SimpleResource(type='thing', id=id)
+                          for id in ('1', '2')]
+        store = {(r.type, r.id): r for r in self.resources}
+        self.loaded = []
+
+        def loader(identifiers):
+            self.loaded.append(identifiers)
+            return [store.get(ident) for ident in identifiers]
+
+        self.clock = FakeClock()
+        self.cache = kt.jsonapi.cache.ResultCache(loader, clock=self.clock)
+        CountingCollection.instances = []
+
+        class CachingContext(kt.jsonapi.api.Context):
+            result_cache = self.cache
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                collection = CountingCollection(self.resources,
+                                                meta=dict(total=2))
+                return kt.jsonapi.api.context().collection(collection)
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = CachingContext
+        self.api.add_resource(Render, '/things')
+
+    def ncalls(self):
+        return [c.ncalls_resources for c in CountingCollection.instances]
+
+    def test_normalized_parameters_share_entry(self):
+        first = self.http_get('/things?filter[a]=1&filter[b]=2').json
+        second = self.http_get('/things?filter[b]=2&filter[a]=1').json
+        self.assertEqual(self.ncalls(), [1, 0])
+        self.assertEqual(self.loaded, [(('thing', '1'), ('thing', '2'))])
+        self.assertEqual(first['data'], second['data'])
+        self.assertEqual(first['meta'], second['meta'])
+        # Parameters are still passed to the wrapped collection:
+        self.assertEqual(CountingCollection.instances[1].ncalls_set_filter,
+                         1)
+
+    def test_different_parameters_miss(self):
+        self.http_get('/things?page[size]=1')
+        self.http_get('/things?page[size]=2')
+        self.http_get('/things')
+        self.assertEqual(self.ncalls(), [1, 1, 1])
+
+    def test_expiration(self):
+        self.http_get('/things')
+        self.clock.now += 60
+        self.http_get('/things')
+        self.assertEqual(self.ncalls(), [1, 1])
+
+    def test_invalidate(self):
+        self.http_get('/things')
+        self.cache.invalidate('/things')
+        self.http_get('/things')
+        self.assertEqual(self.ncalls(), [1, 1])
+        self.assertEqual(self.loaded, [])
+
+    def test_parsed_parameters(self):
+        fields = dict(id=kt.jsonapi.filtering.FilterField(('in',)))
+        for n in range(2):
+            with self.request_context('/things?filter[id][in]=1,2&sort=-id'):
+                collection = kt.jsonapi.collection.MemoryCollection(
+                    self.resources, fields, sort_fields={'id'})
+                response = kt.jsonapi.api.context().collection(collection)
+            self.assertEqual([item['id'] for item in response.json['data']],
+                             ['2', '1'])
+        self.assertEqual(self.loaded, [(('thing', '2'), ('thing', '1'))])
+
+    def test_wrapper_provides_collection_interfaces(self):
+        collection = CountingCollection()
+        wrapped = self.cache.wrap(collection, 'key')
+        self.assertTrue(
+            kt.jsonapi.interfaces.IFilterableCollection.providedBy(wrapped))
+        self.assertFalse(
+            kt.jsonapi.interfaces.ISortableCollection.providedBy(wrapped))
+
+    def test_wrapper_passes_parsed_parameters(self):
+        fields = dict(id=kt.jsonapi.filtering.FilterField())
+
+        @zope.interface.implementer(
+            kt.jsonapi.interfaces.IFilterAstCollection,
+            kt.jsonapi.interfaces.ISortSpecCollection)
+        class ParsedCollection(tests.objects.SimpleCollection):
+            filter_fields = fields
+            sort_fields = frozenset(['id'])
+            expression = spec = None
+
+            def set_filter_ast(self, expression):
+                self.expression = expression
+
+            def set_sort_spec(self, spec):
+                self.spec = spec
+
+        collection = ParsedCollection(self.resources)
+        wrapped = self.cache.wrap(collection, 'key')
+        with self.request_context('/things?filter[id]=2&sort=-id'):
+            kt.jsonapi.api.context()._prepare_collection(wrapped)
+        self.assertEqual(collection.expression,
+                         kt.jsonapi.filtering.Comparison('id', 'eq', '2'))
+        self.assertEqual(collection.spec,
+                         (kt.jsonapi.sorting.SortKey('id', True),))
+
+
+class RequestCoalescerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.coalescer = kt.jsonapi.cache.RequestCoalescer(timeout=5)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.nbuilds = 0
+
+    def slow_build(self):
+        self.nbuilds += 1
+        self.started.set()
+        self.release.wait(5)
+        return b'document'
+
+    def run_concurrently(self, nthreads, build):
+        results = []
+
+        def target():
+            try:
+                results.append(self.coalescer.run('k', build))
+            except ValueError:
+                pass
+
+        leader = threading.Thread(target=target)
+        leader.start()
+        self.started.wait(5)
+        threads = [threading.Thread(target=target)
+                   for i in range(nthreads - 1)]
+        for thread in threads:
+            thread.start()
+        # Give the waiting threads a chance to register:
+        time.sleep(0.05)
+        self.release.set()
+        for thread in [leader] + threads:
+            thread.join(5)
+        return results
+
+    def test_concurrent_calls_share_result(self):
+        results = self.run_concurrently(4, self.slow_build)
+        self.assertEqual(results, [b'document'] * 4)
+        self.assertEqual(self.nbuilds, 1)
+
+    def test_sequential_calls_not_shared(self):
+        self.release.set()
+        self.coalescer.run('k', self.slow_build)
+        self.coalescer.run('k', self.slow_build)
+        self.assertEqual(self.nbuilds, 2)
+
+    def test_timeout_falls_back_to_building(self):
+        self.coalescer.timeout = 0.01
+        results = self.run_concurrently(2, self.slow_build)
+        self.assertEqual(results, [b'document'] * 2)
+        self.assertEqual(self.nbuilds, 2)
+
+    def test_failure_not_shared(self):
+        def build():
+            self.nbuilds += 1
+            self.started.set()
+            self.release.wait(5)
+            if self.nbuilds == 1:
+                raise ValueError('oops')
+            return b'document'
+
+        results = self.run_concurrently(2, build)
+        self.assertEqual(results, [b'document'])
+        self.assertEqual(self.nbuilds, 2)
+
+
+class CoalescingResponseTestCase(tests.utils.JSONAPITestCase):
+
+    def test_coalesced_response_uses_request_key(self):
+        keys = []
+
+        class Coalescer(kt.jsonapi.cache.RequestCoalescer):
+            def run(inst, key, build):
+                keys.append(key)
+                return super(Coalescer, inst).run(key, build)
+
+        class CoalescingContext(kt.jsonapi.api.Context):
+            coalescer = Coalescer()
+
+        resource = tests.objects.SimpleResource(type='thing', id='1')
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().resource(resource)
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = CoalescingContext
+        self.api.add_resource(Render, '/thing/1')
+        resp = self.http_get('/thing/1?fields[thing]=')
+        self.assertEqual(resp.json['data'], dict(
+            type='thing', id='1', links=dict(self='/thing/1')))
+        self.assertEqual(keys, [('resource',
+                                 ('/thing/1', 'fields[thing]='))])
+
+
+class ImmediateExecutor:
+
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, func, *args):
+        self.submitted += 1
+        func(*args)
+
+
+class ResponseCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.executor = ImmediateExecutor()
+        self.random = 1.0
+        self.cache = kt.jsonapi.cache.ResponseCache(
+            ttl=10, stale_ttl=20, executor=self.executor, clock=self.clock,
+            random=lambda: self.random)
+        self.builds = []
+
+    def build(self, value='built'):
+        def build():
+            self.builds.append(value)
+            return value
+        return build
+
+    def test_fresh_entry_served(self):
+        self.assertEqual(self.cache.get('k', self.build()), 'built')
+        self.clock.now += 9
+        self.assertEqual(
+            self.cache.get('k', self.build(), self.build('refreshed')),
+            'built')
+        self.assertEqual(self.builds, ['built'])
+
+    def test_stale_entry_served_while_refreshing(self):
+        self.cache.get('k', self.build())
+        self.clock.now += 15
+        self.assertEqual(
+            self.cache.get('k', self.build(), self.build('refreshed')),
+            'built')
+        self.assertEqual(self.builds, ['built', 'refreshed'])
+        self.assertEqual(self.cache.get('k', self.build()), 'refreshed')
+
+    def test_stale_entry_not_served_without_refresh(self):
+        self.cache.get('k', self.build())
+        self.clock.now += 15
+        self.assertEqual(self.cache.get('k', self.build('rebuilt')),
+                         'rebuilt')
+        self.assertEqual(self.executor.submitted, 0)
+
+    def test_expired_entry_rebuilt(self):
+        self.cache.get('k', self.build())
+        self.clock.now += 30
+        self.assertEqual(
+            self.cache.get('k', self.build('rebuilt'), self.build('x')),
+            'rebuilt')
+        self.assertEqual(self.executor.submitted, 0)
+
+    def test_early_expiration(self):
+        self.cache.set('k', 'built', delta=2.0)
+        self.clock.now += 8
+        # With random() near 1, no early expiration:
+        self.cache.get('k', self.build(), self.build('refreshed'))
+        self.assertEqual(self.executor.submitted, 0)
+        # With random() small, -log(random()) is large enough:
+        self.random = 0.2
+        self.assertEqual(
+            self.cache.get('k', self.build(), self.build('refreshed')),
+            'built')
+        self.assertEqual(self.builds, ['refreshed'])
+
+    def test_failed_refresh_keeps_entry(self):
+        self.cache.get('k', self.build())
+        self.clock.now += 15
+
+        def refresh():
+            raise ValueError('backend down')
+
+        with self.assertLogs('kt.jsonapi.cache') as cm:
+            self.assertEqual(self.cache.get('k', self.build(), refresh),
+                             'built')
+            self.assertEqual(self.cache.get('k', self.build(), refresh),
+                             'built')
+        self.assertEqual(len(cm.records), 2)
+
+
+class ResponseCacheContextTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(ResponseCacheContextTestCase, self).setUp()
+        self.clock = FakeClock()
+        self.executor = ImmediateExecutor()
+        self.cache = kt.jsonapi.cache.ResponseCache(
+            ttl=10, executor=self.executor, clock=self.clock, beta=0)
+        self.version = 0
+
+        class CachingContext(kt.jsonapi.api.Context):
+            response_cache = self.cache
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().collection(
+                    factory=self.factory)
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = CachingContext
+        self.api.add_resource(Render, '/things')
+
+    def factory(self):
+        self.version += 1
+        resource = tests.objects.SimpleResource(
+            type='thing', id='1', attributes=dict(version=self.version))
+        return tests.objects.SimpleCollection(
+            [resource], links=dict(self=kt.jsonapi.link.Link('/things')))
+
+    def version_of(self, resp):
+        return resp.json['data'][0]['attributes']['version']
+
+    def test_factory_response_cached(self):
+        self.assertEqual(self.version_of(self.http_get('/things')), 1)
+        self.assertEqual(
+            self.version_of(self.http_get('/things?include=')), 2)
+        self.assertEqual(self.version_of(self.http_get('/things')), 1)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_stale_response_refreshed_in_background(self):
+        self.http_get('/things?fields[thing]=version')
+        self.clock.now += 15
+        resp = self.http_get('/things?fields[thing]=version')
+        self.assertEqual(self.version_of(resp), 1)
+        self.assertEqual(self.executor.submitted, 1)
+        resp = self.http_get('/things?fields[thing]=version')
+        self.assertEqual(self.version_of(resp), 2)
+        self.assertEqual(resp.json['links'],
+                         dict(self='/things?fields[thing]=version'))
+
+    def test_context_copied_on_request_thread(self):
+        tasks = []
+        threads = []
+
+        class DeferredExecutor:
+            def submit(self, func, *args):
+                tasks.append((func, args))
+
+        self.cache._executor = DeferredExecutor()
+        context_class = self.app.config['KT_JSONAPI_CONTEXT_REGULAR']
+
+        class RecordingContext(context_class):
+            def _detached(self):
+                threads.append(threading.current_thread())
+                return super(RecordingContext, self)._detached()
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = RecordingContext
+        self.http_get('/things')
+        self.clock.now += 15
+        self.assertEqual(self.version_of(self.http_get('/things')), 1)
+        self.assertEqual(len(tasks), 1)
+
+        func, args = tasks[0]
+        thread = threading.Thread(target=func, args=args)
+        thread.start()
+        thread.join(5)
+        self.assertEqual(set(threads), {threading.current_thread()})
+        self.assertEqual(self.version_of(self.http_get('/things')), 2)
+
+    def test_target_and_factory_exclusive(self):
+        with self.request_context('/things'):
+            context = kt.jsonapi.api.context()
+            with self.assertRaises(TypeError):
+                context.collection(self.factory(), factory=self.factory)
+            with self.assertRaises(TypeError):
+                context.collection()
+
+
+class PrefetcherTestCase(unittest.TestCase):
+
+    def test_limits_pending(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        prefetcher = kt.jsonapi.cache.Prefetcher(max_pending=2,
+                                                 executor=executor)
+        self.assertTrue(prefetcher.submit('a', lambda: release.wait(5)))
+        self.assertFalse(prefetcher.submit('a', lambda: None))
+        self.assertTrue(prefetcher.submit('b', lambda: None))
+        self.assertFalse(prefetcher.submit('c', lambda: None))
+        release.set()
+
+    def test_overloaded_cancels_pending(self):
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        ran = []
+        overloaded = False
+        prefetcher = kt.jsonapi.cache.Prefetcher(
+            executor=executor, overloaded=lambda: overloaded)
+        prefetcher.submit('a', lambda: release.wait(5))
+        prefetcher.submit('b', lambda: ran.append('b'))
+        overloaded = True
+        self.assertFalse(prefetcher.submit('c', lambda: ran.append('c')))
+        release.set()
+        executor.shutdown(wait=True)
+        self.assertEqual(ran, [])
+
+    def test_failures_logged(self):
+        prefetcher = kt.jsonapi.cache.Prefetcher(executor=ImmediateExecutor())
+        with self.assertLogs('kt.jsonapi.cache'):
+            prefetcher.submit('a', lambda: 1 / 0)
+        # The failed task is no longer pending:
+        self.assertTrue(prefetcher.submit('a', lambda: None))
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IPagableCollection)
+class PagedCollection(tests.objects.SimpleCollection):
+
+    number = 1
+    size = 2
+
+    def set_pagination(self, page):
+        self.number = int(page['number'])
+
+    def resources(self):
+        start = (self.number - 1) * self.size
+        return self._resources[start:start + self.size]
+
+    def links(self):
+        links = dict(self=kt.jsonapi.link.Link('/things'))
+        if self.number * self.size < len(self._resources):
+            links['next'] = kt.jsonapi.link.Link(
+                f'/things?page[number]={self.number + 1}')
+        return links
+
+
+class PrefetchContextTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(PrefetchContextTestCase, self).setUp()
+        self.cache = kt.jsonapi.cache.ResponseCache()
+        self.prefetcher = kt.jsonapi.cache.Prefetcher(
+            executor=ImmediateExecutor())
+        self.ncreated = 0
+
+        class PrefetchContext(kt.jsonapi.api.Context):
+            response_cache = self.cache
+            prefetcher = self.prefetcher
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().collection(
+                    factory=self.factory)
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = PrefetchContext
+        self.api.add_resource(Render, '/things')
+
+    def factory(self):
+        self.ncreated += 1
+        return PagedCollection([
+            tests.objects.SimpleResource(type='thing', id=str(n))
+            for n in range(3)])
+
+    def test_next_page_prefetched(self):
+        first = self.http_get('/things?fields[thing]=').json
+        next_link = first['links']['next']
+        self.assertEqual(next_link, '/things?page[number]=2&fields[thing]=')
+        # One collection for the page requested, one for the next:
+        self.assertEqual(self.ncreated, 2)
+
+        second = self.http_get(next_link).json
+        self.assertEqual(self.ncreated, 2)
+        self.assertEqual([r['id'] for r in second['data']], ['2'])
+        # The prefetched page did not trigger further prefetching:
+        self.assertNotIn('next', second['links'])
+        self.assertEqual(len(self.cache), 2)
+
+    def test_prefix_mounted_application(self):
+        original = self.factory
+
+        def factory():
+            collection = original()
+            collection.links = lambda: {
+                rel: kt.jsonapi.link.Link(flask.request.script_root
+                                          + link.href)
+                for rel, link in PagedCollection.links(collection).items()}
+            return collection
+
+        self.factory = factory
+        base_url = 'http://localhost/api/'
+        first = self.client.get('/things', base_url=base_url).json
+        self.assertEqual(first['links']['next'],
+                         '/api/things?page[number]=2')
+        self.assertEqual(self.ncreated, 2)
+        second = self.client.get('/things?page[number]=2',
+                                 base_url=base_url).json
+        self.assertEqual([r['id'] for r in second['data']], ['2'])
+        self.assertEqual(self.ncreated, 2)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_context_copied_on_request_thread(self):
+        tasks = []
+        threads = []
+
+        class DeferredExecutor(concurrent.futures.Executor):
+            def submit(self, func, *args):
+                tasks.append((func, args))
+                return concurrent.futures.Future()
+
+        self.prefetcher._executor = DeferredExecutor()
+        context_class = self.app.config['KT_JSONAPI_CONTEXT_REGULAR']
+
+        class RecordingContext(context_class):
+            def _for_query_string(self, path, query_string):
+                threads.append(threading.current_thread())
+                return super(RecordingContext, self)._for_query_string(
+                    path, query_string)
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = RecordingContext
+        self.http_get('/things')
+        self.assertEqual(threads, [threading.current_thread()])
+        self.assertEqual(len(tasks), 1)
+        self.assertEqual(self.ncreated, 1)
+
+        func, args = tasks[0]
+        thread = threading.Thread(target=func, args=args)
+        thread.start()
+        thread.join(5)
+        self.assertEqual(self.ncreated, 2)
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(
+            [r['id'] for r in self.http_get('/things?page[number]=2')
+             .json['data']], ['2'])
+        self.assertEqual(self.ncreated, 2)
+
+
+class QueryStringCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = kt.jsonapi.cache.QueryStringCache(maxsize=4,
+                                                       max_length=20)
+        self.calls = []
+
+    def parse(self, query_string):
+        self.calls.append(query_string)
+        if query_string == 'bad':
+            raise kt.jsonapi.interfaces.InvalidQueryKeyValue(
+                'bad value', key='x', value='y')
+        return query_string.upper()
+
+    def test_results_cached(self):
+        self.assertEqual(self.cache.get('k', 'include=a', self.parse),
+                         'INCLUDE=A')
+        self.assertEqual(self.cache.get('k', 'include=a', self.parse),
+                         'INCLUDE=A')
+        self.assertEqual(self.calls, ['include=a'])
+        # Different parser keys are separate:
+        self.cache.get('other', 'include=a', self.parse)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_errors_cached(self):
+        with self.assertRaises(
+                kt.jsonapi.interfaces.InvalidQueryKeyValue) as first:
+            self.cache.get('k', 'bad', self.parse)
+        with self.assertRaises(
+                kt.jsonapi.interfaces.InvalidQueryKeyValue) as second:
+            self.cache.get('k', 'bad', self.parse)
+        self.assertEqual(self.calls, ['bad'])
+        self.assertIsNot(first.exception, second.exception)
+        self.assertEqual(str(second.exception), 'bad value')
+        self.assertEqual(second.exception.key, 'x')
+        self.assertEqual(second.exception.value, 'y')
+
+    def test_long_query_strings_not_cached(self):
+        query_string = 'include=' + 'a' * 20
+        self.cache.get('k', query_string, self.parse)
+        self.cache.get('k', query_string, self.parse)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(len(self.cache), 0)
+
+
+class QueryStringCacheContextTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(QueryStringCacheContextTestCase, self).setUp()
+
+        class CachingContext(kt.jsonapi.api.Context):
+            query_cache = kt.jsonapi.cache.QueryStringCache()
+
+        self.context_class = CachingContext
+
+    def make_context(self, path):
+        with self.request_context(path):
+            return self.context_class(self.app, flask.request)
+
+    def test_parsed_query_shared(self):
+        path = '/?fields[a]=x,y&include=b.c&filter[n]=1'
+        first = self.make_context(path)
+        second = self.make_context(path)
+        self.assertIs(first._qparams, second._qparams)
+        self.assertEqual(second.fields, dict(a={'x', 'y'}))
+        self.assertEqual(second.relpaths, {'b', 'b.c'})
+        # Public request information is private to each context:
+        self.assertIsNot(first.fields['a'], second.fields['a'])
+        self.assertIsNot(first.relpaths, second.relpaths)
+        self.assertEqual(len(self.context_class.query_cache), 1)
+
+    def test_query_private_to_context(self):
+        path = '/?filter[n][gt]=1&sort=n'
+        first = self.make_context(path)
+        first._query['filter']['n']['gt'] = '2'
+        first._query['sort'] = 'm'
+        second = self.make_context(path)
+        self.assertEqual(second._query,
+                         dict(filter=dict(n=dict(gt='1')), sort='n'))
+
+    def test_instance_limits_part_of_key(self):
+        context = self.make_context('/?include=a,b')
+        context.max_include_paths = 1
+        with self.assertRaises(kt.jsonapi.interfaces.TooManyIncludePaths):
+            context._for_query_string('/', 'include=a,b')
+        self.make_context('/?include=a,b')
+
+    def test_errors_cached(self):
+        for n in range(2):
+            with self.assertRaises(kt.jsonapi.interfaces.InvalidMemberName):
+                self.make_context('/?fields[a]=x,bad name')
+        self.assertEqual(len(self.context_class.query_cache), 1)
+
+    def test_disabled(self):
+        self.context_class.query_cache = None
+        first = self.make_context('/?include=b')
+        second = self.make_context('/?include=b')
+        self.assertIsNot(first._query, second._query)
@@ -0,0 +1,305 @@
+"""\
+Tests for kt.jsonapi.collection.
+
+"""
+
+import kt.jsonapi.api
+import kt.jsonapi.collection
+import kt.jsonapi.filtering
+import kt.jsonapi.interfaces
+import kt.jsonapi.link
+import kt.jsonapi.sorting
+import tests.objects
+import tests.utils
+
+
+class MemoryCollectionTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(MemoryCollectionTestCase, self).setUp()
+        self.resources = [
+            tests.objects.SimpleResource(
+                type='thing', id=str(n), attributes=dict(n=n, even=n % 2 == 0))
+            for n in range(6)]
+
+    def collection(self, **kwargs):
+        kwargs.setdefault('filter_fields', dict(
+            id=kt.jsonapi.filtering.FilterField(('eq', 'in')),
+            n=kt.jsonapi.filtering.FilterField(convert=int),
+        ))
+        kwargs.setdefault('sort_fields', ('n', 'even'))
+        return kt.jsonapi.collection.MemoryCollection(
+            self.resources,
+            links=dict(self=kt.jsonapi.link.Link('/things')),
+            meta=dict(total=6),
+            **kwargs)
+
+    def render(self, path, collection):
+        with self.request_context(path):
+            context = kt.jsonapi.api.context()
+            return context.collection(collection).json
+
+    def test_unfiltered(self):
+        data = self.render('/things', self.collection())
+        self.assertEqual([item['id'] for item in data['data']],
+                         ['0', '1', '2', '3', '4', '5'])
+        self.assertEqual(data['meta'], dict(total=6))
+        self.assertEqual(data['links'], dict(self='/things'))
+
+    def test_filtered(self):
+        data = self.render('/things?filter[n][range]=1,4&filter[id][in]=0,2,4',
+                           self.collection())
+        self.assertEqual([item['id'] for item in data['data']], ['2', '4'])
+        data = self.render('/things?filter[or][a][n][lt]=1'
+                           '&filter[or][b][n][ge]=5',
+                           self.collection())
+        self.assertEqual([item['id'] for item in data['data']], ['0', '5'])
+
+    def test_custom_record(self):
+        fields = dict(even=kt.jsonapi.filtering.FilterField(
+            ('eq',), convert=lambda value: value == 'true'))
+        collection = self.collection(
+            filter_fields=fields,
+            record=lambda res: dict(even=res.attributes()['even']))
+        data = self.render('/things?filter[even]=true', collection)
+        self.assertEqual([item['id'] for item in data['data']],
+                         ['0', '2', '4'])
+
+    def test_unsupported_field(self):
+        with self.request_context('/things?filter[even]=true'):
+            context = kt.jsonapi.api.context()
+            with self.assertRaises(kt.jsonapi.interfaces.InvalidQueryKey):
+                context.collection(self.collection())
+        with self.request_context('/things?filter[id]=1'):
+            context = kt.jsonapi.api.context()
+            with self.assertRaises(kt.jsonapi.interfaces.InvalidQueryKey):
+                context.collection(self.collection(filter_fields=None))
+
+    def ids(self, path, **kwargs):
+        data = self.render(path, self.collection(**kwargs))
+        return [item['id'] for item in data['data']]
+
+    def test_sorted(self):
+        self.assertEqual(self.ids('/things?sort=-n'),
+                         ['5', '4', '3', '2', '1', '0'])
+        self.assertEqual(self.ids('/things?sort=even,-n'),
+                         ['5', '3', '1', '4', '2', '0'])
+        self.assertEqual(self.ids('/things?sort=-n&filter[n][lt]=3'),
+                         ['2', '1', '0'])
+
+    def test_unsupported_sort(self):
+        with self.request_context('/things?sort=id'):
+            context = kt.jsonapi.api.context()
+            with self.assertRaises(
+                    kt.jsonapi.interfaces.InvalidQueryKeyValue) as cm:
+                context.collection(self.collection())
+        self.assertEqual(cm.exception.key, 'sort')
+
+    def test_paginated(self):
+        data = self.render('/things?page[number]=2&page[size]=2&sort=-n',
+                           self.collection())
+        self.assertEqual([item['id'] for item in data['data']], ['3', '2'])
+        self.assertEqual(data['links'], dict(
+            self='/things?page[number]=2&page[size]=2&sort=-n',
+            first='/things?page[number]=1&page[size]=2&sort=-n',
+            last='/things?page[number]=3&page[size]=2&sort=-n',
+            prev='/things?page[number]=1&page[size]=2&sort=-n',
+            next='/things?page[number]=3&page[size]=2&sort=-n',
+        ))
+
+    def test_default_page_size(self):
+        data = self.render('/things', self.collection(page_size=4))
+        self.assertEqual([item['id'] for item in data['data']],
+                         ['0', '1', '2', '3'])
+        self.assertIsNone(data['links']['prev'])
+        self.assertEqual(data['links']['next'],
+                         '/things?page[number]=2&page[size]=4')
+        self.assertEqual(self.ids('/things?page[number]=2', page_size=4),
+                         ['4', '5'])
+        self.assertEqual(self.ids('/things?page[number]=3', page_size=4), [])
+
+    def test_invalid_pagination(self):
+        for path, exception, key in (
+                ('/things?page=1',
+                 kt.jsonapi.interfaces.InvalidQueryKeyValue, 'page'),
+                ('/things?page[offset]=1',
+                 kt.jsonapi.interfaces.InvalidQueryKey, 'page[offset]'),
+                ('/things?page[number]=0',
+                 kt.jsonapi.interfaces.InvalidQueryKeyValue, 'page[number]'),
+                ('/things?page[size]=x',
+                 kt.jsonapi.interfaces.InvalidQueryKeyValue, 'page[size]'),
+                ('/things?page[size]=11',
+                 kt.jsonapi.interfaces.InvalidQueryKeyValue, 'page[size]')):
+            with self.request_context(path):
+                context = kt.jsonapi.api.context()
+                with self.assertRaises(exception) as cm:
+                    context.collection(self.collection(max_page_size=10))
+            self.assertEqual(cm.exception.key, key)
+
+    def test_raw_parameters(self):
+        collection = self.collection()
+        self.assertTrue(
+            kt.jsonapi.interfaces.IFilterableCollection.providedBy(
+                collection))
+        collection.set_filter(dict(n=dict(gt='2')))
+        collection.set_sort('-n')
+        self.assertEqual([res.id for res in collection.resources()],
+                         ['5', '4', '3'])
+
+    def test_top_k_matches_sort(self):
+        resources = [
+            tests.objects.SimpleResource(
+                type='thing', id=str(n), attributes=dict(n=(n * 7) % 10))
+            for n in range(100)]
+        pages = {}
+        for fraction in (0, 1):
+            pages[fraction] = []
+            for page in range(1, 4):
+                collection = kt.jsonapi.collection.MemoryCollection(
+                    resources, sort_fields={'n'}, page_size=3)
+                collection.top_k_fraction = fraction
+                collection.set_sort_spec(
+                    (kt.jsonapi.sorting.SortKey('n', True),))
+                collection.set_pagination(dict(number=str(page)))
+                pages[fraction].append(
+                    [res.id for res in collection.resources()])
+        # Top-k selection is stable, like sorting:
+        self.assertEqual(pages[1], pages[0])
+        self.assertEqual(pages[0][0], ['7', '17', '27'])
+
+
+class ResourceStoreTestCase(tests.utils.JSONAPITestCase):
+
+    filter_fields = dict(
+        id=kt.jsonapi.filtering.FilterField(),
+        color=kt.jsonapi.filtering.FilterField(),
+        size=kt.jsonapi.filtering.FilterField(convert=int),
+        weight=kt.jsonapi.filtering.FilterField(convert=int),
+    )
+
+    def setUp(self):
+        super(ResourceStoreTestCase, self).setUp()
+        self.resources = [self.make(n) for n in range(200)]
+        self.store = kt.jsonapi.collection.ResourceStore(
+            self.resources,
+            filter_fields=self.filter_fields,
+            sort_fields=('size', 'color', 'weight'),
+            hash_indexes=('color', 'size'),
+            sorted_indexes=('size',))
+
+    def make(self, n, **attributes):
+        values = dict(color=('red', 'green', 'blue')[n % 3],
+                      size=None if n % 11 == 0 else (n * 7) % 23,
+                      weight=n % 5)
+        values.update(attributes)
+        return tests.objects.SimpleResource(
+            type='thing', id=f'{n:04}', attributes=values)
+
+    def check(self, query_string):
+        # Identifiers follow insertion order, so the results should be
+        # the same as for a MemoryCollection.
+        with self.request_context('/things?' + query_string):
+            context = kt.jsonapi.api.context()
+            indexed = self.store.collection(page_size=500)
+            context._prepare_collection(indexed)
+            memory = kt.jsonapi.collection.MemoryCollection(
+                sorted(self.store._resources.values(),
+                       key=lambda res: res.id),
+                filter_fields=self.filter_fields,
+                sort_fields=self.store.sort_fields, page_size=500)
+            context._prepare_collection(memory)
+            ids = [res.id for res in indexed.resources()]
+            self.assertEqual(
+                ids, [res.id for res in memory.resources()], query_string)
+            self.assertEqual(indexed.links(), memory.links())
+        return ids
+
+    def check_all(self):
+        for query_string in (
+                '',
+                'filter[color]=red',
+                'filter[color][in]=red,blue&filter[size][ge]=10',
+                'filter[size][range]=3,9',
+                'filter[size][range]=,4',
+                'filter[size][lt]=5&filter[weight]=2',
+                'filter[or][a][color]=red&filter[or][b][size][gt]=20',
+                'filter[or][a][color]=red&filter[or][b][weight]=1',
+                'filter[not][color]=red&filter[size]=0',
+                'filter[size][ne]=4',
+                'sort=size',
+                'sort=-size',
+                'sort=-size&page[size]=7&page[number]=3',
+                'sort=size&filter[color]=green&page[size]=5',
+                'sort=-size&filter[size][le]=2',
+                'sort=color,-size&page[size]=10&page[number]=2',
+                'sort=-weight&page[size]=3',
+                'filter[color]=blue&page[size]=4&page[number]=2',
+                ):
+            self.check(query_string)
+
+    def test_matches_memory_collection(self):
+        self.check_all()
+
+    def test_incremental_updates(self):
+        for n in range(0, 200, 7):
+            self.store.remove(f'{n:04}')
+        for n in range(1, 200, 5):
+            if f'{n:04}' in self.store:
+                self.store.update(self.make(n, color='red', size=n % 4))
+        for n in range(200, 230):
+            self.store.add(self.make(n))
+        self.check_all()
+        self.assertEqual(len(self.store), 200 - 29 + 30)
+
+    def test_update_keeps_position(self):
+        self.store.update(self.make(3, color='red'))
+        ids = self.check('filter[color]=red')
+        self.assertEqual(ids[:3], ['0000', '0003', '0006'])
+
+    def test_uses_indexes(self):
+        records = self.store._records
+        evaluated = []
+
+        def predicate(record):
+            evaluated.append(record)
+            return True
+
+        collection = self.store.collection()
+        collection.set_filter_ast(kt.jsonapi.filtering.And([
+            kt.jsonapi.filtering.Comparison('color', 'eq', 'red'),
+            kt.jsonapi.filtering.Range('size', 0, 3),
+        ]))
+        collection._predicate = predicate
+        collection.resources()
+        self.assertLess(len(evaluated), len(records) // 10)
+
+    def test_index_walk_stops_at_page(self):
+        collection = self.store.collection(page_size=3)
+        collection.set_sort_spec((kt.jsonapi.sorting.SortKey('size', True),))
+        index = self.store._sorted['size']
+        walked = []
+        ordered = index.ordered
+
+        def tracking(descending):
+            for id in ordered(descending):
+                walked.append(id)
+                yield id
+
+        index.ordered = tracking
+        self.assertEqual(len(collection.resources()), 3)
+        self.assertEqual(len(walked), 3)
+
+    def test_errors(self):
+        with self.assertRaises(KeyError):
+            self.store.add(self.make(1))
+        with self.assertRaises(KeyError):
+            self.store.update(self.make(1000))
+        with self.assertRaises(KeyError):
+            self.store.remove('1000')
+        # A record that cannot be indexed leaves the store unchanged:
+        with self.assertRaises(TypeError):
+            self.store.update(self.make(1, color=['unhashable']))
+        with self.assertRaises(TypeError):
+            self.store.add(self.make(1000, size='large'))
+        self.assertNotIn('1000', self.store)
+        self.check_all()
@@ -0,0 +1,157 @@
+"""\
+Tests for kt.jsonapi.columnar.
+
+"""
+
+import unittest
+
+import kt.jsonapi.api
+import kt.jsonapi.collection
+import kt.jsonapi.filtering
+import kt.jsonapi.link
+import tests.objects
+import tests.utils
+
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+else:
+    import kt.jsonapi.columnar
+
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class ColumnarCollectionTestCase(tests.utils.JSONAPITestCase):
+
+    filter_fields = dict(
+        id=kt.jsonapi.filtering.FilterField(),
+        color=kt.jsonapi.filtering.FilterField(),
+        size=kt.jsonapi.filtering.FilterField(convert=int),
+        weight=kt.jsonapi.filtering.FilterField(convert=int),
+    )
+    sort_fields = ('size', 'color', 'weight')
+
+    def setUp(self):
+        super(ColumnarCollectionTestCase, self).setUp()
+        self.records = [
+            dict(id=f'{n:04}',
+                 color=('red', 'green', 'blue')[n % 3],
+                 size=None if n % 11 == 0 else (n * 7) % 23,
+                 weight=n % 5)
+            for n in range(200)]
+        self.columns = dict(
+            id=numpy.array([r['id'] for r in self.records]),
+            color=numpy.array([r['color'] for r in self.records]),
+            size=numpy.array([numpy.nan if r['size'] is None else r['size']
+                              for r in self.records]),
+            weight=numpy.array([r['weight'] for r in self.records]),
+        )
+
+    def collection(self, **kwargs):
+        kwargs.setdefault('filter_fields', self.filter_fields)
+        kwargs.setdefault('sort_fields', self.sort_fields)
+        return kt.jsonapi.columnar.ColumnarCollection(
+            'thing', self.columns, **kwargs)
+
+    def check(self, query_string, top_k_fraction=None):
+        with self.request_context('/things?' + query_string):
+            context = kt.jsonapi.api.context()
+            columnar = self.collection(
+                page_size=500, links=dict(self=kt.jsonapi.link.Link('/t')))
+            memory = kt.jsonapi.collection.MemoryCollection(
+                [tests.objects.SimpleResource(
+                    type='thing', id=record['id'],
+                    attributes=dict(record))
+                 for record in self.records],
+                filter_fields=self.filter_fields,
+                sort_fields=self.sort_fields, page_size=500,
+                links=dict(self=kt.jsonapi.link.Link('/t')))
+            if top_k_fraction is not None:
+                columnar.top_k_fraction = top_k_fraction
+                memory.top_k_fraction = top_k_fraction
+            context._prepare_collection(columnar)
+            context._prepare_collection(memory)
+            resources = list(columnar.resources())
+            expected = list(memory.resources())
+            self.assertEqual([res.id for res in resources],
+                             [res.id for res in expected], query_string)
+            self.assertEqual([res.attributes()['size'] for res in resources],
+                             [res.attributes()['size'] for res in expected])
+            self.assertEqual(
+                {rel: link and link.href
+                 for rel, link in columnar.links().items()},
+                {rel: link and link.href
+                 for rel, link in memory.links().items()})
+
+    def test_matches_memory_collection(self):
+        for query_string in (
+                '',
+                'filter[color]=red',
+                'filter[color][in]=red,blue&filter[size][ge]=10',
+                'filter[size][range]=3,9',
+                'filter[size][range]=,4',
+                'filter[size][lt]=5&filter[weight]=2',
+                'filter[or][a][color]=red&filter[or][b][size][gt]=20',
+                'filter[not][color]=red&filter[size]=0',
+                'filter[size][ne]=4',
+                'filter[id][in]=0003,0005,9999',
+                'sort=size',
+                'sort=-size',
+                'sort=-color',
+                'sort=color,-size&page[size]=10&page[number]=2',
+                'sort=-weight,size&page[size]=3',
+                'sort=size&filter[color]=green&page[size]=5',
+                'filter[color]=blue&page[size]=4&page[number]=2',
+                ):
+            self.check(query_string)
+
+    def test_top_k_matches_full_sort(self):
+        for query_string in (
+                'sort=size&page[size]=7',
+                'sort=-size&page[size]=7',
+                'sort=-size&page[size]=10&page[number]=3',
+                'sort=size&page[size]=20&page[number]=10',
+                'sort=-color&page[size]=5&page[number]=4',
+                'sort=weight&page[size]=9&page[number]=2',
+                'sort=-weight&filter[color]=red&page[size]=6',
+                ):
+            self.check(query_string, top_k_fraction=1)
+
+    def test_attributes(self):
+        columns = dict(
+            key=numpy.array([3, 1]),
+            score=numpy.array([0.5, numpy.nan]),
+            seen=numpy.array(['2024-05-01T12:00', 'NaT'],
+                             dtype='datetime64[m]'),
+        )
+        collection = kt.jsonapi.columnar.ColumnarCollection(
+            'item', columns, id='key',
+            resource_links=lambda id: dict(self=f'/items/{id}'))
+        resources = list(collection.resources())
+        self.assertEqual([(res.type, res.id) for res in resources],
+                         [('item', '3'), ('item', '1')])
+        self.assertEqual(resources[0].attributes(),
+                         dict(score=0.5, seen='2024-05-01T12:00'))
+        self.assertEqual(resources[1].attributes(),
+                         dict(score=None, seen=None))
+        self.assertEqual(resources[1].links(), dict(self='/items/1'))
+        self.assertEqual(type(resources[0].attributes()['score']), float)
+
+    def test_rendered(self):
+        with self.request_context('/things?sort=size&page[size]=2'
+                                  '&fields[thing]=size'):
+            context = kt.jsonapi.api.context()
+            data = context.collection(self.collection()).json
+        self.assertEqual(data['data'], [
+            dict(type='thing', id='0023', attributes=dict(size=0)),
+            dict(type='thing', id='0046', attributes=dict(size=0)),
+        ])
+
+    def test_invalid_columns(self):
+        with self.assertRaises(ValueError):
+            kt.jsonapi.columnar.ColumnarCollection(
+                'thing', dict(id=[1, 2], size=[1]))
+        with self.assertRaises(ValueError):
+            kt.jsonapi.columnar.ColumnarCollection(
+                'thing', dict(id=[1, 2]), sort_fields=('size',))
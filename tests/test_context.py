@@ -6,6 +6,8 @@ Tests for kt.jsonapi.api.Context, .context().
 import flask
 
 import kt.jsonapi.api
+import kt.jsonapi.error
+import kt.jsonapi.interfaces
 import tests.utils
 
 
@@ -258,6 +260,31 @@ class ContextClassTestCase(tests.utils.JSONAPITestCase):
         self.assertEqual(rc.fields, {})
         self.assertEqual(rc.relpaths, set())
 
+    def test_request_key_ignores_order(self):
+        with self.request_context(
+                '/things?fields[x]=b,a&include=c,a.b&sort=-a,b&page[n]=2'):
+            rc1 = self.get_context()
+        with self.request_context(
+                '/things?page[n]=2&include=a,a.b,c&sort=-a,b&fields[x]=a,b'):
+            rc2 = self.get_context()
+        self.assertEqual(rc1.request_key, rc2.request_key)
+        self.assertEqual(rc1.request_digest, rc2.request_digest)
+        self.assertEqual(
+            rc1.request_key,
+            ('/things',
+             'fields[x]=a,b&include=a.b,c&page[n]=2&sort=-a,b'))
+        hash(rc1.request_key)
+
+    def test_request_key_differs(self):
+        keys = set()
+        for urlpath in ('/things', '/things?include=',
+                        '/things?include=a', '/things?sort=b,-a',
+                        '/things?sort=-a,b', '/things?fields[x]=',
+                        '/other', '/things?other=x'):
+            with self.request_context(urlpath):
+                keys.add(self.get_context().request_key)
+        self.assertEqual(len(keys), 8)
+
 
 class ContextGetterTestCase(ContextClassTestCase):
 
@@ -312,3 +339,80 @@ class ErrorContextGetterTestCase(ErrorContextClassTestCase):
             ec = kt.jsonapi.api.error_context()
         self.assertIs(rc, ec)
         self.assertIsInstance(rc, kt.jsonapi.api.ErrorContext)
+
+
+class QueryLimitsTestCase(tests.utils.JSONAPITestCase):
+
+    class LimitedContext(kt.jsonapi.api.Context):
+        max_query_parameters = 4
+        max_key_depth = 2
+        max_include_paths = 3
+        max_include_depth = 2
+        max_fields_per_type = 3
+
+    def get_context(self, context_class=LimitedContext):
+        return context_class(
+            flask.current_app._get_current_object(),
+            flask.request._get_current_object())
+
+    def check_limit(self, path, exception, key, limit):
+        with self.assertRaises(exception) as cm:
+            with self.request_context(path):
+                self.get_context()
+        self.assertEqual(cm.exception.key, key)
+        self.assertEqual(cm.exception.limit, limit)
+        error = kt.jsonapi.error.queryStringError(cm.exception)
+        self.assertEqual(error.status, 400)
+        self.assertEqual(error.source(), {'parameter': key})
+
+    def test_within_limits(self):
+        with self.request_context('/?a=1&filter[x][y]=2&include=p.q,r,s'
+                                  '&fields[t]=a,b,c'):
+            rc = self.get_context()
+        self.assertEqual(rc.fields, {'t': {'a', 'b', 'c'}})
+        self.assertEqual(rc.relpaths, {'p', 'p.q', 'r', 's'})
+
+    def test_too_many_parameters(self):
+        self.check_limit('/?a=1&b=2&c=3&d=4&e=5&f=6',
+                         kt.jsonapi.interfaces.TooManyQueryParameters,
+                         'e', 4)
+
+    def test_key_too_deep(self):
+        self.check_limit('/?filter[x][y][z]=1',
+                         kt.jsonapi.interfaces.QueryKeyTooDeep,
+                         'filter[x][y][z]', 2)
+
+    def test_key_depth_ignores_other_parameters(self):
+        with self.request_context('/?other[x][y][z]=1'):
+            rc = self.get_context()
+        self.assertEqual(rc.relpaths, set())
+
+    def test_too_many_include_paths(self):
+        self.check_limit('/?include=a,b,c,d',
+                         kt.jsonapi.interfaces.TooManyIncludePaths,
+                         'include', 3)
+
+    def test_include_path_too_deep(self):
+        self.check_limit('/?include=a,b.c.d',
+                         kt.jsonapi.interfaces.IncludePathTooDeep,
+                         'include', 2)
+
+    def test_too_many_field_names(self):
+        self.check_limit('/?fields[t]=a,b,c,d',
+                         kt.jsonapi.interfaces.TooManyFieldNames,
+                         'fields[t]', 3)
+
+    def test_limits_disabled(self):
+        class UnlimitedContext(self.LimitedContext):
+            max_query_parameters = None
+            max_key_depth = None
+            max_include_paths = None
+            max_include_depth = None
+            max_fields_per_type = None
+
+        path = '/?' + '&'.join(f'p{n}=' for n in range(10))
+        path += '&filter[a][b][c][d]=&include=a.b.c.d,e,f,g'
+        path += '&fields[t]=a,b,c,d,e'
+        with self.request_context(path):
+            rc = self.get_context(UnlimitedContext)
+        self.assertEqual(len(rc.fields['t']), 5)
@@ -0,0 +1,167 @@
+"""\
+Tests for kt.jsonapi.export.
+
+"""
+
+import contextlib
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import flask
+import zope.interface
+
+import kt.jsonapi.api
+import kt.jsonapi.collection
+import kt.jsonapi.export
+import kt.jsonapi.interfaces
+import kt.jsonapi.link
+import tests.objects
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IPagableCollection)
+class PagedCollection(tests.objects.SimpleCollection):
+
+    number = 1
+    size = 2
+
+    def set_pagination(self, page):
+        self.number = int(page['number'])
+
+    def resources(self):
+        start = (self.number - 1) * self.size
+        return self._resources[start:start + self.size]
+
+    def links(self):
+        links = dict(self=kt.jsonapi.link.Link('/things'))
+        if self.number * self.size < len(self._resources):
+            links['next'] = kt.jsonapi.link.Link(
+                f'/things?page[number]={self.number + 1}')
+        return links
+
+
+def things():
+    # Module-level so worker processes can import it.
+    return PagedCollection([
+        tests.objects.SimpleResource(type='thing', id=str(n),
+                                     attributes=dict(n=n, name=f'#{n}'))
+        for n in range(5)])
+
+
+def memory_things():
+    return kt.jsonapi.collection.MemoryCollection(
+        [tests.objects.SimpleResource(
+            type='thing', id=str(n), attributes=dict(n=n, name=f'#{n}'))
+         for n in range(5)],
+        links=dict(self=kt.jsonapi.link.Link('/things')), page_size=2)
+
+
+FACTORY = 'tests.test_export:things'
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.outdir = self.tmpdir.name
+
+    def expected(self, url, kind='collection'):
+        app = flask.Flask(__name__)
+        with app.test_request_context(url):
+            context = kt.jsonapi.api.Context(app, flask.request)
+            if kind == 'collection':
+                return context.collection(things()).get_data()
+            id = flask.request.path.rsplit('/', 1)[-1]
+            return context.resource(things()._resources[int(id)]).get_data()
+
+    def read(self, entry, suffix=''):
+        filename = os.path.join(self.outdir, entry['file'] + suffix)
+        with open(filename, 'rb') as f:
+            data = f.read()
+        return gzip.decompress(data) if suffix == '.gz' else data
+
+    def test_export_matches_context(self):
+        manifest = kt.jsonapi.export.export(
+            FACTORY, '/things', self.outdir,
+            query='fields[thing]=name', workers=2)
+        byurl = {entry['url']: entry for entry in manifest}
+        self.assertEqual(sorted(byurl), [
+            '/thing/0?fields[thing]=name',
+            '/thing/1?fields[thing]=name',
+            '/thing/2?fields[thing]=name',
+            '/thing/3?fields[thing]=name',
+            '/thing/4?fields[thing]=name',
+            '/things?fields[thing]=name',
+            '/things?page[number]=2&fields[thing]=name',
+            '/things?page[number]=3&fields[thing]=name',
+        ])
+        for url, entry in byurl.items():
+            kind = 'collection' if url.startswith('/things') else 'resource'
+            data = self.read(entry)
+            self.assertEqual(data, self.expected(url, kind))
+            self.assertEqual(self.read(entry, '.gz'), data)
+            self.assertEqual(entry['size'], len(data))
+
+        with open(os.path.join(self.outdir, 'manifest.json')) as f:
+            self.assertEqual(json.load(f), manifest)
+
+    def test_static_names(self):
+        self.assertEqual(kt.jsonapi.export.static_name('/things/1'),
+                         'things/1/index.json')
+        self.assertEqual(kt.jsonapi.export.static_name('/'), 'index.json')
+        name = kt.jsonapi.export.static_name('/things?page[number]=2')
+        self.assertTrue(name.startswith('things/q/'))
+        self.assertNotEqual(
+            name, kt.jsonapi.export.static_name('/things?page[number]=3'))
+
+    def test_rewritten_links(self):
+        manifest = kt.jsonapi.export.export(
+            FACTORY, '/things', self.outdir, workers=1,
+            link_prefix='https://static.example.com/')
+        files = {entry['file'] for entry in manifest}
+        byurl = {entry['url']: entry for entry in manifest}
+        first = json.loads(self.read(byurl['/things']))
+        self.assertEqual(first['links']['self'],
+                         'https://static.example.com/things/index.json')
+        prefix = 'https://static.example.com/'
+        next_link = first['links']['next']
+        self.assertIn(next_link[len(prefix):], files)
+        for item in first['data']:
+            self.assertIn(item['links']['self'][len(prefix):], files)
+
+    def test_rewritten_links_resolve(self):
+        prefix = 'https://static.example.com/'
+        manifest = kt.jsonapi.export.export(
+            'tests.test_export:memory_things', '/things', self.outdir,
+            query='fields[thing]=name', workers=1, link_prefix=prefix)
+        files = {entry['file'] for entry in manifest}
+        rels = set()
+        for entry in manifest:
+            document = json.loads(self.read(entry))
+            items = document['data']
+            links = [document.get('links', {})]
+            links.extend(item.get('links', {}) for item in
+                         (items if isinstance(items, list) else [items]))
+            for item_links in links:
+                for rel, link in item_links.items():
+                    if link is None:
+                        continue
+                    rels.add(rel)
+                    self.assertTrue(link.startswith(prefix), link)
+                    self.assertIn(link[len(prefix):], files,
+                                  f'{rel} link in {entry["url"]}')
+        self.assertEqual(rels, {'self', 'first', 'prev', 'next', 'last'})
+
+    def test_main(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            kt.jsonapi.export.main([FACTORY, '/things', self.outdir,
+                                    '--workers', '1', '--max-pages', '1'])
+        self.assertIn('wrote 3 documents', out.getvalue())
+        with open(os.path.join(self.outdir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        self.assertEqual([entry['url'] for entry in manifest],
+                         ['/thing/0', '/thing/1', '/things'])
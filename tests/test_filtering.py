@@ -0,0 +1,268 @@
+"""\
+Tests for kt.jsonapi.filtering.
+
+"""
+
+import unittest
+
+import zope.interface
+
+import kt.jsonapi.api
+import kt.jsonapi.error
+import kt.jsonapi.filtering
+import kt.jsonapi.interfaces
+import tests.objects
+import tests.utils
+
+
+filtering = kt.jsonapi.filtering
+
+
+FIELDS = dict(
+    name=filtering.FilterField(),
+    age=filtering.FilterField(
+        ('eq', 'lt', 'ge', 'range'), convert=int),
+    status=filtering.FilterField(('eq', 'in')),
+)
+
+
+class ParseFilterTestCase(tests.utils.JSONAPITestCase):
+
+    def parse(self, query_string):
+        with self.request_context('/?' + query_string):
+            context = kt.jsonapi.api.context()
+            return kt.jsonapi.filtering.parse_filter(
+                context._query['filter'], FIELDS)
+
+    def check_error(self, query_string, exception, key):
+        with self.assertRaises(exception) as cm:
+            self.parse(query_string)
+        self.assertEqual(cm.exception.key, key)
+        return cm.exception
+
+    def test_shorthand_equality(self):
+        self.assertEqual(self.parse('filter[name]=Alice'),
+                         filtering.Comparison('name', 'eq', 'Alice'))
+
+    def test_operators(self):
+        self.assertEqual(
+            self.parse('filter[age][ge]=18&filter[age][lt]=65'
+                       '&filter[status][in]=open,held'),
+            filtering.And([filtering.Comparison('age', 'ge', 18),
+                           filtering.Comparison('age', 'lt', 65),
+                           filtering.In('status', ('open', 'held'))]))
+        self.assertEqual(self.parse('filter[status][in]='),
+                         filtering.In('status', ()))
+
+    def test_range(self):
+        self.assertEqual(self.parse('filter[age][range]=18,65'),
+                         filtering.Range('age', 18, 65))
+        self.assertEqual(self.parse('filter[age][range]=,65'),
+                         filtering.Range('age', None, 65))
+        self.assertEqual(self.parse('filter[age][range]=18,'),
+                         filtering.Range('age', 18, None))
+        for value in ('18', '1,2,3'):
+            exc = self.check_error(
+                'filter[age][range]=' + value,
+                kt.jsonapi.interfaces.InvalidQueryKeyValue,
+                'filter[age][range]')
+            self.assertEqual(exc.value, value)
+
+    def test_logical(self):
+        self.assertEqual(
+            self.parse('filter[or][a][status]=open'
+                       '&filter[or][b][age][lt]=18'
+                       '&filter[or][b][name]=Bob'
+                       '&filter[not][name]=Alice'),
+            filtering.And([
+                filtering.Or([
+                    filtering.Comparison('status', 'eq', 'open'),
+                    filtering.And([
+                        filtering.Comparison('age', 'lt', 18),
+                        filtering.Comparison('name', 'eq', 'Bob'),
+                    ]),
+                ]),
+                filtering.Not(filtering.Comparison('name', 'eq', 'Alice')),
+            ]))
+        self.assertEqual(
+            self.parse('filter[and][x][name]=A&filter[and][y][name]=B'),
+            filtering.And([filtering.Comparison('name', 'eq', 'A'),
+                           filtering.Comparison('name', 'eq', 'B')]))
+
+    def test_unknown_field(self):
+        self.check_error('filter[color]=red',
+                         kt.jsonapi.interfaces.InvalidQueryKey,
+                         'filter[color]')
+
+    def test_unknown_operator(self):
+        exc = self.check_error('filter[name][like]=A*',
+                               kt.jsonapi.interfaces.InvalidQueryKey,
+                               'filter[name][like]')
+        self.assertIn("unknown filter operator 'like'", str(exc))
+
+    def test_operator_not_allowed(self):
+        self.check_error('filter[status][lt]=open',
+                         kt.jsonapi.interfaces.InvalidQueryKey,
+                         'filter[status][lt]')
+        self.check_error('filter[age][ne]=3',
+                         kt.jsonapi.interfaces.InvalidQueryKey,
+                         'filter[age][ne]')
+
+    def test_invalid_value(self):
+        exc = self.check_error('filter[age]=old',
+                               kt.jsonapi.interfaces.InvalidQueryKeyValue,
+                               'filter[age]')
+        self.assertEqual(exc.value, 'old')
+
+    def test_invalid_structure(self):
+        self.check_error('filter=junk',
+                         kt.jsonapi.interfaces.InvalidQueryKeyValue,
+                         'filter')
+        self.check_error('filter[or]=junk',
+                         kt.jsonapi.interfaces.InvalidQueryKeyValue,
+                         'filter[or]')
+        self.check_error('filter[or][a]=junk',
+                         kt.jsonapi.interfaces.InvalidQueryKeyValue,
+                         'filter[or][a]')
+        self.check_error('filter[name][eq][x]=1',
+                         kt.jsonapi.interfaces.InvalidQueryKeyValue,
+                         'filter[name][eq]')
+
+
+class NodeTestCase(unittest.TestCase):
+
+    def test_equality(self):
+        node = filtering.Not(filtering.In('a', ['x']))
+        self.assertEqual(node, filtering.Not(filtering.In('a', ('x',))))
+        self.assertEqual(len({node, filtering.Not(filtering.In('a', 'x'))}),
+                         1)
+        self.assertNotEqual(filtering.Comparison('a', 'eq', 1),
+                            filtering.Range('a', 'eq', 1))
+        self.assertEqual(repr(node), "Not(In('a', ('x',)))")
+
+    def test_immutable(self):
+        node = filtering.Comparison('a', 'eq', 1)
+        with self.assertRaises(AttributeError):
+            node.value = 2
+
+    def test_unknown_operator(self):
+        with self.assertRaises(ValueError):
+            filtering.FilterField(('eq', 'like'))
+
+
+class CompileFilterTestCase(unittest.TestCase):
+
+    records = [
+        dict(name='Alice', age=30, status='open'),
+        dict(name='Bob', age=17, status='held'),
+        dict(name='Carol', age=None, status='closed'),
+        dict(name='Dave', age=65, status='open'),
+    ]
+
+    def select(self, expression):
+        predicate = filtering.compile_filter(expression)
+        return [record['name'] for record in self.records
+                if predicate(record)]
+
+    def test_comparisons(self):
+        for op, expected in (('eq', ['Dave']),
+                             ('ne', ['Alice', 'Bob', 'Carol']),
+                             ('lt', ['Alice', 'Bob']),
+                             ('le', ['Alice', 'Bob', 'Dave']),
+                             ('gt', []),
+                             ('ge', ['Dave'])):
+            self.assertEqual(
+                self.select(filtering.Comparison('age', op, 65)), expected,
+                op)
+
+    def test_in(self):
+        self.assertEqual(
+            self.select(filtering.In('status', ('held', 'closed'))),
+            ['Bob', 'Carol'])
+        self.assertEqual(self.select(filtering.In('status', ())), [])
+        # Unhashable values are supported:
+        self.assertEqual(self.select(filtering.In('age', ([], 17))), ['Bob'])
+
+    def test_range(self):
+        self.assertEqual(self.select(filtering.Range('age', 17, 30)),
+                         ['Alice', 'Bob'])
+        self.assertEqual(self.select(filtering.Range('age', None, 20)),
+                         ['Bob'])
+        self.assertEqual(self.select(filtering.Range('age', 30, None)),
+                         ['Alice', 'Dave'])
+        self.assertEqual(self.select(filtering.Range('age', None, None)),
+                         ['Alice', 'Bob', 'Dave'])
+
+    def test_logical(self):
+        self.assertEqual(
+            self.select(filtering.Or([
+                filtering.Comparison('status', 'eq', 'closed'),
+                filtering.And([filtering.Comparison('status', 'eq', 'open'),
+                               filtering.Comparison('age', 'gt', 40)]),
+            ])),
+            ['Carol', 'Dave'])
+        self.assertEqual(
+            self.select(filtering.Not(filtering.Comparison(
+                'status', 'eq', 'open'))),
+            ['Bob', 'Carol'])
+        self.assertEqual(self.select(filtering.And([])), [
+            'Alice', 'Bob', 'Carol', 'Dave'])
+        self.assertEqual(self.select(filtering.Or([])), [])
+
+    def test_code_shared_by_shape(self):
+        filtering._factory.cache_clear()
+        for age in (20, 30, 40):
+            filtering.compile_filter(filtering.And([
+                filtering.Comparison('age', 'lt', age),
+                filtering.In('status', ('open', str(age))),
+            ]))
+        info = filtering._factory.cache_info()
+        self.assertEqual((info.misses, info.hits), (1, 2))
+        # Values containing code are bound, not interpolated:
+        predicate = filtering.compile_filter(
+            filtering.Comparison('name', 'eq', "') or ('"))
+        self.assertFalse(predicate(dict(name='Alice')))
+
+    def test_unsupported_node(self):
+        with self.assertRaises(TypeError):
+            filtering.compile_filter(filtering.Not(object()))
+
+
+@zope.interface.implementer(kt.jsonapi.interfaces.IFilterAstCollection,
+                            kt.jsonapi.interfaces.IFilterableCollection)
+class AstCollection(tests.objects.SimpleCollection):
+
+    filter_fields = FIELDS
+
+    def set_filter_ast(self, expression):
+        self._meta['expression'] = repr(expression)
+
+
+class FilterAstCollectionTestCase(tests.utils.JSONAPITestCase):
+
+    def render(self, path):
+        with self.request_context(path):
+            context = kt.jsonapi.api.context()
+            collection = AstCollection()
+            context.collection(collection)
+            return collection
+
+    def test_receives_expression(self):
+        collection = self.render('/?filter[age][lt]=3')
+        self.assertEqual(collection._meta,
+                         dict(expression="Comparison('age', 'lt', 3)"))
+        self.assertEqual(collection.ncalls_set_filter, 0)
+
+    def test_no_filter(self):
+        collection = self.render('/')
+        self.assertEqual(collection._meta, {})
+
+    def test_error_response(self):
+        with self.request_context('/?filter[color]=red'):
+            context = kt.jsonapi.api.context()
+            with self.assertRaises(
+                    kt.jsonapi.interfaces.InvalidQueryKey) as cm:
+                context.collection(AstCollection())
+        error = kt.jsonapi.error.queryStringError(cm.exception)
+        self.assertEqual(error.status, 400)
+        self.assertEqual(error.source(), {'parameter': 'filter[color]'})
@@ -4,8 +4,10 @@ Tests for various internal functions that represent isolated functionality.
 """
 
 import unittest
+import urllib.parse
 
 import kt.jsonapi.api
+import kt.jsonapi.interfaces
 
 
 class TestSplitKey(unittest.TestCase):
@@ -19,3 +21,68 @@ class TestSplitKey(unittest.TestCase):
         obnames, field = kt.jsonapi.api._split_key('simple[sub][field]')
         self.assertEqual(obnames, ('simple', 'sub'))
         self.assertEqual(field, 'field')
+
+    def test_malformed(self):
+        for key, rest in (('a[b]c', 'c'),
+                          ('a[b', '[b'),
+                          ('a[b][c', '[c'),
+                          ('a[b]]', ']')):
+            with self.assertRaises(
+                    kt.jsonapi.interfaces.InvalidQueryKey) as cm:
+                kt.jsonapi.api._split_key(key)
+            self.assertEqual(cm.exception.key, key)
+            self.assertTrue(str(cm.exception).endswith(repr(rest)))
+
+    def test_empty_names(self):
+        for key in ('[a]', 'a[]', 'a[b][]'):
+            with self.assertRaises(kt.jsonapi.interfaces.InvalidQueryKey):
+                kt.jsonapi.api._split_key(key)
+
+    def test_max_depth(self):
+        obnames, field = kt.jsonapi.api._split_key('a[b][c]', max_depth=2)
+        self.assertEqual(obnames, ('a', 'b'))
+        with self.assertRaises(
+                kt.jsonapi.interfaces.QueryKeyTooDeep) as cm:
+            # Scanning stops before the malformed tail is reached.
+            kt.jsonapi.api._split_key('a[b][c][d]x', max_depth=2)
+        self.assertEqual(cm.exception.key, 'a[b][c][d]x')
+        self.assertEqual(cm.exception.limit, 2)
+
+    def test_nested_open_bracket(self):
+        obnames, field = kt.jsonapi.api._split_key('a[b[c]')
+        self.assertEqual(obnames, ('a',))
+        self.assertEqual(field, 'b[c')
+
+
+class TestScanQueryString(unittest.TestCase):
+
+    def test_matches_parse_qsl(self):
+        for query_string in (
+                '',
+                'a=1',
+                'a=1&&b=2&',
+                'a&b=&=c&=',
+                'fields[a+b]=x%2Cy&include=p.q%2Er',
+                'filter[name]=caf%C3%A9+au+lait&sort=-name',
+                'bad=%zz&worse=%E2%28%A1',
+                'a=b=c&%5B=%5D',
+                ):
+            self.assertEqual(
+                kt.jsonapi.api._scan_query_string(query_string),
+                urllib.parse.parse_qsl(query_string, keep_blank_values=True),
+                query_string)
+
+    def test_semicolon_not_separator(self):
+        # Whether parse_qsl() splits on ';' depends on the Python patch
+        # release, so this is checked separately.
+        self.assertEqual(
+            kt.jsonapi.api._scan_query_string('page[number]=2;page[size]=10'),
+            [('page[number]', '2;page[size]=10')])
+
+    def test_limit(self):
+        self.assertEqual(
+            kt.jsonapi.api._scan_query_string('a=1&&b=2&c=3&d=4', 2),
+            [('a', '1'), ('b', '2'), ('c', '3')])
+        self.assertEqual(
+            kt.jsonapi.api._scan_query_string('a=1&b=2&', 2),
+            [('a', '1'), ('b', '2')])
@@ -0,0 +1,65 @@
+"""\
+Tests for validation functions in kt.jsonapi.interfaces.
+
+"""
+
+import unittest
+
+import kt.jsonapi.interfaces
+
+
+class ValidatorTestCase(unittest.TestCase):
+
+    def test_valid_names(self):
+        for name in ('a', 'some-name', 'some_name', 'café', '42'):
+            kt.jsonapi.interfaces.validate_member_name(name)
+            kt.jsonapi.interfaces.validate_type_name(name)
+        kt.jsonapi.interfaces.validate_relationship_path('a.b-c.d_e')
+
+    def test_invalid_member_name(self):
+        with self.assertRaises(kt.jsonapi.interfaces.InvalidMemberName) as cm:
+            kt.jsonapi.interfaces.validate_member_name('-a', 'fields[x]')
+        self.assertEqual(cm.exception.value, '-a')
+        self.assertIsInstance(cm.exception.field,
+                              kt.jsonapi.interfaces.MemberName)
+        self.assertEqual(cm.exception.field.__name__, 'fields[x]')
+
+    def test_invalid_type_name(self):
+        with self.assertRaises(kt.jsonapi.interfaces.InvalidTypeName) as cm:
+            kt.jsonapi.interfaces.validate_type_name('', 'fields[]')
+        self.assertIsInstance(cm.exception.field,
+                              kt.jsonapi.interfaces.TypeName)
+
+    def test_invalid_relationship_path(self):
+        with self.assertRaises(
+                kt.jsonapi.interfaces.InvalidRelationshipPath) as cm:
+            kt.jsonapi.interfaces.validate_relationship_path(
+                'a..b', 'include')
+        self.assertEqual(cm.exception.value, 'a..b')
+        self.assertEqual(cm.exception.field.__name__, 'include')
+
+    def test_provided_field(self):
+        field = kt.jsonapi.interfaces.RelationshipPath(__name__='custom')
+        with self.assertRaises(
+                kt.jsonapi.interfaces.InvalidRelationshipPath) as cm:
+            kt.jsonapi.interfaces.validate_relationship_path(
+                'a.', field=field)
+        self.assertIs(cm.exception.field, field)
+
+    def test_wrong_type(self):
+        with self.assertRaises(Exception):
+            kt.jsonapi.interfaces.validate_member_name(b'name')
+
+    def test_same_as_fields(self):
+        # Results agree with the schema fields, including for values
+        # already memoized.
+        for name in ('ok', 'not ok ', ' x', 'x_', 'x\n', 'a.b', ''):
+            for n in range(2):
+                try:
+                    kt.jsonapi.interfaces.MemberName().validate(name)
+                except kt.jsonapi.interfaces.InvalidMemberName:
+                    with self.assertRaises(
+                            kt.jsonapi.interfaces.InvalidMemberName):
+                        kt.jsonapi.interfaces.validate_member_name(name)
+                else:
+                    kt.jsonapi.interfaces.validate_member_name(name)
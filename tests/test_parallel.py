@@ -0,0 +1,206 @@
+"""\
+Tests for parallel serialization in kt.jsonapi.api.Context.
+
+"""
+
+import concurrent.futures
+import threading
+
+import flask
+import flask_restful
+
+import kt.jsonapi.api
+import kt.jsonapi.cache
+import kt.jsonapi.link
+import tests.objects
+import tests.utils
+
+
+class ThreadedResource(tests.objects.SimpleResource):
+
+    def attributes(self):
+        # Requires the request context to be available in the thread.
+        if flask.request.args.get('fail') == self.id:
+            raise ValueError(self.id)
+        return dict(self._attributes, path=flask.request.path,
+                    main=threading.current_thread() is
+                    threading.main_thread())
+
+
+class ParallelSerializationTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(ParallelSerializationTestCase, self).setUp()
+        executor = concurrent.futures.ThreadPoolExecutor(4)
+        self.addCleanup(executor.shutdown)
+
+        class ParallelContext(kt.jsonapi.api.Context):
+            serialization_executor = executor
+            serialization_threshold = 2
+
+        self.shared = tests.objects.SimpleResource(type='tag', id='shared')
+        self.parallel_context = ParallelContext
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().collection(self.collection())
+
+        self.api.add_resource(Render, '/things')
+
+    def collection(self):
+        owners = [tests.objects.SimpleResource(type='owner', id=str(n))
+                  for n in range(6)]
+        resources = []
+        for n in range(6):
+            tags = [tests.objects.SimpleResource(type='tag', id=f'{n}')]
+            if n % 3 == 0:
+                tags.append(self.shared)
+            rels = dict(
+                owner=tests.objects.ToOneRel(owners[n // 2]),
+                tags=tests.objects.ToManyRel(
+                    tests.objects.SimpleCollection(tags)),
+            )
+            resources.append(ThreadedResource(
+                type='thing', id=str(n), attributes=dict(n=n),
+                relationships=rels))
+        return tests.objects.SimpleCollection(
+            resources, links=dict(self=kt.jsonapi.link.Link('/things')))
+
+    def get(self, path):
+        data = self.http_get(path).json
+        for item in data['data']:
+            item['attributes'].pop('main')
+        return data
+
+    def test_matches_sequential(self):
+        path = '/things?include=owner,tags'
+        expected = self.get(path)
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = self.parallel_context
+        self.assertEqual(self.get(path), expected)
+        idents = [(item['type'], item['id']) for item in expected['included']]
+        self.assertEqual(len(idents), len(set(idents)))
+        self.assertIn(('tag', 'shared'), idents)
+
+    def test_runs_in_executor(self):
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = self.parallel_context
+        data = self.http_get('/things').json
+        self.assertFalse(any(item['attributes']['main']
+                             for item in data['data']))
+        self.assertEqual({item['attributes']['path'] for item in data['data']},
+                         {'/things'})
+
+    def test_below_threshold(self):
+        self.parallel_context.serialization_threshold = 100
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = self.parallel_context
+        data = self.http_get('/things').json
+        self.assertTrue(all(item['attributes']['main']
+                            for item in data['data']))
+
+    def test_errors_propagate(self):
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = self.parallel_context
+        with self.request_context('/things?fail=2'):
+            context = kt.jsonapi.api.context()
+            with self.assertRaises(ValueError) as cm:
+                context.collection(self.collection())
+        self.assertEqual(str(cm.exception), '2')
+
+    def test_concurrent_requests(self):
+        path = '/things?include=owner,tags'
+        expected = self.get(path)
+        executor = self.parallel_context.serialization_executor
+
+        class SharedContext(self.parallel_context):
+            include_executor = executor
+            linkage_cache = kt.jsonapi.cache.LinkageCache()
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = SharedContext
+
+        def request(n):
+            return self.get(path)
+
+        with concurrent.futures.ThreadPoolExecutor(8) as clients:
+            results = list(clients.map(request, range(40)))
+        for result in results:
+            self.assertEqual(result, expected)
+
+
+class SlowToOneRel(tests.objects.ToOneRel):
+
+    def __init__(self, related, barrier):
+        super(SlowToOneRel, self).__init__(related)
+        self.barrier = barrier
+
+    def resource(self):
+        # Each relationship waits for its siblings the first time, which
+        # only completes if they are resolved concurrently.
+        barrier, self.barrier = self.barrier, None
+        if barrier is not None:
+            barrier.wait()
+        return super(SlowToOneRel, self).resource()
+
+
+class ParallelIncludeTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(ParallelIncludeTestCase, self).setUp()
+        executor = concurrent.futures.ThreadPoolExecutor(4)
+        self.addCleanup(executor.shutdown)
+
+        class ParallelContext(kt.jsonapi.api.Context):
+            include_executor = executor
+            include_parallelism = 3
+
+        self.parallel_context = ParallelContext
+        self.barrier = None
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().resource(self.resource())
+
+        self.api.add_resource(Render, '/things/1')
+
+    def resource(self):
+        person = tests.objects.SimpleResource(type='person', id='p1')
+        editor = tests.objects.SimpleResource(
+            type='person', id='p2',
+            relationships=dict(friend=tests.objects.ToOneRel(person)))
+        tag = tests.objects.SimpleResource(type='tag', id='t1')
+
+        def rel(related):
+            if self.barrier is None:
+                return tests.objects.ToOneRel(related)
+            return SlowToOneRel(related, self.barrier)
+
+        return tests.objects.SimpleResource(
+            type='thing', id='1', relationships=dict(
+                author=rel(person),
+                editor=rel(editor),
+                tag=rel(tag),
+                other=tests.objects.ToOneRel(tag),
+            ))
+
+    def test_matches_sequential(self):
+        path = '/things/1?include=editor.friend,author,tag'
+        expected = self.http_get(path).json
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = self.parallel_context
+        self.barrier = threading.Barrier(3, timeout=5)
+        self.assertEqual(self.http_get(path).json, expected)
+        self.assertEqual([item['id'] for item in expected['included']],
+                         ['p1', 'p2', 't1'])
+
+    def test_sparse_fields(self):
+        path = '/things/1?include=author,tag&fields[thing]=other'
+        expected = self.http_get(path).json
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = self.parallel_context
+        self.assertEqual(self.http_get(path).json, expected)
+        self.assertEqual(list(expected['data']['relationships']), ['other'])
+        self.assertEqual(len(expected['included']), 2)
+
+    def test_parallelism_limit(self):
+        self.parallel_context.include_parallelism = 2
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = self.parallel_context
+        self.barrier = threading.Barrier(3, timeout=0.5)
+        with self.request_context('/things/1?include=author,editor,tag'):
+            context = kt.jsonapi.api.context()
+            with self.assertRaises(threading.BrokenBarrierError):
+                context.resource(self.resource())
@@ -0,0 +1,86 @@
+"""\
+Tests for kt.jsonapi.api.RenderContext.
+
+"""
+
+import json
+
+import flask_restful
+
+import kt.jsonapi.api
+import kt.jsonapi.interfaces
+import kt.jsonapi.link
+import tests.objects
+import tests.utils
+
+
+class RenderContextTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(RenderContextTestCase, self).setUp()
+        self.tag = tests.objects.SimpleResource(
+            type='tag', id='t1', attributes=dict(name='red', color='#f00'))
+        self.article = tests.objects.SimpleResource(
+            type='article', id='a1',
+            attributes=dict(title='Hello', body='...'),
+            relationships=dict(tags=tests.objects.ToManyRel(
+                tests.objects.SimpleCollection([self.tag]))))
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().resource(self.article)
+
+        self.api.add_resource(Render, '/article/a1')
+
+    def test_matches_request_context(self):
+        context = kt.jsonapi.api.RenderContext(
+            fields={'tag': ['name'], 'article': ['title', 'tags']},
+            include=['tags'], app=self.app)
+        resp = self.http_get(
+            '/article/a1?fields[tag]=name&fields[article]=title,tags'
+            '&include=tags')
+        self.assertEqual(context.render_resource(self.article), resp.data)
+
+    def test_documents_are_independent(self):
+        context = kt.jsonapi.api.RenderContext(include=['tags'])
+        first = context.resource_document(self.article)
+        second = context.resource_document(self.article)
+        self.assertEqual(first, second)
+        self.assertEqual(len(first['included']), 1)
+        self.assertEqual(first['links'], dict(self='/article/a1?include=tags'))
+
+    def test_without_include(self):
+        context = kt.jsonapi.api.RenderContext(fields={'article': []})
+        document = context.resource_document(self.article)
+        self.assertNotIn('included', document)
+        self.assertEqual(document['data'], dict(
+            type='article', id='a1', links=dict(self='/article/a1')))
+
+    def test_render_many(self):
+        articles = [tests.objects.SimpleResource(type='article', id=str(n))
+                    for n in range(3)]
+        context = kt.jsonapi.api.RenderContext(include=[])
+        documents = [json.loads(data)
+                     for data in context.render_resources(articles)]
+        self.assertEqual([doc['data']['id'] for doc in documents],
+                         ['0', '1', '2'])
+        self.assertEqual([doc['included'] for doc in documents],
+                         [[], [], []])
+
+    def test_render_collection(self):
+        collection = tests.objects.SimpleCollection(
+            [self.article, self.tag],
+            links=dict(self=kt.jsonapi.link.Link('/things')))
+        context = kt.jsonapi.api.RenderContext(fields={'tag': ['name']})
+        document = json.loads(context.render_collection(collection))
+        self.assertEqual(document['data'][1]['attributes'],
+                         dict(name='red'))
+        self.assertEqual(document['links'],
+                         dict(self='/things?fields[tag]=name'))
+
+    def test_invalid_names(self):
+        with self.assertRaises(kt.jsonapi.interfaces.InvalidMemberName):
+            kt.jsonapi.api.RenderContext(fields={'tag': ['bad name']})
+        with self.assertRaises(
+                kt.jsonapi.interfaces.InvalidRelationshipPath):
+            kt.jsonapi.api.RenderContext(include=['tags.'])
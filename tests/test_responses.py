@@ -2078,3 +2078,68 @@ class CollectionPropertyQueryStringMismatchTestCase(
         self.assertEqual(self.collection.ncalls_set_filter, 1)
         self.assertEqual(self.collection.ncalls_set_pagination, 0)
         self.assertEqual(self.collection.ncalls_set_sort, 0)
+
+
+class SurrogateKeyContext(kt.jsonapi.api.Context):
+
+    surrogate_key_header = 'Surrogate-Key'
+
+
+class SurrogateKeyResponseTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(SurrogateKeyResponseTestCase, self).setUp()
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = SurrogateKeyContext
+        self.tag = tests.objects.SimpleResource(type='tag', id='t 1')
+        self.article = tests.objects.SimpleResource(
+            type='article', id='a1',
+            relationships=dict(tags=tests.objects.ToManyRel(
+                tests.objects.SimpleCollection([self.tag]))))
+        self.headers = None
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().resource(
+                    self.article, headers=self.headers)
+
+        self.api.add_resource(Render, '/')
+
+    def test_keys_for_included_resources(self):
+        resp = self.http_get('/?include=tags')
+        self.assertEqual(resp.headers['Surrogate-Key'],
+                         'article tag article/a1 tag/t%201')
+
+    def test_keys_for_primary_data_only(self):
+        resp = self.http_get('/')
+        self.assertEqual(resp.headers['Surrogate-Key'], 'article article/a1')
+
+    def test_hashed_keys(self):
+        SurrogateKeyContext.surrogate_key_hash = True
+        self.addCleanup(delattr, SurrogateKeyContext, 'surrogate_key_hash')
+        resp = self.http_get('/?include=tags')
+        keys = resp.headers['Surrogate-Key'].split()
+        self.assertEqual(keys[:2], ['article', 'tag'])
+        self.assertIn(SurrogateKeyContext.surrogate_key('tag', 't 1'), keys)
+        self.assertEqual(len(keys[2]), 16)
+
+    def test_limit_falls_back_to_types(self):
+        SurrogateKeyContext.surrogate_key_limit = 20
+        self.addCleanup(delattr, SurrogateKeyContext, 'surrogate_key_limit')
+        resp = self.http_get('/?include=tags')
+        self.assertEqual(resp.headers['Surrogate-Key'], 'article tag')
+
+    def test_explicit_header_not_replaced(self):
+        self.headers = {'Surrogate-Key': 'custom'}
+        resp = self.http_get('/')
+        self.assertEqual(resp.headers['Surrogate-Key'], 'custom')
+
+    def test_related_resource(self):
+        rel = tests.objects.ToOneRel(self.tag)
+        with self.request_context('/articles/a1/tag'):
+            resp = kt.jsonapi.api.context().related(rel)
+        self.assertEqual(resp.headers['Surrogate-Key'], 'tag tag/t%201')
+
+    def test_disabled_by_default(self):
+        del self.app.config['KT_JSONAPI_CONTEXT_REGULAR']
+        resp = self.http_get('/')
+        self.assertNotIn('Surrogate-Key', resp.headers)
@@ -0,0 +1,72 @@
+"""\
+Tests for kt.jsonapi.sorting.
+
+"""
+
+import unittest
+
+import kt.jsonapi.interfaces
+import kt.jsonapi.sorting
+
+
+SortKey = kt.jsonapi.sorting.SortKey
+
+
+class ParseSortTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(
+            kt.jsonapi.sorting.parse_sort('-created,title,author.name'),
+            (SortKey('created', True), SortKey('title', False),
+             SortKey('author.name', False)))
+
+    def test_allowed_fields(self):
+        self.assertEqual(
+            kt.jsonapi.sorting.parse_sort('-n', fields={'n'}),
+            (SortKey('n', True),))
+        with self.assertRaises(
+                kt.jsonapi.interfaces.InvalidQueryKeyValue) as cm:
+            kt.jsonapi.sorting.parse_sort('n,secret', fields={'n'})
+        self.assertEqual(cm.exception.key, 'sort')
+        self.assertEqual(cm.exception.value, 'n,secret')
+        self.assertIn("sorting by 'secret' is not supported",
+                      str(cm.exception))
+
+    def test_invalid_values(self):
+        for value in ('', 'a,,b', '-', 'a,-a', {'a': 'b'}):
+            with self.assertRaises(
+                    kt.jsonapi.interfaces.InvalidQueryKeyValue) as cm:
+                kt.jsonapi.sorting.parse_sort(value)
+            self.assertEqual(cm.exception.key, 'sort')
+
+    def test_invalid_names(self):
+        for value in ('a b', '--a', 'a..b'):
+            with self.assertRaises(
+                    kt.jsonapi.interfaces.InvalidRelationshipPath) as cm:
+                kt.jsonapi.sorting.parse_sort(value)
+            self.assertEqual(cm.exception.field.__name__, 'sort')
+
+
+class KeyFunctionTestCase(unittest.TestCase):
+
+    records = [
+        dict(name='a', n=2),
+        dict(name='b', n=None),
+        dict(name='c', n=1),
+        dict(name='d', n=2),
+    ]
+
+    def order(self, *spec):
+        key = kt.jsonapi.sorting.key_function(spec, lambda record: record)
+        return ''.join(record['name']
+                       for record in sorted(self.records, key=key))
+
+    def test_ascending(self):
+        self.assertEqual(self.order(SortKey('n', False)), 'cadb')
+
+    def test_descending(self):
+        self.assertEqual(self.order(SortKey('n', True)), 'badc')
+        self.assertEqual(
+            self.order(SortKey('n', True), SortKey('name', True)), 'bdac')
+        self.assertEqual(
+            self.order(SortKey('n', False), SortKey('name', True)), 'cdab')
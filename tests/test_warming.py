@@ -0,0 +1,143 @@
+"""\
+Tests for kt.jsonapi.warming.
+
+"""
+
+import os
+import tempfile
+import unittest
+
+import flask_restful
+
+import kt.jsonapi.api
+import kt.jsonapi.cache
+import kt.jsonapi.link
+import kt.jsonapi.warming
+import tests.objects
+import tests.utils
+
+
+class RequestKeyRecorderTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.recorder = kt.jsonapi.warming.RequestKeyRecorder(maxsize=2)
+
+    def test_most_common(self):
+        self.recorder.record('collection', ('/a', ''))
+        self.recorder.record('resource', ('/b/1', 'include=c'))
+        self.recorder.record('resource', ('/b/1', 'include=c'))
+        self.assertEqual(self.recorder.most_common(), [
+            ('resource', ('/b/1', 'include=c'), 2),
+            ('collection', ('/a', ''), 1),
+        ])
+
+    def test_bounded(self):
+        for n in range(5):
+            self.recorder.record('collection', (f'/{n}', ''), count=n + 1)
+        self.assertLessEqual(len(self.recorder), 4)
+        self.assertEqual([key for kind, key, count
+                          in self.recorder.most_common()],
+                         [('/4', ''), ('/3', '')])
+
+    def test_save_load(self):
+        self.recorder.record('collection', ('/a', 'sort=x'), count=3)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'keys.json')
+            self.recorder.save(filename)
+            recorder = kt.jsonapi.warming.RequestKeyRecorder()
+            recorder.load(filename)
+            recorder.load(os.path.join(tmpdir, 'missing.json'))
+        self.assertEqual(recorder.most_common(),
+                         [('collection', ('/a', 'sort=x'), 3)])
+
+
+class WarmerTestCase(tests.utils.JSONAPITestCase):
+
+    def setUp(self):
+        super(WarmerTestCase, self).setUp()
+        self.recorder = kt.jsonapi.warming.RequestKeyRecorder()
+        self.cache = kt.jsonapi.cache.ResponseCache()
+        self.ncreated = 0
+
+        class WarmContext(kt.jsonapi.api.Context):
+            key_recorder = self.recorder
+            response_cache = self.cache
+
+        class Render(flask_restful.Resource):
+            def get(inst):
+                return kt.jsonapi.api.context().collection(
+                    factory=self.factory)
+
+        self.app.config['KT_JSONAPI_CONTEXT_REGULAR'] = WarmContext
+        self.api.add_resource(Render, '/things')
+
+    def factory(self):
+        self.ncreated += 1
+        resource = tests.objects.SimpleResource(type='thing', id='1')
+        return tests.objects.SimpleCollection(
+            [resource], links=dict(self=kt.jsonapi.link.Link('/things')))
+
+    def resolve(self, kind, path):
+        return self.factory if path == '/things' else None
+
+    def test_warm_fills_response_cache(self):
+        self.http_get('/things?fields[thing]=&include=')
+        self.recorder.record('collection', ('/elsewhere', ''))
+        expected = self.http_get('/things?include=&fields[thing]=').data
+        self.assertEqual(self.ncreated, 1)
+
+        # Start over with an empty cache, as after a restart:
+        self.cache.clear()
+        warmer = kt.jsonapi.warming.Warmer(self.app, self.recorder,
+                                           self.resolve)
+        self.assertEqual(warmer.warm(), 1)
+        self.assertEqual(self.ncreated, 2)
+
+        resp = self.http_get('/things?fields[thing]=&include=')
+        self.assertEqual(self.ncreated, 2)
+        self.assertEqual(resp.data, expected)
+
+    def test_warm_does_not_record_keys(self):
+        self.http_get('/things?include=')
+        self.http_get('/things?include=')
+        self.recorder.record('collection', ('/things', ''))
+        expected = self.recorder.most_common()
+        warmer = kt.jsonapi.warming.Warmer(self.app, self.recorder,
+                                           self.resolve)
+        self.assertEqual(warmer.warm(), 2)
+        self.assertEqual(warmer.warm(), 2)
+        self.assertEqual(self.recorder.most_common(), expected)
+
+    def test_warm_logs_failures(self):
+        self.recorder.record('collection', ('/things', 'include=a b'))
+        warmer = kt.jsonapi.warming.Warmer(self.app, self.recorder,
+                                           self.resolve)
+        with self.assertLogs('kt.jsonapi.warming'):
+            self.assertEqual(warmer.warm(), 0)
+
+    def test_warm_logs_resolve_failures(self):
+        self.http_get('/things')
+        self.recorder.record('collection', ('/broken', ''), count=2)
+        self.cache.clear()
+
+        def resolve(kind, path):
+            if path == '/broken':
+                raise LookupError(path)
+            return self.resolve(kind, path)
+
+        warmer = kt.jsonapi.warming.Warmer(self.app, self.recorder, resolve)
+        with self.assertLogs('kt.jsonapi.warming'):
+            self.assertEqual(warmer.warm(), 1)
+        self.assertEqual(self.ncreated, 2)
+
+    def test_start_stop(self):
+        self.recorder.record('collection', ('/things', ''))
+        warmer = kt.jsonapi.warming.Warmer(self.app, self.recorder,
+                                           self.resolve)
+        thread = warmer.start(interval=60)
+        with self.assertRaises(RuntimeError):
+            warmer.start(interval=60)
+        warmer.stop()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(self.ncreated, 1)